@@ -0,0 +1,527 @@
+# Fake Discord objects that drive the real cog code without a gateway
+#
+# Every REST-backed coroutine sleeps for `rest.latency` and is counted, so
+# scenarios report both wall-clock time and how many Discord calls they made.
+
+import asyncio
+import itertools
+import time
+from datetime import datetime, timedelta
+
+import discord
+
+# Snowflakes from 2023 onwards so account ages look realistic
+_snowflakes = itertools.count(1_100_000_000_000_000_000)
+
+
+def snowflake():
+    return next(_snowflakes)
+
+
+class FakeRest:
+    """Counts and delays simulated Discord REST calls"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.routes = {}
+
+    async def call(self, route):
+        self.calls += 1
+        self.routes[route] = self.routes.get(route, 0) + 1
+        await asyncio.sleep(self.latency)
+
+
+class FakeAsset:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeRole:
+    def __init__(self, guild, name, position, role_id=None):
+        self.guild = guild
+        self.id = role_id or snowflake()
+        self.name = name
+        self.position = position
+
+    @property
+    def mention(self):
+        return f"<@&{self.id}>"
+
+    def is_default(self):
+        return self.id == self.guild.id
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __lt__(self, other):
+        return (self.position, self.id) < (other.position, other.id)
+
+    def __le__(self, other):
+        return self == other or self < other
+
+    def __gt__(self, other):
+        return other < self
+
+    def __ge__(self, other):
+        return self == other or other < self
+
+
+class FakeMessage:
+    def __init__(self, rest, channel=None, content=None, embed=None, embeds=None, view=None):
+        self.rest = rest
+        self.id = snowflake()
+        self.channel = channel
+        self.content = content
+        self.embeds = embeds or ([embed] if embed else [])
+        self.view = view
+
+    async def edit(self, content=None, embed=None, embeds=None, view=None, **kwargs):
+        await self.rest.call("PATCH /messages")
+        if content is not None:
+            self.content = content
+        if embed is not None or embeds is not None:
+            self.embeds = embeds or [embed]
+        if view is not None:
+            self.view = view
+        return self
+
+
+class FakeMember:
+    def __init__(self, guild, name=None, bot=False, member_id=None, roles=(), joined_at=None):
+        self.guild = guild
+        self.id = member_id or snowflake()
+        self.name = name or f"user{self.id % 100000}"
+        self.display_name = self.name
+        self.global_name = None
+        self.bot = bot
+        self.avatar = None
+        self.display_avatar = FakeAsset(f"https://cdn.example/avatars/{self.id}.png")
+        self.roles = [guild.default_role, *roles]
+        self.joined_at = joined_at or discord.utils.utcnow()
+        self.dms = []
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+    @property
+    def created_at(self):
+        return discord.utils.snowflake_time(self.id)
+
+    @property
+    def top_role(self):
+        return max(self.roles)
+
+    async def add_roles(self, *roles, reason=None, atomic=True):
+        await self.guild.rest.call("PUT /members/roles")
+        for role in roles:
+            if role not in self.roles:
+                self.roles.append(role)
+
+    async def remove_roles(self, *roles, reason=None, atomic=True):
+        await self.guild.rest.call("DELETE /members/roles")
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def edit(self, roles=None, reason=None, **kwargs):
+        await self.guild.rest.call("PATCH /members")
+        if roles is not None:
+            self.roles = [self.guild.default_role, *(role for role in roles if not role.is_default())]
+
+    async def ban(self, reason=None, **kwargs):
+        await self.guild.ban(self, reason=reason)
+
+    async def kick(self, reason=None):
+        await self.guild.kick(self, reason=reason)
+
+    async def timeout(self, until, reason=None):
+        await self.guild.rest.call("PATCH /members")
+        self.timed_out_until = until
+
+    async def send(self, content=None, embed=None, **kwargs):
+        await self.guild.rest.call("POST /users/@me/channels")
+        self.dms.append(embed or content)
+
+
+class FakeChannelMixin:
+    """Permission overwrite behaviour shared by the fake text channels and categories"""
+
+    def _setup(self, guild, name, category=None, position=0):
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.position = position
+        self.category_id = category.id if category else None
+        self.fake_overwrites = {}
+        self.synced = category is not None
+
+    @property
+    def category(self):
+        return self.guild.get_channel(self.category_id) if self.category_id else None
+
+    @property
+    def permissions_synced(self):
+        return self.synced
+
+    @property
+    def mention(self):
+        return f"<#{self.id}>"
+
+    def overwrites_for(self, obj):
+        overwrite = self.fake_overwrites.get(obj.id)
+        if overwrite is None:
+            return discord.PermissionOverwrite()
+        allow, deny = overwrite.pair()
+        return discord.PermissionOverwrite.from_pair(allow, deny)
+
+    async def set_permissions(self, target, *, overwrite=discord.utils.MISSING, reason=None, **permissions):
+        await self.guild.rest.call("PUT /channels/permissions")
+        if overwrite is discord.utils.MISSING:
+            overwrite = discord.PermissionOverwrite(**permissions)
+        self.fake_overwrites[target.id] = overwrite
+        self.synced = False
+
+    async def edit(self, *, sync_permissions=False, reason=None, **kwargs):
+        await self.guild.rest.call("PATCH /channels")
+        if sync_permissions and self.category is not None:
+            self.fake_overwrites = dict(self.category.fake_overwrites)
+            self.synced = True
+
+
+class FakeTextChannel(FakeChannelMixin):
+    def __init__(self, guild, name, category=None, position=0):
+        self._setup(guild, name, category, position)
+        self.messages = {}
+
+    async def send(self, content=None, embed=None, embeds=None, view=None, **kwargs):
+        await self.guild.rest.call("POST /channels/messages")
+        message = FakeMessage(self.guild.rest, self, content=content, embed=embed, embeds=embeds, view=view)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        await self.guild.rest.call("GET /channels/messages")
+        message = self.messages.get(message_id)
+        if message is None:
+            raise discord.NotFound(FakeResponseError(404), "Unknown Message")
+        return message
+
+
+class FakeCategory(FakeChannelMixin, discord.CategoryChannel):
+    """Subclasses CategoryChannel so isinstance checks in the bot hold"""
+
+    def __init__(self, guild, name, position=0):
+        self._setup(guild, name, None, position)
+
+
+class FakeResponseError:
+    """Minimal aiohttp-like response for constructing discord.HTTPException"""
+
+    def __init__(self, status, reason="Fake"):
+        self.status = status
+        self.reason = reason
+
+
+class FakeGuild:
+    def __init__(self, rest, name="Benchmark Guild", guild_id=None):
+        self.rest = rest
+        self.id = guild_id or snowflake()
+        self.name = name
+        self.icon = None
+        self.shard_id = 0
+        self.default_role = FakeRole(self, "@everyone", 0, role_id=self.id)
+        self.roles = [self.default_role]
+        self.channels = []
+        self.members = {}
+        self.bans = set()
+        # Members are never cached in full, as with MemberCacheFlags.none()
+        self.chunked = False
+        self.me = self.add_member("Verification Bot", bot=True, roles=[self.create_role_now("Bot", 100)])
+
+    # Synchronous builders for scenario setup; these do not count as REST calls
+
+    def create_role_now(self, name, position=None):
+        role = FakeRole(self, name, position if position is not None else len(self.roles))
+        self.roles.append(role)
+        return role
+
+    def add_member(self, name=None, bot=False, roles=(), joined_at=None, member_id=None):
+        member = FakeMember(self, name=name, bot=bot, roles=roles, joined_at=joined_at, member_id=member_id)
+        self.members[member.id] = member
+        return member
+
+    def add_channels(self, count, per_category=20):
+        category = None
+        for index in range(count):
+            if index % per_category == 0:
+                category = FakeCategory(self, f"category-{index // per_category}", position=index)
+                self.channels.append(category)
+            self.channels.append(FakeTextChannel(self, f"channel-{index}", category=category, position=index))
+
+    # discord.Guild API used by the cogs
+
+    @property
+    def text_channels(self):
+        return [channel for channel in self.channels if isinstance(channel, FakeTextChannel)]
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_channel(self, channel_id):
+        return next((channel for channel in self.channels if channel.id == channel_id), None)
+
+    async def query_members(self, user_ids=None, cache=True, **kwargs):
+        await asyncio.sleep(self.rest.latency)
+        return [self.members[user_id] for user_id in user_ids or () if user_id in self.members]
+
+    async def fetch_member(self, user_id):
+        await self.rest.call("GET /members")
+        member = self.members.get(user_id)
+        if member is None:
+            raise discord.NotFound(FakeResponseError(404), "Unknown Member")
+        return member
+
+    async def fetch_members(self, limit=1000, after=None):
+        # Pages of 1000 in ID order, each yielded newest-first like discord.py
+        if isinstance(after, datetime):
+            after = discord.Object(id=discord.utils.time_snowflake(after, high=True))
+        members = sorted(
+            (member for member in self.members.values() if after is None or member.id > after.id),
+            key=lambda member: member.id
+        )
+        for start in range(0, len(members), 1000):
+            await self.rest.call("GET /members")
+            for member in reversed(members[start:start + 1000]):
+                yield member
+
+    async def create_role(self, name, reason=None, **kwargs):
+        await self.rest.call("POST /roles")
+        return self.create_role_now(name)
+
+    async def create_category(self, name, reason=None, **kwargs):
+        await self.rest.call("POST /channels")
+        category = FakeCategory(self, name, position=len(self.channels))
+        self.channels.append(category)
+        return category
+
+    async def create_text_channel(self, name, category=None, overwrites=None, reason=None, **kwargs):
+        await self.rest.call("POST /channels")
+        channel = FakeTextChannel(self, name, category=category, position=len(self.channels))
+        channel.fake_overwrites = {target.id: overwrite for target, overwrite in (overwrites or {}).items()}
+        channel.synced = False
+        self.channels.append(channel)
+        return channel
+
+    async def ban(self, user, reason=None, **kwargs):
+        await self.rest.call("PUT /bans")
+        self.bans.add(user.id)
+        self.members.pop(user.id, None)
+
+    async def unban(self, user, reason=None):
+        await self.rest.call("DELETE /bans")
+        self.bans.discard(user.id)
+
+    async def kick(self, user, reason=None):
+        await self.rest.call("DELETE /members")
+        self.members.pop(user.id, None)
+
+
+class FakeInteractionResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, embed=None, embeds=None, view=None, ephemeral=False, **kwargs):
+        await self.interaction.rest.call("POST /interactions/callback")
+        self.done = True
+        self.interaction.original = FakeMessage(self.interaction.rest, content=content, embed=embed, embeds=embeds, view=view)
+
+    async def defer(self, ephemeral=False, **kwargs):
+        await self.interaction.rest.call("POST /interactions/callback")
+        self.done = True
+        self.interaction.original = FakeMessage(self.interaction.rest)
+
+    async def edit_message(self, content=None, embed=None, view=None, **kwargs):
+        await self.interaction.rest.call("POST /interactions/callback")
+        self.done = True
+        await self.interaction.original.edit(content=content, embed=embed, view=view)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, embed=None, embeds=None, view=None, ephemeral=False, wait=False, **kwargs):
+        await self.interaction.rest.call("POST /webhooks")
+        message = FakeMessage(self.interaction.rest, content=content, embed=embed, embeds=embeds, view=view)
+        self.interaction.followups.append(message)
+        return message
+
+
+class FakeInteraction:
+    def __init__(self, guild, user, client=None):
+        self.id = snowflake()
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.client = client
+        self.rest = guild.rest
+        self.command = None
+        self.extras = {}
+        self.original = None
+        self.followups = []
+        self.response = FakeInteractionResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, content=None, embed=None, embeds=None, view=None, **kwargs):
+        await self.rest.call("PATCH /webhooks/@original")
+        if self.original is None:
+            self.original = FakeMessage(self.rest)
+        self.original.content = content if content is not None else self.original.content
+        if embed is not None or embeds is not None:
+            self.original.embeds = embeds or [embed]
+        return self.original
+
+    async def original_response(self):
+        return self.original
+
+
+class FakeBot:
+    """Just enough of VerificationBot for cogs to be constructed and driven"""
+
+    def __init__(self, db, guilds=()):
+        self.db = db
+        self.guilds = list(guilds)
+        self.user = None
+        self.shard_label = "bench"
+        self.views = []
+
+    def get_guild(self, guild_id):
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    def get_cog(self, name):
+        return None
+
+    def get_partial_messageable(self, channel_id, **kwargs):
+        return next(channel for guild in self.guilds for channel in guild.channels if channel.id == channel_id)
+
+    def add_view(self, view, message_id=None):
+        self.views.append((view, message_id))
+
+    async def wait_until_ready(self):
+        return None
+
+    async def fetch_user(self, user_id):
+        return discord.Object(id=user_id)
+
+
+def old_account(guild, days, **kwargs):
+    """Add a member whose snowflake dates the account `days` ago"""
+    created = discord.utils.utcnow() - timedelta(days=days)
+    member_id = discord.utils.time_snowflake(created) + snowflake() % 4096
+    return guild.add_member(member_id=member_id, **kwargs)
+
+
+# Raw payloads for driving discord.py's own parsers, e.g. through the HTTP
+# interactions endpoint, instead of the duck-typed fakes above
+
+def user_payload(user_id, name=None):
+    return {
+        "id": str(user_id),
+        "username": name or f"user{user_id % 100000}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None
+    }
+
+
+def member_payload(user_id, name=None, roles=(), permissions=None, with_user=True):
+    payload = {
+        "roles": [str(role_id) for role_id in roles],
+        "joined_at": discord.utils.utcnow().isoformat(),
+        "deaf": False,
+        "mute": False,
+        "flags": 0
+    }
+    if with_user:
+        payload["user"] = user_payload(user_id, name)
+    if permissions is not None:
+        payload["permissions"] = str(permissions.value)
+    return payload
+
+
+def guild_payload(guild_id, name="Benchmark Guild"):
+    everyone = {
+        "id": str(guild_id),
+        "name": "@everyone",
+        "color": 0,
+        "hoist": False,
+        "position": 0,
+        "permissions": str(discord.Permissions.general().value),
+        "managed": False,
+        "mentionable": False
+    }
+    return {"id": str(guild_id), "name": name, "owner_id": "0", "roles": [everyone], "emojis": [], "features": []}
+
+
+def command_payload(application_id, guild_id, channel_id, member, name, options=(), resolved=None):
+    """An APPLICATION_COMMAND interaction as Discord POSTs it"""
+    return {
+        "id": str(snowflake()),
+        "application_id": str(application_id),
+        "type": 2,
+        "token": f"token-{snowflake()}",
+        "version": 1,
+        "guild_id": str(guild_id),
+        "channel_id": str(channel_id),
+        "member": member,
+        "app_permissions": str(discord.Permissions.all().value),
+        "locale": "en-US",
+        "guild_locale": "en-US",
+        "data": {
+            "id": str(snowflake()),
+            "name": name,
+            "type": 1,
+            "options": list(options),
+            "resolved": resolved or {}
+        }
+    }
+
+
+def signed_headers(signing_key, body, timestamp=None):
+    """Headers Discord would attach to `body`, signed with a local key"""
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    signature = signing_key.sign(timestamp.encode() + body).signature.hex()
+    return {
+        "Content-Type": "application/json",
+        "X-Signature-Ed25519": signature,
+        "X-Signature-Timestamp": timestamp
+    }
+
+
+def serve_guild_over_rest(http, rest, guild, channels):
+    """Point the REST calls used to rebuild a guild and fetch members at canned payloads"""
+    async def get_guild(guild_id, with_counts=True):
+        await rest.call("GET /guilds/{guild_id}")
+        return dict(guild)
+
+    async def get_all_guild_channels(guild_id):
+        await rest.call("GET /guilds/{guild_id}/channels")
+        return list(channels)
+
+    async def get_member(guild_id, member_id):
+        await rest.call("GET /guilds/{guild_id}/members/{member_id}")
+        return member_payload(int(member_id))
+
+    http.get_guild = get_guild
+    http.get_all_guild_channels = get_all_guild_channels
+    http.get_member = get_member
@@ -0,0 +1,453 @@
+# In-process, Motor-compatible document store for offline benchmarks
+#
+# Covers the subset of the Motor API the bot uses: filters with the common
+# comparison operators, projections (including $slice), the update operators
+# the cogs issue, cursors, bulk writes, and index bookkeeping that explain()
+# uses to tell index scans from collection scans.
+
+import asyncio
+import copy
+import re
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+MISSING = object()
+
+
+def get_path(document, path):
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return MISSING
+    return value
+
+
+def set_path(document, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def unset_path(document, path):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+
+
+def _compare(value, operator, operand):
+    if operator == "$eq":
+        return _equals(value, operand)
+    if operator == "$ne":
+        return not _equals(value, operand)
+    if operator == "$in":
+        return any(_equals(value, item) for item in operand)
+    if operator == "$nin":
+        return not any(_equals(value, item) for item in operand)
+    if operator == "$exists":
+        return (value is not MISSING) == bool(operand)
+    if operator == "$regex":
+        return isinstance(value, str) and re.search(operand, value) is not None
+    if value is MISSING or value is None:
+        return False
+    if operator == "$mod":
+        return isinstance(value, int) and value % operand[0] == operand[1]
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise NotImplementedError(f"Unsupported query operator {operator}")
+
+
+def _equals(value, operand):
+    if isinstance(value, list) and not isinstance(operand, list):
+        return operand in value
+    if value is MISSING:
+        return operand is None
+    return value == operand
+
+
+def matches(document, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, sub_query) for sub_query in condition):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(document, sub_query) for sub_query in condition):
+                return False
+            continue
+
+        value = get_path(document, key)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif not _equals(value, condition):
+            return False
+    return True
+
+
+def project(document, projection):
+    if not projection:
+        return copy.deepcopy(document)
+
+    include = [key for key, value in projection.items() if key != "_id" and (value is True or value == 1)]
+    result = {}
+    if include:
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+        for key in include:
+            value = get_path(document, key)
+            if value is not MISSING:
+                set_path(result, key, copy.deepcopy(value))
+    else:
+        result = copy.deepcopy(document)
+        for key, value in projection.items():
+            if value == 0 or value is False:
+                unset_path(result, key)
+
+    for key, value in projection.items():
+        if isinstance(value, dict) and "$slice" in value:
+            items = get_path(document, key)
+            if isinstance(items, list):
+                bounds = value["$slice"]
+                if isinstance(bounds, list):
+                    sliced = items[bounds[0]:bounds[0] + bounds[1]] if bounds[0] >= 0 else items[bounds[0]:][:bounds[1]]
+                else:
+                    sliced = items[:bounds] if bounds >= 0 else items[bounds:]
+                set_path(result, key, copy.deepcopy(sliced))
+    return result
+
+
+def apply_update(document, update, inserting=False):
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            if operator == "$set":
+                set_path(document, path, copy.deepcopy(value))
+            elif operator == "$setOnInsert":
+                if inserting:
+                    set_path(document, path, copy.deepcopy(value))
+            elif operator == "$unset":
+                unset_path(document, path)
+            elif operator == "$inc":
+                current = get_path(document, path)
+                set_path(document, path, (0 if current is MISSING else current) + value)
+            elif operator == "$max":
+                current = get_path(document, path)
+                if current is MISSING or value > current:
+                    set_path(document, path, value)
+            elif operator == "$min":
+                current = get_path(document, path)
+                if current is MISSING or value < current:
+                    set_path(document, path, value)
+            elif operator in ("$push", "$addToSet"):
+                current = get_path(document, path)
+                if current is MISSING:
+                    current = []
+                    set_path(document, path, current)
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in items:
+                    if operator == "$push" or item not in current:
+                        current.append(copy.deepcopy(item))
+                if isinstance(value, dict) and "$slice" in value:
+                    limit = value["$slice"]
+                    current[:] = current[limit:] if limit < 0 else current[:limit]
+            elif operator == "$pull":
+                current = get_path(document, path)
+                if isinstance(current, list):
+                    if isinstance(value, dict):
+                        current[:] = [item for item in current if not matches(item, value)]
+                    else:
+                        current[:] = [item for item in current if item != value]
+            else:
+                raise NotImplementedError(f"Unsupported update operator {operator}")
+
+
+def _upsert_seed(query):
+    document = {}
+    for key, value in query.items():
+        if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value)):
+            set_path(document, key, copy.deepcopy(value))
+    return document
+
+
+class Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction=None):
+        self._sort = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _results(self):
+        documents = [doc for doc in self.collection.documents if matches(doc, self.query)]
+        if self._sort:
+            for key, direction in reversed(self._sort):
+                documents.sort(
+                    key=lambda doc: (get_path(doc, key) is MISSING, _sort_key(get_path(doc, key))),
+                    reverse=direction < 0
+                )
+        documents = documents[self._skip:]
+        if self._limit:
+            documents = documents[:self._limit]
+        return [project(doc, self.projection) for doc in documents]
+
+    async def to_list(self, length=None):
+        await self.collection.database.tick()
+        results = self._results()
+        return results[:length] if length else results
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self.collection.database.tick()
+        for document in self._results():
+            yield document
+
+    async def explain(self):
+        """A plan shaped like mongod's: an IXSCAN when an index's leading field is filtered or sorted on"""
+        fields = {field for field in self.query if not field.startswith("$")}
+        if self._sort:
+            fields.add(self._sort[0][0])
+        for name, index in self.collection.indexes.items():
+            if index["key"][0][0] in fields:
+                plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}
+                break
+        else:
+            plan = {"stage": "COLLSCAN"}
+        return {"queryPlanner": {"winningPlan": plan}}
+
+
+def _sort_key(value):
+    if value is MISSING or value is None:
+        return (0, "")
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, datetime):
+        return (1, value.timestamp())
+    return (2, str(value))
+
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.documents = []
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+
+    def _find(self, query):
+        for document in self.documents:
+            if matches(document, query or {}):
+                return document
+        return None
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        await self.database.tick()
+        document = self._find(query)
+        return project(document, projection) if document is not None else None
+
+    def find(self, query=None, projection=None, **kwargs):
+        return MemoryCursor(self, query, projection)
+
+    async def count_documents(self, query, **kwargs):
+        await self.database.tick()
+        return sum(1 for document in self.documents if matches(document, query))
+
+    async def estimated_document_count(self, **kwargs):
+        return len(self.documents)
+
+    def _insert(self, document):
+        # Generated IDs cannot collide, so only caller-supplied ones are checked
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        elif any(existing["_id"] == document["_id"] for existing in self.documents):
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} _id: {document['_id']!r}")
+        self.documents.append(copy.deepcopy(document))
+        return document["_id"]
+
+    async def insert_one(self, document, **kwargs):
+        await self.database.tick()
+        return Result(inserted_id=self._insert(document))
+
+    async def insert_many(self, documents, **kwargs):
+        await self.database.tick()
+        return Result(inserted_ids=[self._insert(document) for document in documents])
+
+    def _update(self, query, update, upsert, many=False):
+        matched = [doc for doc in self.documents if matches(doc, query)]
+        if not many:
+            matched = matched[:1]
+        for document in matched:
+            apply_update(document, update)
+        if not matched and upsert:
+            document = _upsert_seed(query)
+            apply_update(document, update, inserting=True)
+            return len(matched), self._insert(document)
+        return len(matched), None
+
+    async def update_one(self, query, update, upsert=False, **kwargs):
+        await self.database.tick()
+        matched, upserted_id = self._update(query, update, upsert)
+        return Result(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    async def update_many(self, query, update, upsert=False, **kwargs):
+        await self.database.tick()
+        matched, upserted_id = self._update(query, update, upsert, many=True)
+        return Result(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    async def find_one_and_update(
+        self, query, update, projection=None, upsert=False,
+        return_document=ReturnDocument.BEFORE, sort=None, **kwargs
+    ):
+        await self.database.tick()
+        candidates = MemoryCursor(self, query, None)
+        if sort:
+            candidates.sort(sort)
+        ids = [doc["_id"] for doc in candidates._results()[:1]]
+        document = next((doc for doc in self.documents if ids and doc["_id"] == ids[0]), None)
+
+        if document is None:
+            if not upsert:
+                return None
+            document = _upsert_seed(query)
+            apply_update(document, update, inserting=True)
+            self._insert(document)
+            document = self._find({"_id": document["_id"]})
+            return project(document, projection) if return_document == ReturnDocument.AFTER else None
+
+        before = project(document, projection)
+        apply_update(document, update)
+        return project(document, projection) if return_document == ReturnDocument.AFTER else before
+
+    async def find_one_and_delete(self, query, projection=None, sort=None, **kwargs):
+        await self.database.tick()
+        candidates = MemoryCursor(self, query, None)
+        if sort:
+            candidates.sort(sort)
+        results = candidates._results()[:1]
+        if not results:
+            return None
+        self.documents = [doc for doc in self.documents if doc["_id"] != results[0]["_id"]]
+        return project(results[0], projection)
+
+    async def delete_one(self, query, **kwargs):
+        await self.database.tick()
+        document = self._find(query)
+        if document is not None:
+            self.documents.remove(document)
+        return Result(deleted_count=int(document is not None))
+
+    async def delete_many(self, query, **kwargs):
+        await self.database.tick()
+        before = len(self.documents)
+        self.documents = [doc for doc in self.documents if not matches(doc, query)]
+        return Result(deleted_count=before - len(self.documents))
+
+    async def bulk_write(self, operations, ordered=True, **kwargs):
+        await self.database.tick()
+        for operation in operations:
+            if isinstance(operation, UpdateOne):
+                self._update(operation._filter, operation._doc, operation._upsert)
+            elif isinstance(operation, InsertOne):
+                self._insert(operation._doc)
+            elif isinstance(operation, DeleteOne):
+                document = self._find(operation._filter)
+                if document is not None:
+                    self.documents.remove(document)
+            else:
+                raise NotImplementedError(f"Unsupported bulk operation {operation!r}")
+        return Result(acknowledged=True)
+
+    async def create_index(self, keys, name=None, **kwargs):
+        name = name or "_".join(f"{key}_{direction}" for key, direction in keys)
+        self.indexes[name] = {"key": list(keys), **kwargs}
+        return name
+
+    async def create_indexes(self, models, **kwargs):
+        names = []
+        for model in models:
+            spec = dict(model.document)
+            keys = list(spec.pop("key").items())
+            names.append(await self.create_index(keys, **spec))
+        return names
+
+    async def index_information(self):
+        return copy.deepcopy(self.indexes)
+
+    async def drop_index(self, name):
+        self.indexes.pop(name, None)
+
+    def watch(self, *args, **kwargs):
+        from pymongo.errors import OperationFailure
+        raise OperationFailure("Change streams are not supported by the in-memory store", code=40573)
+
+
+class MemoryDatabase:
+    """Dictionary-backed stand-in for an AsyncIOMotorDatabase"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.collections = {}
+        self.operations = 0
+
+    async def tick(self):
+        self.operations += 1
+        await asyncio.sleep(self.latency)
+
+    def __getitem__(self, name):
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name, value=1, **kwargs):
+        """Only collMod's index expiry change, which ensure_indexes issues"""
+        if name != "collMod":
+            raise NotImplementedError(f"Unsupported command {name}")
+        await self.tick()
+        change = kwargs["index"]
+        self[value].indexes[change["name"]]["expireAfterSeconds"] = change["expireAfterSeconds"]
+        return {"ok": 1.0}
+
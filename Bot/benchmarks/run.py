@@ -0,0 +1,685 @@
+"""Offline benchmarks for the cogs
+
+Drives the real cog methods with fake Discord objects and an in-memory,
+Motor-compatible store (or a real mongod via --mongodb-url) and prints one
+JSON document with throughput and latency percentiles per scenario.
+
+    python -m benchmarks.run --scenarios join_storm warn_storm --output results.json
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+
+import aiohttp
+import discord
+from discord.ext import commands
+from nacl.signing import SigningKey
+
+import config
+from utils import (
+    guild_cache, verified_set, mod_log, percentile, JoinPipeline, RaidDetector, VerifiedSet, InteractionServer, AltGraph,
+    apply_role_overwrite
+)
+from utils.mod_log import MAX_EMBEDS
+from cogs.moderation import Moderation
+from cogs.verification import Verification, RESTRICT_UNVERIFIED
+from .fakes import (
+    FakeRest, FakeGuild, FakeBot, FakeInteraction, FakeTextChannel, snowflake, user_payload, member_payload, guild_payload,
+    command_payload, signed_headers, serve_guild_over_rest
+)
+from .memory_db import MemoryDatabase
+
+
+class Recorder:
+    """Collects per-operation latencies for one scenario"""
+
+    def __init__(self):
+        self.latencies = []
+        self.started = time.perf_counter()
+
+    async def time(self, coroutine):
+        started = time.perf_counter()
+        result = await coroutine
+        self.latencies.append(time.perf_counter() - started)
+        return result
+
+    def summary(self, rest=None, db=None, **extra):
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+        result = {
+            "operations": len(latencies),
+            "elapsed_seconds": round(elapsed, 4),
+            "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+            "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3)
+        }
+        if rest is not None:
+            result["rest_calls"] = rest.calls
+        if isinstance(db, MemoryDatabase):
+            result["db_operations"] = db.operations
+        result.update(extra)
+        return result
+
+
+async def configure_verification(bot, guild):
+    """Give the guild a verification setup the way /verifypanel leaves it"""
+    verified_role = guild.create_role_now(config.VERIFIED_ROLE_NAME)
+    unverified_role = guild.create_role_now(config.UNVERIFIED_ROLE_NAME)
+    await bot.db.guilds.update_one(
+        {"guild_id": str(guild.id)},
+        {"$set": {"verification": {
+            "enabled": True,
+            "verified_role_id": str(verified_role.id),
+            "unverified_role_id": str(unverified_role.id),
+            "verify_channel_id": "0"
+        }}},
+        upsert=True
+    )
+    return verified_role, unverified_role
+
+
+async def wait_for_drain(pipeline):
+    while pipeline.queue_depth() or any(queue.workers for queue in pipeline.guilds.values()):
+        await asyncio.sleep(0.01)
+
+
+async def bench_join_storm(db, args):
+    """Member joins hitting on_member_join, then the time to drain role assignment"""
+    rest = FakeRest(args.rest_latency)
+    guild = FakeGuild(rest)
+    bot = FakeBot(db, [guild])
+    await configure_verification(bot, guild)
+
+    await verified_set.load(db)
+    cog = Verification(bot)
+    cog.join_pipeline = JoinPipeline(
+        workers=args.join_workers,
+        rate=args.join_rate,
+        burst=args.join_workers,
+        raid_threshold=args.joins + 1
+    )
+
+    members = [guild.add_member() for _ in range(args.joins)]
+    recorder = Recorder()
+    for member in members:
+        await recorder.time(cog.on_member_join(member))
+    handled = time.perf_counter() - recorder.started
+    await wait_for_drain(cog.join_pipeline)
+
+    return recorder.summary(
+        rest,
+        db,
+        handler_seconds=round(handled, 4),
+        assignment=cog.join_pipeline.stats()
+    )
+
+
+async def bench_warn_storm(db, args):
+    """/warn on a guild that already holds many warnings"""
+    rest = FakeRest(args.rest_latency)
+    guild = FakeGuild(rest)
+    bot = FakeBot(db, [guild])
+    moderator = guild.add_member("moderator", roles=[guild.create_role_now("Moderator", 50)])
+
+    users = [guild.add_member() for _ in range(max(1, args.existing_warns // 10))]
+    warn = {"reason": "seed", "moderator_id": str(moderator.id), "timestamp": "2024-01-01T00:00:00"}
+    await db.warns.insert_many([
+        {"guild_id": str(guild.id), "user_id": str(user.id), "warns": [dict(warn) for _ in range(10)], "count": 10}
+        for user in users
+    ])
+    # Keep users in the guild so the storm measures the warn path, not auto-bans
+    await db.guilds.update_one(
+        {"guild_id": str(guild.id)},
+        {"$set": {"settings": {"max_warns": 10 ** 9}}},
+        upsert=True
+    )
+
+    cog = Moderation(bot)
+    recorder = Recorder()
+    for _ in range(args.warns):
+        interaction = FakeInteraction(guild, moderator, bot)
+        await recorder.time(cog.warn.callback(cog, interaction, random.choice(users), "Benchmark warning"))
+    return recorder.summary(rest, db, existing_warns=len(users) * 10)
+
+
+async def bench_mod_log_burst(db, args):
+    """A burst of /warn with a mod-log channel, one embed per message versus coalesced"""
+    rest = FakeRest(args.rest_latency)
+    guild = FakeGuild(rest)
+    bot = FakeBot(db, [guild])
+    moderator = guild.add_member("moderator", roles=[guild.create_role_now("Moderator", 50)])
+    users = [guild.add_member() for _ in range(max(1, args.mod_log_actions))]
+    channel = FakeTextChannel(guild, "mod-log")
+    guild.channels.append(channel)
+    await db.guilds.update_one(
+        {"guild_id": str(guild.id)},
+        {"$set": {"settings": {"max_warns": 10 ** 9, "mod_log_channel_id": str(channel.id)}}},
+        upsert=True
+    )
+
+    cog = Moderation(bot)
+    runs = {}
+    try:
+        for label, max_embeds in (("per_action", 1), ("coalesced", MAX_EMBEDS)):
+            mod_log.max_embeds = max_embeds
+            mod_log.messages = 0
+            mod_log.start(bot)
+            sent_before = rest.routes.get("POST /channels/messages", 0)
+            recorder = Recorder()
+            for user in users:
+                interaction = FakeInteraction(guild, moderator, bot)
+                await recorder.time(cog.warn.callback(cog, interaction, user, "Benchmark warning"))
+            await mod_log.close()
+            runs[label] = recorder.summary(
+                channel_messages=rest.routes.get("POST /channels/messages", 0) - sent_before,
+                **{f"mod_log_{key}": value for key, value in mod_log.stats().items() if key.startswith("queue_latency")}
+            )
+    finally:
+        mod_log.max_embeds = MAX_EMBEDS
+        mod_log.bot = None
+
+    return {
+        "actions": len(users),
+        **runs,
+        "message_reduction": round(runs["per_action"]["channel_messages"] / max(1, runs["coalesced"]["channel_messages"]), 2)
+    }
+
+
+async def bench_warnings_heavy(db, args):
+    """/warnings for a user with a long warning history"""
+    rest = FakeRest(args.rest_latency)
+    guild = FakeGuild(rest)
+    bot = FakeBot(db, [guild])
+    moderators = [guild.add_member(f"moderator{i}", roles=[guild.create_role_now(f"Mod{i}", 50)]) for i in range(20)]
+    user = guild.add_member("heavy")
+
+    await db.warns.insert_one({
+        "guild_id": str(guild.id),
+        "user_id": str(user.id),
+        "warns": [
+            {"reason": f"warn {i}", "moderator_id": str(moderators[i % 20].id), "timestamp": "2024-01-01T00:00:00"}
+            for i in range(args.heavy_warns)
+        ],
+        "count": args.heavy_warns
+    })
+
+    cog = Moderation(bot)
+    recorder = Recorder()
+    for _ in range(args.iterations):
+        interaction = FakeInteraction(guild, moderators[0], bot)
+        await recorder.time(cog.warnings.callback(cog, interaction, user))
+    return recorder.summary(rest, db, warns_per_user=args.heavy_warns)
+
+
+async def bench_verifypanel(db, args):
+    """/verifypanel on a guild with many channels, first run and re-run"""
+    rest = FakeRest(args.rest_latency)
+    guild = FakeGuild(rest)
+    guild.add_channels(args.channels)
+    bot = FakeBot(db, [guild])
+    admin = guild.add_member("admin", roles=[guild.create_role_now("Admin", 90)])
+
+    cog = Verification(bot)
+    recorder = Recorder()
+    await recorder.time(cog.verifypanel.callback(cog, FakeInteraction(guild, admin, bot)))
+    first_rest_calls = rest.calls
+    await recorder.time(cog.verifypanel.callback(cog, FakeInteraction(guild, admin, bot)))
+
+    return recorder.summary(
+        rest,
+        db,
+        channels=args.channels,
+        first_run_ms=round(recorder.latencies[0] * 1000, 3),
+        rerun_ms=round(recorder.latencies[1] * 1000, 3),
+        first_run_rest_calls=first_rest_calls,
+        rerun_rest_calls=rest.calls - first_rest_calls
+    )
+
+
+async def bench_permission_rollout(db, args):
+    """Sequential vs bounded-concurrency permission rollout over N channels"""
+    results = {}
+    for label, concurrency in (("sequential", 1), ("parallel", config.PERMISSION_ROLLOUT_CONCURRENCY)):
+        rest = FakeRest(args.rest_latency)
+        guild = FakeGuild(rest)
+        guild.add_channels(args.channels)
+        role = guild.create_role_now(config.UNVERIFIED_ROLE_NAME)
+
+        started = time.perf_counter()
+        rollout = await apply_role_overwrite(guild, role, RESTRICT_UNVERIFIED, concurrency=concurrency)
+        results[label] = {
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+            "rest_calls": rest.calls,
+            "updated": rollout.updated,
+            "synced": rollout.synced
+        }
+    results["speedup"] = round(results["sequential"]["elapsed_seconds"] / results["parallel"]["elapsed_seconds"], 2)
+    results["channels"] = args.channels
+    return results
+
+
+def organic_join(rng, now):
+    """A join from an established account with an ordinary username"""
+    syllables = (
+        "ka", "ri", "to", "mo", "zen", "lu", "dra", "vi", "sha", "nor", "el", "qu", "fin", "ax", "bel",
+        "cor", "dun", "fay", "gil", "hal", "iro", "jun", "kel", "mar", "nix", "ost", "pel", "rax", "sol", "tam"
+    )
+    name = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+    if rng.random() < 0.4:
+        name += str(rng.randint(1, 9999))
+    created = now - timedelta(days=rng.uniform(30, 3000))
+    return discord.utils.time_snowflake(created) + rng.randrange(4096), name, rng.random() < 0.7
+
+
+def raid_join(rng, now, wave):
+    """A join from a freshly created account following the wave's naming pattern"""
+    created = now - timedelta(minutes=rng.uniform(5, 50))
+    name = f"{wave}{rng.randint(100, 99999)}"
+    return discord.utils.time_snowflake(created) + rng.randrange(4096), name, False
+
+
+async def bench_raid_detector(db, args):
+    """Raid detector cost per join across a sustained join stream with raid waves"""
+    rng = random.Random(args.seed)
+    detector = RaidDetector()
+    now = discord.utils.utcnow()
+    clock = now.timestamp()
+    interval = 60 / args.joins_per_minute
+    total = int(args.joins_per_minute * args.raid_minutes)
+    waves = ("freenitro", "discordmod_", "giveaway.bot")
+
+    raid_ids = set()
+    flagged_ids = set()
+    segment_size = max(1, total // 10)
+    segment_means = []
+    segment = []
+    for index in range(total):
+        # Every 2000 joins, a 50-account wave arrives interleaved with organic joins
+        in_wave = index % 2000 < 150 and index % 3 == 0
+        if in_wave:
+            user_id, name, has_avatar = raid_join(rng, now, waves[index // 2000 % len(waves)])
+            raid_ids.add(user_id)
+        else:
+            user_id, name, has_avatar = organic_join(rng, now)
+
+        started = time.perf_counter()
+        cluster = detector.observe(1, user_id, name, has_avatar, now=clock)
+        segment.append(time.perf_counter() - started)
+        if cluster:
+            flagged_ids.update(cluster.member_ids)
+
+        clock += interval
+        if len(segment) == segment_size:
+            segment_means.append(sum(segment) / len(segment))
+            segment = []
+
+    return {
+        "joins": total,
+        "joins_per_minute": args.joins_per_minute,
+        # Mean cost per join over consecutive tenths of the stream; flat means bounded state
+        "per_join_us_by_segment": [round(mean * 1e6, 2) for mean in segment_means],
+        "raid_accounts": len(raid_ids),
+        "raid_accounts_flagged": len(raid_ids & flagged_ids),
+        "organic_accounts_flagged": len(flagged_ids - raid_ids),
+        "detector": detector.stats()
+    }
+
+
+async def bench_verified_set(db, args):
+    """Memory and lookup cost of the verified-member set"""
+    rng = random.Random(args.seed)
+    guild_ids = [rng.getrandbits(60) for _ in range(args.verified_guilds)]
+    pairs = [(rng.choice(guild_ids), rng.getrandbits(60)) for _ in range(args.verified_entries)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    verified = VerifiedSet()
+    verified.build(pairs)
+    build_seconds = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = rng.sample(pairs, min(10000, len(pairs)))
+    timings = {}
+    for label, lookups in (("hit", samples), ("miss", [(guild_id, user_id + 1) for guild_id, user_id in samples])):
+        started = time.perf_counter()
+        for guild_id, user_id in lookups:
+            verified.contains(guild_id, user_id)
+        timings[label] = (time.perf_counter() - started) / len(lookups)
+
+    started = time.perf_counter()
+    for _ in range(verified.merge_threshold):
+        verified.add(guild_ids[0], rng.getrandbits(60))
+    merge_seconds = time.perf_counter() - started
+
+    millions = len(pairs) / 1_000_000
+    return {
+        "entries": len(pairs),
+        "guilds": len(guild_ids),
+        "build_seconds": round(build_seconds, 3),
+        "memory_bytes_per_million": round(verified.memory_bytes() / millions) if millions else None,
+        "traced_retained_bytes_per_million": round(retained / millions) if millions else None,
+        "traced_peak_bytes_per_million": round(peak / millions) if millions else None,
+        "lookup_hit_us": round(timings["hit"] * 1e6, 3),
+        "lookup_miss_us": round(timings["miss"] * 1e6, 3),
+        "merge_threshold_adds_ms": round(merge_seconds * 1000, 3)
+    }
+
+
+def alt_graph_rows(rng, guild_ids, count, reuse_ratio):
+    """Verification rows where a share of accounts reuse an IP already seen in their guild"""
+    seen_ips = {guild_id: [] for guild_id in guild_ids}
+    for index in range(count):
+        guild_id = rng.choice(guild_ids)
+        ips = seen_ips[guild_id]
+        if ips and rng.random() < reuse_ratio:
+            ip = rng.choice(ips)
+        else:
+            ip = f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+            # Keeping every IP would dominate the benchmark's own memory
+            if len(ips) < 1000:
+                ips.append(ip)
+            else:
+                ips[rng.randrange(len(ips))] = ip
+        yield {"guild_id": str(guild_id), "user_id": str(rng.getrandbits(60)), "client_info": {"ip": ip}}
+
+
+async def bench_alt_graph(db, args):
+    """Bootstrap time and memory of the alt-account graph, and /alts lookup cost"""
+    rng = random.Random(args.seed)
+    guild_ids = [rng.getrandbits(60) for _ in range(args.verified_guilds)]
+    # Timed the way load() stages a cursor, leaving out the cost of generating rows
+    graph = AltGraph()
+    staged = {}
+    rows = alt_graph_rows(random.Random(args.seed), guild_ids, args.verified_entries, args.alt_reuse_ratio)
+    build_seconds = 0.0
+    while True:
+        chunk = list(itertools.islice(rows, 100_000))
+        if not chunk:
+            break
+        started = time.perf_counter()
+        for verification in chunk:
+            graph._stage(staged, verification)
+        build_seconds += time.perf_counter() - started
+    started = time.perf_counter()
+    graph._install(staged)
+    build_seconds += time.perf_counter() - started
+    graph.loaded = True
+
+    # Same rows again under tracemalloc for what the graph keeps
+    tracemalloc.start()
+    traced = AltGraph()
+    traced.build(alt_graph_rows(random.Random(args.seed), guild_ids, args.verified_entries, args.alt_reuse_ratio))
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced
+
+    clustered = [
+        (guild_id, members[0])
+        for guild_id, guild_graph in graph.guilds.items()
+        for members in guild_graph.members.values()
+    ]
+    samples = rng.sample(clustered, min(10000, len(clustered)))
+    started = time.perf_counter()
+    sizes = [len(graph.cluster(guild_id, user_id)) for guild_id, user_id in samples]
+    lookup_seconds = (time.perf_counter() - started) / max(1, len(samples))
+
+    # Incremental verifications after startup, through the delta and its merges
+    additions = list(alt_graph_rows(rng, guild_ids, args.iterations * 100, args.alt_reuse_ratio))
+    started = time.perf_counter()
+    for verification in additions:
+        graph.add_verification(verification)
+    add_seconds = (time.perf_counter() - started) / len(additions)
+
+    millions = args.verified_entries / 1_000_000
+    return {
+        "verifications": args.verified_entries,
+        "guilds": len(guild_ids),
+        "build_seconds": round(build_seconds, 3),
+        "traced_retained_bytes_per_million": round(retained / millions) if millions else None,
+        "traced_peak_bytes_per_million": round(peak / millions) if millions else None,
+        "cluster_lookup_us": round(lookup_seconds * 1e6, 3),
+        "incremental_add_us": round(add_seconds * 1e6, 3),
+        "mean_cluster_size": round(sum(sizes) / len(sizes), 2) if sizes else 0,
+        **graph.stats()
+    }
+
+
+def member_cache_configs():
+    """(label, intents, member cache flags, message cache size) before and after the intents trim"""
+    trimmed = discord.Intents.none()
+    trimmed.guilds = trimmed.members = trimmed.moderation = trimmed.guild_messages = True
+    return [
+        ("all_intents", discord.Intents.all(), discord.MemberCacheFlags.all(), 1000),
+        ("trimmed", trimmed, discord.MemberCacheFlags.none(), None)
+    ]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+async def bench_member_cache(db, args):
+    """Memory held by GUILD_CREATE payloads with every member, as chunking delivers them
+
+    Compares the old Intents.all() with a full member cache against the
+    trimmed intents with the member cache turned off.
+    """
+    guilds = []
+    for _ in range(args.cache_guilds):
+        guild_id = snowflake()
+        members = [member_payload(snowflake()) for _ in range(args.cache_members_per_guild)]
+        presences = [
+            {"user": {"id": member["user"]["id"]}, "status": "online", "activities": [], "client_status": {"desktop": "online"}}
+            for member in members
+        ]
+        guilds.append({**guild_payload(guild_id), "members": members, "presences": presences, "member_count": len(members)})
+
+    results = {"guilds": len(guilds), "members": len(guilds) * args.cache_members_per_guild}
+    for label, intents, member_cache_flags, max_messages in member_cache_configs():
+        gc.collect()
+        rss_before = rss_bytes()
+        tracemalloc.start()
+        started = time.perf_counter()
+        bot = commands.Bot(
+            command_prefix=commands.when_mentioned,
+            intents=intents,
+            member_cache_flags=member_cache_flags,
+            max_messages=max_messages
+        )
+        for data in guilds:
+            bot._connection._add_guild_from_data(data)
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = rss_bytes()
+        results[label] = {
+            "cached_members": sum(len(guild.members) for guild in bot.guilds),
+            "cached_users": len(bot._connection._users),
+            "load_seconds": round(elapsed, 3),
+            "retained_mb": round(retained / 2 ** 20, 2),
+            "rss_delta_mb": round((rss_after - rss_before) / 2 ** 20, 2) if rss_before is not None else None
+        }
+        await bot.close()
+        del bot
+    results["retained_saved_mb"] = round(results["all_intents"]["retained_mb"] - results["trimmed"]["retained_mb"], 2)
+    return results
+
+
+async def bench_http_interactions(db, args):
+    """Signed /warnings interactions through the HTTP endpoint into the real command tree
+
+    The guild and moderators come from canned REST payloads, so this covers
+    signature checks, guild rebuilding, dispatch and the inline response.
+    """
+    rest = FakeRest(args.rest_latency)
+    signing_key = SigningKey.generate()
+    application_id, guild_id, channel_id = snowflake(), snowflake(), snowflake()
+    moderator_id, target_id = snowflake(), snowflake()
+
+    warn = {"reason": "seed", "moderator_id": str(moderator_id), "timestamp": "2024-01-01T00:00:00"}
+    await db.warns.insert_one({
+        "guild_id": str(guild_id), "user_id": str(target_id), "warns": [dict(warn) for _ in range(3)], "count": 3
+    })
+
+    mode = config.RUNTIME_MODE
+    config.RUNTIME_MODE = "http"
+    bot = commands.Bot(command_prefix=commands.when_mentioned, intents=discord.Intents.none())
+    bot.db = db
+    try:
+        async with bot:
+            state = bot._connection
+            state.user = discord.ClientUser(state=state, data={**user_payload(application_id, "bench-bot"), "bot": True})
+            serve_guild_over_rest(bot.http, rest, guild_payload(guild_id), [])
+            await bot.add_cog(Moderation(bot))
+
+            server = InteractionServer(bot, public_key=signing_key.verify_key.encode().hex())
+            runner = await server.start("127.0.0.1", 0)
+            url = f"http://127.0.0.1:{runner.addresses[0][1]}/interactions"
+
+            moderator = member_payload(moderator_id, "moderator", permissions=discord.Permissions.all())
+            resolved = {
+                "users": {str(target_id): user_payload(target_id)},
+                "members": {str(target_id): member_payload(target_id, with_user=False)}
+            }
+            options = [{"name": "user", "type": 6, "value": str(target_id)}]
+
+            def warnings_interaction():
+                return command_payload(application_id, guild_id, channel_id, moderator, "warnings", options, resolved)
+
+            async with aiohttp.ClientSession() as session:
+                async def post(payload, forged=False):
+                    body = json.dumps(payload).encode()
+                    headers = signed_headers(signing_key, body)
+                    if forged:
+                        headers["X-Signature-Ed25519"] = "00" * 64
+                    async with session.post(url, data=body, headers=headers) as response:
+                        return response.status, await response.json() if response.status == 200 else None
+
+                _, pong = await post({"type": 1})
+                forged_status, _ = await post(warnings_interaction(), forged=True)
+
+                semaphore = asyncio.Semaphore(args.http_concurrency)
+                recorder = Recorder()
+
+                async def invoke():
+                    async with semaphore:
+                        return await recorder.time(post(warnings_interaction()))
+
+                responses = await asyncio.gather(*(invoke() for _ in range(args.iterations)))
+            await server.close()
+    finally:
+        config.RUNTIME_MODE = mode
+
+    inline = sum(
+        1 for status, body in responses
+        if status == 200 and body["type"] == 4 and body["data"]["embeds"][0]["title"].startswith("⚠️ Warnings")
+    )
+    return recorder.summary(
+        rest,
+        db,
+        pong=pong == {"type": 1},
+        forged_status=forged_status,
+        inline_responses=inline,
+        endpoint=server.stats()
+    )
+
+
+SCENARIOS = {
+    "join_storm": bench_join_storm,
+    "warn_storm": bench_warn_storm,
+    "mod_log_burst": bench_mod_log_burst,
+    "warnings_heavy": bench_warnings_heavy,
+    "verifypanel": bench_verifypanel,
+    "permission_rollout": bench_permission_rollout,
+    "raid_detector": bench_raid_detector,
+    "verified_set": bench_verified_set,
+    "http_interactions": bench_http_interactions,
+    "member_cache": bench_member_cache,
+    "alt_graph": bench_alt_graph
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--mongodb-url", help="Benchmark against a real mongod instead of the in-memory store")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Simulated seconds per in-memory DB call")
+    parser.add_argument("--rest-latency", type=float, default=0.005, help="Simulated seconds per Discord REST call")
+    parser.add_argument("--joins", type=int, default=10000)
+    parser.add_argument("--join-workers", type=int, default=config.JOIN_QUEUE_WORKERS)
+    parser.add_argument("--join-rate", type=float, default=1000)
+    parser.add_argument("--existing-warns", type=int, default=50000)
+    parser.add_argument("--warns", type=int, default=1000)
+    parser.add_argument("--heavy-warns", type=int, default=200)
+    parser.add_argument("--mod-log-actions", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=600)
+    parser.add_argument("--joins-per-minute", type=int, default=10000)
+    parser.add_argument("--raid-minutes", type=float, default=10)
+    parser.add_argument("--verified-entries", type=int, default=1_000_000)
+    parser.add_argument("--verified-guilds", type=int, default=100)
+    parser.add_argument("--http-concurrency", type=int, default=20)
+    parser.add_argument("--cache-guilds", type=int, default=20)
+    parser.add_argument("--cache-members-per-guild", type=int, default=5000)
+    parser.add_argument("--alt-reuse-ratio", type=float, default=0.02, help="Share of verifications reusing a seen IP")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    random.seed(args.seed)
+    results = {"config": {key: value for key, value in vars(args).items() if key != "mongodb_url"}, "scenarios": {}}
+
+    for name in args.scenarios:
+        guild_cache.clear()
+        verified_set.clear()
+        if args.mongodb_url:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            client = AsyncIOMotorClient(args.mongodb_url)
+            db_name = f"bench_{uuid.uuid4().hex[:8]}"
+            db = client[db_name]
+        else:
+            client = None
+            db = MemoryDatabase(latency=args.db_latency)
+
+        try:
+            results["scenarios"][name] = await SCENARIOS[name](db, args)
+        finally:
+            if client is not None:
+                await client.drop_database(db_name)
+                client.close()
+        print(f"{name}: done", file=sys.stderr)
+
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
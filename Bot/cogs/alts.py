@@ -0,0 +1,49 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import config
+from utils import alt_graph
+
+# Mentions listed in one /alts embed; larger clusters are summarised
+MAX_LISTED = 50
+
+
+class Alts(commands.Cog):
+    """Look up accounts linked by shared IPs or fingerprints"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="alts", description="Show accounts linked to a user through shared IPs")
+    @app_commands.describe(user="The user to look up")
+    @app_commands.checks.has_permissions(ban_members=True)
+    async def alts(self, interaction: discord.Interaction, user: discord.User):
+        if not alt_graph.loaded:
+            await interaction.response.send_message(
+                "⏳ The alt-account index is still loading, try again shortly.",
+                ephemeral=True
+            )
+            return
+
+        linked = [user_id for user_id in alt_graph.cluster(interaction.guild.id, user.id) if user_id != user.id]
+        if not linked:
+            await interaction.response.send_message(f"✅ No accounts linked to {user.mention}.", ephemeral=True)
+            return
+
+        listed = "\n".join(f"<@{user_id}> ({user_id})" for user_id in sorted(linked)[:MAX_LISTED])
+        if len(linked) > MAX_LISTED:
+            listed += f"\n…and {len(linked) - MAX_LISTED} more"
+
+        # The list goes in the description, which holds far more than a field
+        embed = discord.Embed(
+            title=f"🔗 Linked Accounts for {user.display_name}",
+            description=f"**{len(linked)}** account(s) share an IP or fingerprint with {user.mention}, "
+                        f"directly or through other accounts:\n\n{listed}",
+            color=config.EMBED_COLOR_WARNING
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(Alts(bot))
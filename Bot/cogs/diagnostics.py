@@ -0,0 +1,35 @@
+import io
+import time
+
+import discord
+from discord.ext import commands
+
+import config
+from utils import profiler
+
+
+class Diagnostics(commands.Cog):
+    """Owner tools for looking inside the running process"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="profile", hidden=True)
+    @commands.is_owner()
+    async def profile(self, ctx, seconds: float = 10):
+        """Sample every thread's stack and upload a collapsed-stack flame graph input"""
+        seconds = min(max(seconds, 1), config.PROFILER_MAX_SECONDS)
+        if profiler.running:
+            await ctx.send("❌ A profile is already running.")
+            return
+
+        await ctx.send(f"⏳ Profiling for {seconds:g}s...")
+        collapsed, samples = await profiler.profile(seconds)
+        await ctx.send(
+            f"✅ Collected **{samples}** stack samples. Open the file in speedscope or pass it to flamegraph.pl.",
+            file=discord.File(io.BytesIO(collapsed.encode()), filename=f"profile-{int(time.time())}.folded")
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(Diagnostics(bot))
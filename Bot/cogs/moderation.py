@@ -1,26 +1,112 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from datetime import datetime
+from discord.ui import Button, View
+from datetime import datetime, timedelta
+from bson import ObjectId
 import config
+from utils import (
+    get_guild_config, get_warns_page, add_warn, clear_warns, expire_warn, migrate_embedded_warns, resolve_members,
+    save_guild_config, save_mod_actions, parse_user_ids, collect_targets, add_truncation_field,
+    run_bulk, progress_embed, scheduler, mod_log
+)
+
+class WarningsView(View):
+    """Previous/next buttons for /warnings; each page is fetched only when shown"""
+
+    def __init__(self, cog, interaction, user, total, max_warns):
+        super().__init__(timeout=180)
+        self.cog = cog
+        self.interaction = interaction
+        self.user = user
+        self.total = total
+        self.max_warns = max_warns
+        self.page = 0
+        self.pages = -(-total // config.WARNINGS_PAGE_SIZE)
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.interaction.user.id:
+            await interaction.response.send_message("❌ Only the person who ran this command can page through it.", ephemeral=True)
+            return False
+        return True
+
+    async def show(self, interaction, page):
+        self.page = page
+        warns, self.total = await get_warns_page(
+            self.cog.bot.db, interaction.guild.id, self.user.id, page, config.WARNINGS_PAGE_SIZE
+        )
+        self.pages = max(1, -(-self.total // config.WARNINGS_PAGE_SIZE))
+        self.update_buttons()
+        embed = await self.cog.warnings_embed(interaction.guild, self.user, warns, page, self.total, self.max_warns)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: Button):
+        await self.show(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: Button):
+        await self.show(interaction, min(self.pages - 1, self.page + 1))
+
+    async def on_timeout(self):
+        try:
+            await self.interaction.edit_original_response(view=None)
+        except discord.HTTPException:
+            pass
 
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        scheduler.register("unban", self.run_scheduled_unban)
+        scheduler.register("expire_warn", self.run_warn_expiry)
 
     async def get_guild_data(self, guild_id):
         """Get or create guild data in database"""
-        guild_data = await self.bot.db.guilds.find_one({"guild_id": str(guild_id)})
-        if not guild_data:
-            guild_data = {
-                "guild_id": str(guild_id),
-                "warns": {},
-                "settings": {
-                    "max_warns": config.MAX_WARNS_BEFORE_BAN
-                }
-            }
-            await self.bot.db.guilds.insert_one(guild_data)
-        return guild_data
+        return await get_guild_config(self.bot.db, guild_id)
+
+    async def log_action(self, interaction, action, user_id, reason, embed=None, urgent=False):
+        """Record a single moderation action in the audit log and the guild's mod-log channel"""
+        await save_mod_actions(self.bot.db, [{
+            "guild_id": str(interaction.guild.id),
+            "user_id": str(user_id),
+            "moderator_id": str(interaction.user.id),
+            "action": action,
+            "reason": reason,
+            "timestamp": datetime.utcnow().isoformat()
+        }])
+        if embed is not None:
+            await mod_log.post(self.bot.db, interaction.guild.id, embed, urgent=urgent)
+
+    async def run_scheduled_unban(self, action):
+        """Lift a temporary ban once it expires"""
+        guild = self.bot.get_guild(int(action["guild_id"]))
+        if guild is None:
+            # Not cached yet or unavailable; the scheduler retries with backoff
+            raise LookupError(f"Guild {action['guild_id']} is not available")
+        await guild.unban(discord.Object(id=int(action["user_id"])), reason="Temporary ban expired")
+        await save_mod_actions(self.bot.db, [{
+            "guild_id": action["guild_id"],
+            "user_id": action["user_id"],
+            "moderator_id": str(self.bot.user.id) if self.bot.user else None,
+            "action": "unban",
+            "reason": "Temporary ban expired",
+            "timestamp": datetime.utcnow().isoformat()
+        }])
+        embed = discord.Embed(
+            title="✅ Temporary Ban Expired",
+            description=f"<@{action['user_id']}> ({action['user_id']}) has been unbanned",
+            color=config.EMBED_COLOR_SUCCESS,
+            timestamp=datetime.utcnow()
+        )
+        await mod_log.post(self.bot.db, guild.id, embed)
+
+    async def run_warn_expiry(self, action):
+        await expire_warn(self.bot.db, action["guild_id"], action["user_id"], action["warn_id"])
 
     @app_commands.command(name="warn", description="Warn a user")
     @app_commands.describe(user="The user to warn", reason="Reason for the warning")
@@ -39,30 +125,25 @@ class Moderation(commands.Cog):
             return
 
         guild_data = await self.get_guild_data(interaction.guild.id)
-        user_id = str(user.id)
-
-        # Initialize user warns if not exists
-        if user_id not in guild_data.get("warns", {}):
-            guild_data["warns"] = guild_data.get("warns", {})
-            guild_data["warns"][user_id] = []
 
         # Add warn
         warn_data = {
+            "id": str(ObjectId()),
             "reason": reason,
             "moderator_id": str(interaction.user.id),
             "timestamp": datetime.utcnow().isoformat()
         }
-        guild_data["warns"][user_id].append(warn_data)
-
-        # Update database
-        await self.bot.db.guilds.update_one(
-            {"guild_id": str(interaction.guild.id)},
-            {"$set": {"warns": guild_data["warns"]}}
-        )
-
-        warn_count = len(guild_data["warns"][user_id])
+        warn_count = await add_warn(self.bot.db, interaction.guild.id, user.id, warn_data)
         max_warns = guild_data.get("settings", {}).get("max_warns", config.MAX_WARNS_BEFORE_BAN)
 
+        expiry_days = guild_data.get("settings", {}).get("warn_expiry_days", config.WARN_EXPIRY_DAYS)
+        if expiry_days:
+            await scheduler.schedule(
+                self.bot.db, interaction.guild.id, user.id, "expire_warn",
+                discord.utils.utcnow() + timedelta(days=expiry_days),
+                warn_id=warn_data["id"]
+            )
+
         # Create embed
         embed = discord.Embed(
             title="⚠️ User Warned",
@@ -75,32 +156,36 @@ class Moderation(commands.Cog):
         embed.add_field(name="Reason", value=reason, inline=False)
 
         # Check if user should be banned
+        banned = False
         if warn_count >= max_warns:
             try:
                 await user.ban(reason=f"Exceeded maximum warnings ({max_warns})")
                 embed.add_field(name="⛔ Action Taken", value="User has been banned for exceeding maximum warnings!", inline=False)
                 embed.color = config.EMBED_COLOR_ERROR
+                banned = True
 
                 # Clear warns after ban
-                guild_data["warns"][user_id] = []
-                await self.bot.db.guilds.update_one(
-                    {"guild_id": str(interaction.guild.id)},
-                    {"$set": {"warns": guild_data["warns"]}}
-                )
+                await clear_warns(self.bot.db, interaction.guild.id, user.id)
             except discord.Forbidden:
                 embed.add_field(name="❌ Error", value="Failed to ban user. Check bot permissions.", inline=False)
 
+        # Acknowledge the interaction before logging; an urgent mod-log flush
+        # can take longer than Discord's three-second response window
         await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="warnings", description="Check warnings for a user")
-    @app_commands.describe(user="The user to check warnings for")
-    async def warnings(self, interaction: discord.Interaction, user: discord.Member = None):
-        user = user or interaction.user
-        guild_data = await self.get_guild_data(interaction.guild.id)
-
-        user_id = str(user.id)
-        warns = guild_data.get("warns", {}).get(user_id, [])
-
+        # Auto-bans skip the mod-log buffer so moderators see them straight away
+        await self.log_action(interaction, "warn", user.id, reason, embed=embed, urgent=banned)
+        if banned:
+            await save_mod_actions(self.bot.db, [{
+                "guild_id": str(interaction.guild.id),
+                "user_id": str(user.id),
+                "moderator_id": str(self.bot.user.id) if self.bot.user else None,
+                "action": "ban",
+                "reason": f"Exceeded maximum warnings ({max_warns})",
+                "timestamp": datetime.utcnow().isoformat()
+            }])
+
+    async def warnings_embed(self, guild, user, warns, page, total, max_warns):
+        """Render one page of a user's warnings"""
         embed = discord.Embed(
             title=f"⚠️ Warnings for {user.display_name}",
             color=config.EMBED_COLOR_INFO,
@@ -108,44 +193,60 @@ class Moderation(commands.Cog):
         )
         embed.set_thumbnail(url=user.display_avatar.url)
 
-        if not warns:
+        if not total:
             embed.description = "No warnings found!"
-        else:
-            max_warns = guild_data.get("settings", {}).get("max_warns", config.MAX_WARNS_BEFORE_BAN)
-            embed.description = f"**Total Warnings:** {len(warns)}/{max_warns}\n\n"
+            return embed
 
-            for i, warn in enumerate(warns, 1):
-                moderator = interaction.guild.get_member(int(warn['moderator_id']))
-                mod_name = moderator.mention if moderator else f"Unknown (ID: {warn['moderator_id']})"
-                timestamp = warn.get('timestamp', 'Unknown')
+        embed.description = f"**Total Warnings:** {total}/{max_warns}\n\n"
 
-                embed.add_field(
-                    name=f"Warning #{i}",
-                    value=f"**Reason:** {warn['reason']}\n**Moderator:** {mod_name}\n**Date:** {timestamp[:10]}",
-                    inline=False
-                )
+        # Moderators are not cached, so fetch this page's in one gateway request
+        moderators = await resolve_members(guild, [warn['moderator_id'] for warn in warns])
 
-        await interaction.response.send_message(embed=embed)
+        for i, warn in enumerate(warns, page * config.WARNINGS_PAGE_SIZE + 1):
+            moderator = moderators.get(int(warn['moderator_id']))
+            mod_name = moderator.mention if moderator else f"Unknown (ID: {warn['moderator_id']})"
+            timestamp = warn.get('timestamp', 'Unknown')
+
+            embed.add_field(
+                name=f"Warning #{i}",
+                value=f"**Reason:** {warn['reason']}\n**Moderator:** {mod_name}\n**Date:** {timestamp[:10]}",
+                inline=False
+            )
+
+        pages = -(-total // config.WARNINGS_PAGE_SIZE)
+        if pages > 1:
+            embed.set_footer(text=f"Page {page + 1}/{pages}")
+        return embed
+
+    @app_commands.command(name="warnings", description="Check warnings for a user")
+    @app_commands.describe(user="The user to check warnings for")
+    async def warnings(self, interaction: discord.Interaction, user: discord.Member = None):
+        user = user or interaction.user
+        warns, total = await get_warns_page(self.bot.db, interaction.guild.id, user.id, 0, config.WARNINGS_PAGE_SIZE)
+
+        max_warns = config.MAX_WARNS_BEFORE_BAN
+        if total:
+            guild_data = await self.get_guild_data(interaction.guild.id)
+            max_warns = guild_data.get("settings", {}).get("max_warns", config.MAX_WARNS_BEFORE_BAN)
+
+        embed = await self.warnings_embed(interaction.guild, user, warns, 0, total, max_warns)
+        if total <= config.WARNINGS_PAGE_SIZE:
+            await interaction.response.send_message(embed=embed)
+            return
+
+        view = WarningsView(self, interaction, user, total, max_warns)
+        await interaction.response.send_message(embed=embed, view=view)
 
     @app_commands.command(name="clearwarns", description="Clear all warnings for a user")
     @app_commands.describe(user="The user to clear warnings for")
     @app_commands.checks.has_permissions(administrator=True)
     async def clearwarns(self, interaction: discord.Interaction, user: discord.Member):
-        guild_data = await self.get_guild_data(interaction.guild.id)
-        user_id = str(user.id)
+        warn_count = await clear_warns(self.bot.db, interaction.guild.id, user.id)
 
-        if user_id not in guild_data.get("warns", {}) or not guild_data["warns"][user_id]:
+        if not warn_count:
             await interaction.response.send_message(f"❌ {user.mention} has no warnings!", ephemeral=True)
             return
 
-        warn_count = len(guild_data["warns"][user_id])
-        guild_data["warns"][user_id] = []
-
-        await self.bot.db.guilds.update_one(
-            {"guild_id": str(interaction.guild.id)},
-            {"$set": {"warns": guild_data["warns"]}}
-        )
-
         embed = discord.Embed(
             title="✅ Warnings Cleared",
             description=f"Cleared **{warn_count}** warning(s) for {user.mention}",
@@ -182,6 +283,7 @@ class Moderation(commands.Cog):
             embed.add_field(name="Reason", value=reason, inline=False)
 
             await interaction.response.send_message(embed=embed)
+            await self.log_action(interaction, "kick", user.id, reason, embed=embed)
         except discord.Forbidden:
             await interaction.response.send_message("❌ I don't have permission to kick this user!", ephemeral=True)
 
@@ -213,8 +315,57 @@ class Moderation(commands.Cog):
             embed.add_field(name="Reason", value=reason, inline=False)
 
             await interaction.response.send_message(embed=embed)
+            await self.log_action(interaction, "ban", user.id, reason, embed=embed)
+        except discord.Forbidden:
+            await interaction.response.send_message("❌ I don't have permission to ban this user!", ephemeral=True)
+
+    @app_commands.command(name="tempban", description="Ban a user for a limited time")
+    @app_commands.describe(user="The user to ban", hours="How long the ban lasts", reason="Reason for the ban")
+    @app_commands.checks.has_permissions(ban_members=True)
+    async def tempban(
+        self,
+        interaction: discord.Interaction,
+        user: discord.Member,
+        hours: app_commands.Range[int, 1, 8760],
+        reason: str = "No reason provided"
+    ):
+        if user.bot:
+            await interaction.response.send_message("❌ You cannot ban bots!", ephemeral=True)
+            return
+
+        if user.id == interaction.user.id:
+            await interaction.response.send_message("❌ You cannot ban yourself!", ephemeral=True)
+            return
+
+        if user.top_role >= interaction.user.top_role:
+            await interaction.response.send_message("❌ You cannot ban users with equal or higher roles!", ephemeral=True)
+            return
+
+        # The unban is persisted first, so a ban never outlives a failed write
+        expires_at = discord.utils.utcnow() + timedelta(hours=hours)
+        await scheduler.schedule(self.bot.db, interaction.guild.id, user.id, "unban", expires_at)
+        try:
+            await user.ban(reason=f"{reason} | Temporarily banned by {interaction.user} for {hours}h")
         except discord.Forbidden:
+            await scheduler.cancel(self.bot.db, interaction.guild.id, user.id, "unban")
             await interaction.response.send_message("❌ I don't have permission to ban this user!", ephemeral=True)
+            return
+        except discord.HTTPException:
+            await scheduler.cancel(self.bot.db, interaction.guild.id, user.id, "unban")
+            raise
+
+        embed = discord.Embed(
+            title="⏳ User Temporarily Banned",
+            color=config.EMBED_COLOR_ERROR,
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="User", value=f"{user.mention} ({user.id})", inline=True)
+        embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
+        embed.add_field(name="Expires", value=discord.utils.format_dt(expires_at, "R"), inline=True)
+        embed.add_field(name="Reason", value=reason, inline=False)
+
+        await interaction.response.send_message(embed=embed)
+        await self.log_action(interaction, "tempban", user.id, reason, embed=embed)
 
     @app_commands.command(name="unban", description="Unban a user from the server")
     @app_commands.describe(user_id="The ID of the user to unban")
@@ -223,18 +374,188 @@ class Moderation(commands.Cog):
         try:
             user = await self.bot.fetch_user(int(user_id))
             await interaction.guild.unban(user)
+            await scheduler.cancel(self.bot.db, interaction.guild.id, user.id, "unban")
 
             embed = discord.Embed(
                 title="✅ User Unbanned",
                 description=f"Successfully unbanned **{user.name}** ({user.id})",
                 color=config.EMBED_COLOR_SUCCESS
             )
+            embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
 
             await interaction.response.send_message(embed=embed)
+            await self.log_action(interaction, "unban", user.id, None, embed=embed)
         except discord.NotFound:
             await interaction.response.send_message("❌ User not found or not banned!", ephemeral=True)
         except discord.Forbidden:
             await interaction.response.send_message("❌ I don't have permission to unban users!", ephemeral=True)
 
+    async def bulk_moderate(self, interaction, action, user_ids, joined_within, account_age, reason, dry_run):
+        """Shared implementation of /massban and /masskick"""
+        await interaction.response.defer()
+
+        ids = parse_user_ids(user_ids)
+        if not ids and not joined_within and not account_age:
+            await interaction.edit_original_response(
+                content="❌ Provide user IDs, a join window or an account age filter."
+            )
+            return
+
+        selection = await collect_targets(
+            interaction.guild,
+            user_ids=ids,
+            joined_within=joined_within,
+            account_age=account_age
+        )
+        targets = [
+            member for member in selection.members
+            if member.id != interaction.user.id and member.top_role < interaction.user.top_role
+        ]
+        # Users confirmed to have left can still be banned by ID, but the join
+        # and account-age filters cannot be checked for them
+        if action == "ban" and not joined_within and not account_age:
+            targets.extend(discord.Object(id=user_id) for user_id in selection.absent if user_id != interaction.user.id)
+
+        def add_selection_notes(embed):
+            add_truncation_field(embed, selection)
+            if selection.unchecked:
+                embed.add_field(
+                    name="Skipped (lookup failed)",
+                    value=", ".join(f"`{user_id}`" for user_id in selection.unchecked[:30]),
+                    inline=False
+                )
+
+        title = f"{'🔨 Mass Ban' if action == 'ban' else '👢 Mass Kick'}{' (dry run)' if dry_run else ''}"
+        if dry_run or not targets:
+            embed = discord.Embed(
+                title=title,
+                description=f"**{len(targets)}** user(s) selected.",
+                color=config.EMBED_COLOR_INFO
+            )
+            add_selection_notes(embed)
+            await interaction.edit_original_response(embed=embed)
+            return
+
+        async def apply(target):
+            if action == "ban":
+                await interaction.guild.ban(target, reason=f"{reason} | Mass ban by {interaction.user}")
+            else:
+                await interaction.guild.kick(target, reason=f"{reason} | Mass kick by {interaction.user}")
+
+        async def report_progress(result):
+            try:
+                await interaction.edit_original_response(embed=progress_embed(title, result))
+            except discord.HTTPException:
+                pass
+
+        result = await run_bulk(targets, apply, progress=report_progress)
+
+        if action == "ban" and result.succeeded:
+            # A permanent ban supersedes a tempban, whose unban would otherwise lift it
+            cursor = self.bot.db.scheduled_actions.find(
+                {
+                    "guild_id": str(interaction.guild.id),
+                    "user_id": {"$in": [str(target.id) for target in result.succeeded]},
+                    "action": "unban"
+                },
+                {"_id": 0, "user_id": 1}
+            )
+            for user_id in {document["user_id"] async for document in cursor}:
+                await scheduler.cancel(self.bot.db, interaction.guild.id, user_id, "unban")
+
+        timestamp = datetime.utcnow().isoformat()
+        await save_mod_actions(self.bot.db, [
+            {
+                "guild_id": str(interaction.guild.id),
+                "user_id": str(target.id),
+                "moderator_id": str(interaction.user.id),
+                "action": action,
+                "reason": reason,
+                "bulk": True,
+                "timestamp": timestamp
+            }
+            for target in result.succeeded
+        ])
+
+        embed = progress_embed(
+            title,
+            result,
+            color=config.EMBED_COLOR_ERROR if action == "ban" else config.EMBED_COLOR_WARNING
+        )
+        embed.add_field(name="Reason", value=reason, inline=False)
+        if result.failed:
+            embed.add_field(
+                name="Failed",
+                value=", ".join(f"`{target.id}`" for target, _ in result.failed[:30]),
+                inline=False
+            )
+        add_selection_notes(embed)
+        # One summary for the whole run rather than an entry per member
+        embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
+        await mod_log.post(self.bot.db, interaction.guild.id, embed)
+        await interaction.edit_original_response(embed=embed)
+
+    @app_commands.command(name="massban", description="Ban many users at once")
+    @app_commands.describe(
+        user_ids="User IDs or mentions separated by spaces",
+        joined_within="Only members who joined in the last N minutes",
+        account_age="Only accounts younger than N days",
+        reason="Reason for the bans",
+        dry_run="Only count matching users"
+    )
+    @app_commands.checks.has_permissions(ban_members=True)
+    async def massban(
+        self,
+        interaction: discord.Interaction,
+        user_ids: str = None,
+        joined_within: app_commands.Range[int, 1, 10080] = None,
+        account_age: app_commands.Range[int, 1, 3650] = None,
+        reason: str = "No reason provided",
+        dry_run: bool = False
+    ):
+        await self.bulk_moderate(interaction, "ban", user_ids, joined_within, account_age, reason, dry_run)
+
+    @app_commands.command(name="masskick", description="Kick many users at once")
+    @app_commands.describe(
+        user_ids="User IDs or mentions separated by spaces",
+        joined_within="Only members who joined in the last N minutes",
+        account_age="Only accounts younger than N days",
+        reason="Reason for the kicks",
+        dry_run="Only count matching users"
+    )
+    @app_commands.checks.has_permissions(kick_members=True)
+    async def masskick(
+        self,
+        interaction: discord.Interaction,
+        user_ids: str = None,
+        joined_within: app_commands.Range[int, 1, 10080] = None,
+        account_age: app_commands.Range[int, 1, 3650] = None,
+        reason: str = "No reason provided",
+        dry_run: bool = False
+    ):
+        await self.bulk_moderate(interaction, "kick", user_ids, joined_within, account_age, reason, dry_run)
+
+    @app_commands.command(name="modlog", description="Set the channel moderation actions are logged to")
+    @app_commands.describe(channel="Channel for the mod log; leave empty to turn it off")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def modlog(self, interaction: discord.Interaction, channel: discord.TextChannel = None):
+        await save_guild_config(
+            self.bot.db,
+            interaction.guild.id,
+            {"settings.mod_log_channel_id": str(channel.id) if channel else None}
+        )
+        if channel:
+            await interaction.response.send_message(f"✅ Moderation actions will be logged to {channel.mention}.", ephemeral=True)
+        else:
+            await interaction.response.send_message("✅ Mod log turned off.", ephemeral=True)
+
+    @commands.command(name="migratewarns", hidden=True)
+    @commands.is_owner()
+    async def migratewarns(self, ctx, batch_size: int = 500):
+        """Move legacy embedded warns into the warns collection"""
+        await ctx.send("⏳ Migrating embedded warns...")
+        guilds, warns = await migrate_embedded_warns(self.bot.db, batch_size=batch_size)
+        await ctx.send(f"✅ Migrated **{warns}** warning(s) from **{guilds}** guild(s).")
+
 async def setup(bot):
     await bot.add_cog(Moderation(bot))
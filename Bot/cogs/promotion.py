@@ -0,0 +1,258 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+import discord
+from discord.ext import commands
+from pymongo.errors import OperationFailure, PyMongoError
+
+import config
+from utils import (
+    get_guild_config, get_bot_state, save_bot_state, TokenBucket, resolve_members, percentile, verified_set,
+    CHANGE_STREAMS_UNSUPPORTED
+)
+
+
+class Promotion(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.task = None
+        # Each shard process follows the stream independently for its own guilds
+        self.state_key = f"verification_promotion:{bot.shard_label}"
+        # Deployments before sharding kept a single state document
+        self.legacy_state_key = "verification_promotion"
+        self.bucket = TokenBucket(config.PROMOTION_ROLE_RATE)
+        self.mode = None
+        self.resume_token = None
+        self.last_verified_at = None
+        self.last_id = None
+
+        self.promoted = 0
+        self.skipped = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=1000)
+
+    async def cog_load(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def cog_unload(self):
+        if self.task:
+            self.task.cancel()
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+
+        state = await get_bot_state(self.bot.db, self.state_key)
+        if not state:
+            state = await get_bot_state(self.bot.db, self.legacy_state_key)
+        self.resume_token = state.get("resume_token")
+        # Match the site's Date.toISOString() format so string ordering holds
+        self.last_verified_at = state.get("last_verified_at") or (
+            discord.utils.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        )
+        self.last_id = state.get("last_id")
+
+        while True:
+            try:
+                await self.watch()
+            except OperationFailure as e:
+                self.resume_token = None
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    # Standalone servers have no change streams; the indexed poll replaces it
+                    print("[promotion] Change streams unavailable, falling back to polling")
+                    await self.poll()
+                else:
+                    # Typically a resume token that fell off the oplog; the
+                    # next stream catches up from last_verified_at first
+                    print(f"[promotion] Change stream failed ({e.code}), restarting from the last verification: {e}")
+                    await asyncio.sleep(config.PROMOTION_POLL_INTERVAL)
+            except PyMongoError as e:
+                print(f"[promotion] Database error, retrying: {e}")
+                await asyncio.sleep(config.PROMOTION_POLL_INTERVAL)
+            except Exception as e:
+                # Anything else would end the task without a trace
+                print(f"[promotion] Unexpected error, retrying: {e!r}")
+                await asyncio.sleep(config.PROMOTION_POLL_INTERVAL)
+
+    async def watch(self):
+        """Follow verification inserts through a change stream
+
+        Without a resume token the stream starts now, so anything verified
+        since `last_verified_at` is caught up on the indexed cursor first;
+        promoting a verification twice is a no-op.
+        """
+        # Manual verifications are followed too, so every process's verified set sees them
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async with self.bot.db.verifications.watch(
+            pipeline,
+            resume_after=self.resume_token,
+            max_await_time_ms=int(config.PROMOTION_FLUSH_INTERVAL * 1000)
+        ) as stream:
+            self.mode = "change_stream"
+            if self.resume_token is None:
+                while await self.poll_once() == config.PROMOTION_BATCH_SIZE:
+                    pass
+            batch = []
+            batch_started = 0.0
+            last_saved = time.monotonic()
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    if not batch:
+                        batch_started = time.monotonic()
+                    batch.append(change["fullDocument"])
+
+                if len(batch) >= config.PROMOTION_BATCH_SIZE or (
+                    batch and time.monotonic() - batch_started >= config.PROMOTION_FLUSH_INTERVAL
+                ):
+                    await self.promote(batch)
+                    batch = []
+                    # Persist straight after a batch so a restart does not redo it
+                    last_saved = 0.0
+
+                # Only persist the token once everything before it is promoted.
+                # An idle stream's token moves on every getMore, so those are
+                # saved at most every PROMOTION_STATE_SAVE_INTERVAL seconds
+                if not batch and stream.resume_token != self.resume_token:
+                    self.resume_token = stream.resume_token
+                    if time.monotonic() - last_saved >= config.PROMOTION_STATE_SAVE_INTERVAL:
+                        await self.save_state()
+                        last_saved = time.monotonic()
+
+    async def poll(self):
+        """Tail new verifications on the indexed (verified_at, _id) cursor"""
+        self.mode = "poll"
+        while True:
+            if await self.poll_once() < config.PROMOTION_BATCH_SIZE:
+                await asyncio.sleep(config.PROMOTION_POLL_INTERVAL)
+
+    async def poll_once(self):
+        """Promote the next batch after the cursor; returns its size"""
+        query = {"verified_at": {"$gt": self.last_verified_at}}
+        if self.last_id is not None:
+            query = {
+                "$or": [
+                    {"verified_at": {"$gt": self.last_verified_at}},
+                    {"verified_at": self.last_verified_at, "_id": {"$gt": self.last_id}}
+                ]
+            }
+        batch = await self.bot.db.verifications.find(
+            query,
+            {"guild_id": 1, "user_id": 1, "verified_at": 1, "manual": 1}
+        ).sort([("verified_at", 1), ("_id", 1)]).limit(config.PROMOTION_BATCH_SIZE).to_list(None)
+
+        if batch:
+            await self.promote(batch)
+            await self.save_state()
+        return len(batch)
+
+    async def save_state(self):
+        await save_bot_state(self.bot.db, self.state_key, {
+            "resume_token": self.resume_token,
+            "last_verified_at": self.last_verified_at,
+            "last_id": self.last_id
+        })
+
+    async def promote(self, verifications):
+        """Grant roles for a batch of verifications, grouped per guild
+
+        Manual verifications already had their roles granted by the command
+        that recorded them, possibly in another process; they only update
+        this process's verified set.
+        """
+        by_guild = defaultdict(list)
+        for verification in verifications:
+            if self.bot.get_guild(int(verification["guild_id"])) is None:
+                continue
+            verified_set.add(verification["guild_id"], verification["user_id"])
+            if not verification.get("manual"):
+                by_guild[verification["guild_id"]].append(verification)
+
+        results = await asyncio.gather(*(
+            self.promote_guild(guild_id, guild_verifications)
+            for guild_id, guild_verifications in by_guild.items()
+        ), return_exceptions=True)
+        # One guild's bad config or a failed lookup must not stall the stream;
+        # its verifications are counted as failed and the cursor moves on
+        for (guild_id, guild_verifications), result in zip(by_guild.items(), results):
+            if isinstance(result, Exception):
+                self.failed += len(guild_verifications)
+                print(f"[promotion] Failed to promote {len(guild_verifications)} member(s) in guild {guild_id}: {result!r}")
+
+        last = verifications[-1]
+        if last.get("verified_at"):
+            self.last_verified_at = last["verified_at"]
+            self.last_id = last["_id"]
+
+    async def promote_guild(self, guild_id, verifications):
+        guild = self.bot.get_guild(int(guild_id))
+        if guild is None:
+            return
+
+        guild_data = await get_guild_config(self.bot.db, guild_id)
+        settings = guild_data.get("verification", {})
+        if not settings.get("enabled"):
+            return
+
+        if not settings.get("verified_role_id"):
+            return
+        verified_role = guild.get_role(int(settings["verified_role_id"]))
+        unverified_role = guild.get_role(int(settings.get("unverified_role_id") or 0))
+        if not verified_role:
+            return
+
+        members = await resolve_members(guild, [verification["user_id"] for verification in verifications])
+        self.skipped += sum(1 for verification in verifications if int(verification["user_id"]) not in members)
+
+        results = await asyncio.gather(*(
+            self.promote_member(guild, members[int(verification["user_id"])], verification, verified_role, unverified_role)
+            for verification in verifications
+            if int(verification["user_id"]) in members
+        ), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.failed += 1
+                print(f"[promotion] Failed to promote a member in guild {guild.id}: {result!r}")
+
+    async def promote_member(self, guild, member, verification, verified_role, unverified_role):
+
+        # One PATCH swaps both roles instead of separate add/remove calls
+        roles = [role for role in member.roles if role != unverified_role and not role.is_default()]
+        if verified_role not in roles:
+            roles.append(verified_role)
+        if set(roles) == {role for role in member.roles if not role.is_default()}:
+            self.skipped += 1
+            return
+
+        await self.bucket.acquire()
+        try:
+            await member.edit(roles=roles, reason="Verified via website")
+        except discord.HTTPException as e:
+            self.failed += 1
+            print(f"[promotion] Failed to promote {member.id} in guild {guild.id}: {e}")
+            return
+
+        self.promoted += 1
+        verified_at = verification.get("verified_at")
+        if verified_at:
+            verified_at = datetime.fromisoformat(verified_at.replace("Z", "+00:00"))
+            if verified_at.tzinfo is None:
+                verified_at = verified_at.replace(tzinfo=timezone.utc)
+            self.latencies.append((discord.utils.utcnow() - verified_at).total_seconds())
+
+    def stats(self):
+        """Return promotion counters and web-to-role latency percentiles"""
+        latencies = sorted(self.latencies)
+        return {
+            "mode": self.mode,
+            "promoted": self.promoted,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p99": percentile(latencies, 0.99)
+        }
+
+
+async def setup(bot):
+    await bot.add_cog(Promotion(bot))
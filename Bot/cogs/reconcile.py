@@ -0,0 +1,141 @@
+import time
+from datetime import datetime, timedelta
+
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+
+import config
+from utils import (
+    get_guild_config, get_verification_enabled_at, get_bot_state, save_bot_state, reconcile_roles, reconcile_embed
+)
+
+
+class Reconciliation(commands.Cog):
+    """Periodic and on-demand repair of drifted verification roles"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.active = set()
+
+    async def cog_load(self):
+        if config.RECONCILE_INTERVAL > 0:
+            self.periodic_sweep.start()
+
+    async def cog_unload(self):
+        self.periodic_sweep.cancel()
+
+    def state_key(self, guild_id):
+        return f"reconcile:{guild_id}"
+
+    async def reconcile_guild(self, guild, dry_run=False, restart=False, progress=None):
+        """Sweep one guild, resuming an interrupted sweep unless told to restart
+
+        Returns None if the guild has no verification setup or a sweep is
+        already running for it.
+        """
+        if guild.id in self.active:
+            return None
+
+        guild_data = await get_guild_config(self.bot.db, guild.id)
+        settings = guild_data.get("verification", {})
+        if not settings.get("enabled"):
+            return None
+        verified_role = guild.get_role(int(settings["verified_role_id"]))
+        unverified_role = guild.get_role(int(settings["unverified_role_id"]))
+        if not verified_role:
+            return None
+
+        unverified_since = await get_verification_enabled_at(self.bot.db, guild.id, settings)
+        state = await get_bot_state(self.bot.db, self.state_key(guild.id)) or {}
+        after = None if restart or dry_run else state.get("after")
+
+        async def checkpoint(member_id):
+            await save_bot_state(self.bot.db, self.state_key(guild.id), {"after": member_id})
+
+        self.active.add(guild.id)
+        started = time.perf_counter()
+        try:
+            result = await reconcile_roles(
+                self.bot.db,
+                guild,
+                verified_role,
+                unverified_role,
+                unverified_since,
+                after=after,
+                dry_run=dry_run,
+                progress=progress,
+                checkpoint=None if dry_run else checkpoint
+            )
+        finally:
+            self.active.discard(guild.id)
+
+        if not dry_run:
+            await save_bot_state(self.bot.db, self.state_key(guild.id), {
+                "after": None,
+                "completed_at": discord.utils.utcnow().isoformat()
+            })
+        print(
+            f"[reconcile] Guild {guild.id}: scanned {result.scanned}, verified {result.verified}, "
+            f"unverified {result.unverified}, failed {result.failed}"
+            f"{' (dry run)' if dry_run else ''} in {time.perf_counter() - started:.1f}s"
+        )
+        return result
+
+    @tasks.loop(hours=1)
+    async def periodic_sweep(self):
+        """Resume interrupted sweeps and re-sweep guilds not swept within the interval"""
+        states = {
+            state["_id"]: state
+            async for state in self.bot.db.bot_state.find({"_id": {"$regex": "^reconcile:"}})
+        }
+        due_before = discord.utils.utcnow() - timedelta(hours=config.RECONCILE_INTERVAL)
+
+        for guild in list(self.bot.guilds):
+            state = states.get(self.state_key(guild.id), {})
+            completed_at = state.get("completed_at")
+            if state.get("after") is None and completed_at and datetime.fromisoformat(completed_at) > due_before:
+                continue
+            try:
+                await self.reconcile_guild(guild)
+            except discord.HTTPException as e:
+                print(f"[reconcile] Sweep of guild {guild.id} failed: {e}")
+
+    @periodic_sweep.before_loop
+    async def before_periodic_sweep(self):
+        await self.bot.wait_until_ready()
+
+    @app_commands.command(name="reconcile", description="Fix Verified/Unverified roles that drifted from verification records")
+    @app_commands.describe(
+        dry_run="Only report what would change",
+        restart="Start from the beginning instead of resuming an interrupted sweep"
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def reconcile(self, interaction: discord.Interaction, dry_run: bool = False, restart: bool = False):
+        if interaction.guild.id in self.active:
+            await interaction.response.send_message("⏳ A role sweep is already running for this server.", ephemeral=True)
+            return
+
+        await interaction.response.defer()
+        title = f"🔄 Role Reconciliation{' (dry run)' if dry_run else ''}"
+
+        async def report_progress(result):
+            try:
+                await interaction.edit_original_response(embed=reconcile_embed(title, result))
+            except discord.HTTPException:
+                pass
+
+        result = await self.reconcile_guild(interaction.guild, dry_run=dry_run, restart=restart, progress=report_progress)
+        if result is None:
+            await interaction.edit_original_response(
+                content="❌ Verification system is not set up! Use `/verifypanel` first."
+            )
+            return
+
+        await interaction.edit_original_response(
+            embed=reconcile_embed(title, result, color=config.EMBED_COLOR_SUCCESS)
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(Reconciliation(bot))
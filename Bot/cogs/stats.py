@@ -0,0 +1,71 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import config
+from utils import guild_counters, backfill_guild_stats
+
+SPARK_LEVELS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values):
+    peak = max(values, default=0)
+    if not peak:
+        return SPARK_LEVELS[0] * len(values)
+    return "".join(SPARK_LEVELS[round(value / peak * (len(SPARK_LEVELS) - 1))] for value in values)
+
+
+class Stats(commands.Cog):
+    """Per-guild activity counters"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="serverstats", description="Show verification and moderation totals for this server")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def serverstats(self, interaction: discord.Interaction):
+        stats = await guild_counters.read(self.bot.db, interaction.guild.id)
+        totals = stats["totals"]
+        hourly = stats["hourly"]
+        joins = [counts["joins"] for _, counts in hourly]
+
+        embed = discord.Embed(
+            title=f"📊 Stats for {interaction.guild.name}",
+            color=config.EMBED_COLOR_INFO,
+            timestamp=discord.utils.utcnow()
+        )
+        embed.add_field(
+            name="Verifications",
+            value=f"{totals['verifications']} ({totals['manual_verifications']} manual)",
+            inline=True
+        )
+        embed.add_field(name="Alts Detected", value=str(totals["alts"]), inline=True)
+        embed.add_field(name="Warns", value=str(totals["warns"]), inline=True)
+        embed.add_field(name="Kicks", value=str(totals["kicks"]), inline=True)
+        embed.add_field(name="Bans", value=str(totals["bans"]), inline=True)
+        embed.add_field(name="Joins", value=str(totals["joins"]), inline=True)
+        embed.add_field(
+            name="Last 24 Hours",
+            value=(
+                f"**Joins:** {sum(joins)} ({joins[-1]} this hour)\n"
+                f"**Verifications:** {sum(counts['verifications'] for _, counts in hourly)}\n"
+                f"`{sparkline(joins)}` joins per hour"
+            ),
+            inline=False
+        )
+        if stats["backfilled_at"] is None:
+            embed.set_footer(text="Totals only cover activity since counting started")
+
+        await interaction.response.send_message(embed=embed)
+
+    @commands.command(name="backfillstats", hidden=True)
+    @commands.is_owner()
+    async def backfillstats(self, ctx):
+        """Recompute every guild's counters from the existing collections"""
+        await ctx.send("⏳ Backfilling guild stats...")
+        guilds = await backfill_guild_stats(self.bot.db)
+        await ctx.send(f"✅ Backfilled stats for **{guilds}** guild(s).")
+
+
+async def setup(bot):
+    await bot.add_cog(Stats(bot))
@@ -1,8 +1,46 @@
+import asyncio
+import hashlib
+import json
+from datetime import timedelta
 import discord
 from discord import app_commands
 from discord.ext import commands
 from discord.ui import Button, View
 import config
+from utils import (
+    get_guild_config, get_verification_enabled_at, get_verification_status, guild_cache, verified_set, JoinPipeline, RaidDetector, apply_role_overwrite, channels_needing_overwrite,
+    save_verification, save_verifications, save_mod_actions, resolve_members, parse_user_ids, collect_targets, add_truncation_field,
+    run_bulk, progress_embed, scheduler, dm_outbox, mod_log, guild_counters
+)
+
+PANEL_DESCRIPTION = (
+    "Welcome to the server!\n\n"
+    "To gain access to all channels, please verify yourself by clicking the green button below.\n\n"
+    "**Why do we verify?**\n"
+    "We use verification to protect our community from:\n"
+    "• Spam and raids\n"
+    "• Alt accounts\n"
+    "• Malicious users\n\n"
+    "Click the button below to begin verification."
+)
+
+RESTRICT_UNVERIFIED = discord.PermissionOverwrite(view_channel=False, send_messages=False)
+
+def build_panel_embed(guild):
+    """Build the verification panel embed for a guild"""
+    embed = discord.Embed(
+        title="🔐 Server Verification",
+        description=PANEL_DESCRIPTION,
+        color=config.EMBED_COLOR_INFO
+    )
+    embed.set_footer(text=f"{guild.name} Verification System")
+    embed.set_thumbnail(url=guild.icon.url if guild.icon else None)
+    return embed
+
+def panel_hash(embed, verification_url):
+    """Hash the rendered panel so unchanged panels are not re-sent"""
+    payload = json.dumps({"embed": embed.to_dict(), "url": verification_url}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
 class VerifyButton(View):
     def __init__(self, verification_url):
@@ -16,8 +54,18 @@ class VerifyButton(View):
 class Verification(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-
-    async def setup_verification_system(self, guild):
+        self.join_pipeline = JoinPipeline()
+        bot.join_pipeline = self.join_pipeline
+        self.raid_detector = RaidDetector()
+        bot.raid_detector = self.raid_detector
+        scheduler.register("kick_unverified", self.run_unverified_kick)
+        self.active_rollouts = set()
+        self.panel_views = {}
+
+    async def cog_unload(self):
+        await self.join_pipeline.close()
+
+    async def setup_verification_system(self, guild, progress=None):
         """Setup verification roles and channel"""
         # Create or get unverified role
         unverified_role = discord.utils.get(guild.roles, name=config.UNVERIFIED_ROLE_NAME)
@@ -71,75 +119,176 @@ class Verification(commands.Cog):
                 reason="Verification system setup"
             )
 
-        # Update all other channels to deny unverified role
-        for channel in guild.channels:
-            if channel.id != verify_channel.id and channel.name != config.VERIFY_CHANNEL_NAME:
-                try:
-                    await channel.set_permissions(
-                        unverified_role,
-                        view_channel=False,
-                        send_messages=False,
-                        reason="Verification system - restrict unverified users"
-                    )
-                except:
-                    pass
-
-        # Save configuration to database
+        exclude_ids = self.rollout_exclusions(guild, verify_channel)
+        guild_data = await get_guild_config(self.bot.db, guild.id)
+        verification = {
+            "enabled": True,
+            "verified_role_id": str(verified_role.id),
+            "unverified_role_id": str(unverified_role.id),
+            "verify_channel_id": str(verify_channel.id)
+        }
+        stored = guild_data.get("verification", {})
+        enabled_at = stored.get("enabled_at")
+        if stored.get("enabled") and not enabled_at:
+            # Configs from before enabled_at was tracked get it on the next setup
+            enabled_at = (await get_verification_enabled_at(self.bot.db, guild.id, stored)).isoformat()
+
+        # Nothing to do when the stored config and every channel overwrite already match
+        if (
+            all(stored.get(key) == value for key, value in verification.items())
+            and not stored.get("rollout_pending")
+            and not channels_needing_overwrite(guild, unverified_role, RESTRICT_UNVERIFIED, exclude_ids)
+        ):
+            return verify_channel, verified_role, unverified_role, None
+
+        # Save configuration to database before the rollout so it can resume after a restart
         await self.bot.db.guilds.update_one(
             {"guild_id": str(guild.id)},
             {
                 "$set": {
-                    "verification": {
-                        "enabled": True,
-                        "verified_role_id": str(verified_role.id),
-                        "unverified_role_id": str(unverified_role.id),
-                        "verify_channel_id": str(verify_channel.id)
-                    }
+                    **{f"verification.{key}": value for key, value in verification.items()},
+                    # Reconciliation only marks members who joined after this as Unverified
+                    **({} if enabled_at else {"verification.enabled_at": discord.utils.utcnow().isoformat()}),
+                    "verification.rollout_pending": True
                 }
             },
             upsert=True
         )
+        guild_cache.invalidate(guild.id)
+
+        rollout = await self.rollout_channel_permissions(guild, unverified_role, verify_channel, progress=progress)
+
+        return verify_channel, verified_role, unverified_role, rollout
+
+    def rollout_exclusions(self, guild, verify_channel):
+        exclude_ids = {verify_channel.id}
+        exclude_ids.update(channel.id for channel in guild.channels if channel.name == config.VERIFY_CHANNEL_NAME)
+        return exclude_ids
+
+    async def rollout_channel_permissions(self, guild, unverified_role, verify_channel, progress=None):
+        """Deny the unverified role on every channel except the verify channel"""
+        if guild.id in self.active_rollouts:
+            return None
 
-        return verify_channel, verified_role, unverified_role
+        self.active_rollouts.add(guild.id)
+        try:
+            rollout = await apply_role_overwrite(
+                guild,
+                unverified_role,
+                RESTRICT_UNVERIFIED,
+                exclude_ids=self.rollout_exclusions(guild, verify_channel),
+                progress=progress,
+                reason="Verification system - restrict unverified users"
+            )
+        finally:
+            self.active_rollouts.discard(guild.id)
+
+        if not rollout.failed:
+            await self.bot.db.guilds.update_one(
+                {"guild_id": str(guild.id)},
+                {"$unset": {"verification.rollout_pending": ""}}
+            )
+            guild_cache.invalidate(guild.id)
+        return rollout
+
+    def get_panel_view(self, guild_id):
+        """Return the guild's panel view, building it only once"""
+        view = self.panel_views.get(guild_id)
+        if view is None:
+            view = VerifyButton(f"{config.WEBSITE_URL}/verify?guild={guild_id}")
+            self.panel_views[guild_id] = view
+        return view
+
+    async def publish_panel(self, guild, verify_channel, panel):
+        """Send the panel, or edit the stored one only if its content changed"""
+        verification_url = f"{config.WEBSITE_URL}/verify?guild={guild.id}"
+        embed = build_panel_embed(guild)
+        content_hash = panel_hash(embed, verification_url)
+        view = self.get_panel_view(guild.id)
+
+        message = None
+        if panel.get("message_id") and panel.get("channel_id") == str(verify_channel.id):
+            try:
+                message = await verify_channel.fetch_message(int(panel["message_id"]))
+            except discord.NotFound:
+                message = None
+
+        if message is not None and panel.get("hash") == content_hash:
+            return "unchanged"
+
+        if message is not None:
+            await message.edit(embed=embed, view=view)
+            status = "updated"
+        else:
+            message = await verify_channel.send(embed=embed, view=view)
+            status = "created"
+
+        await self.bot.db.guilds.update_one(
+            {"guild_id": str(guild.id)},
+            {"$set": {"verification.panel": {
+                "channel_id": str(verify_channel.id),
+                "message_id": str(message.id),
+                "hash": content_hash
+            }}}
+        )
+        guild_cache.invalidate(guild.id)
+        return status
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Resume permission rollouts interrupted by a restart"""
+        guild_ids = [str(guild.id) for guild in self.bot.guilds]
+        cursor = self.bot.db.guilds.find(
+            {"guild_id": {"$in": guild_ids}, "verification.rollout_pending": True},
+            {"_id": 0, "guild_id": 1, "verification": 1}
+        )
+        async for guild_data in cursor:
+            guild = self.bot.get_guild(int(guild_data["guild_id"]))
+            unverified_role = guild.get_role(int(guild_data["verification"]["unverified_role_id"]))
+            verify_channel = guild.get_channel(int(guild_data["verification"]["verify_channel_id"]))
+            if unverified_role and verify_channel:
+                print(f"Resuming permission rollout for guild {guild.id}")
+                asyncio.create_task(self.rollout_channel_permissions(guild, unverified_role, verify_channel))
 
     @app_commands.command(name="verifypanel", description="Setup the verification panel")
     @app_commands.checks.has_permissions(administrator=True)
     async def verifypanel(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
 
-        # Setup verification system
-        verify_channel, verified_role, unverified_role = await self.setup_verification_system(interaction.guild)
+        progress_message = await interaction.followup.send("⏳ Setting up verification...", ephemeral=True, wait=True)
 
-        # Create verification embed
-        embed = discord.Embed(
-            title="🔐 Server Verification",
-            description=(
-                "Welcome to the server!\n\n"
-                "To gain access to all channels, please verify yourself by clicking the green button below.\n\n"
-                "**Why do we verify?**\n"
-                "We use verification to protect our community from:\n"
-                "• Spam and raids\n"
-                "• Alt accounts\n"
-                "• Malicious users\n\n"
-                "Click the button below to begin verification."
-            ),
-            color=config.EMBED_COLOR_INFO
-        )
-        embed.set_footer(text=f"{interaction.guild.name} Verification System")
-        embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else None)
+        async def report_progress(rollout):
+            try:
+                await progress_message.edit(
+                    content=f"⏳ Updating channel permissions: **{rollout.done}/{rollout.total}** "
+                            f"({len(rollout.failed)} failed)"
+                )
+            except discord.HTTPException:
+                pass
 
-        # Create verification URL
-        verification_url = f"{config.WEBSITE_URL}/verify?guild={interaction.guild.id}"
+        # Setup verification system
+        verify_channel, verified_role, unverified_role, rollout = await self.setup_verification_system(
+            interaction.guild,
+            progress=report_progress
+        )
 
-        # Send verification panel
-        view = VerifyButton(verification_url)
-        await verify_channel.send(embed=embed, view=view)
+        guild_data = await get_guild_config(self.bot.db, interaction.guild.id)
+        panel_status = await self.publish_panel(
+            interaction.guild,
+            verify_channel,
+            guild_data.get("verification", {}).get("panel", {})
+        )
 
         # Confirmation message
+        panel_messages = {
+            "created": f"Verification panel has been set up in {verify_channel.mention}",
+            "updated": f"The existing verification panel in {verify_channel.mention} has been updated",
+            "unchanged": f"The verification panel in {verify_channel.mention} is already up to date"
+        }
         success_embed = discord.Embed(
-            title="✅ Verification Panel Created",
+            title=f"✅ Verification Panel {panel_status.capitalize()}",
             description=(
-                f"Verification panel has been set up in {verify_channel.mention}\n\n"
+                f"{panel_messages[panel_status]}\n\n"
                 f"**Roles Created:**\n"
                 f"• Verified: {verified_role.mention}\n"
                 f"• Unverified: {unverified_role.mention}\n\n"
@@ -147,6 +296,20 @@ class Verification(commands.Cog):
             ),
             color=config.EMBED_COLOR_SUCCESS
         )
+        if rollout is None and interaction.guild.id in self.active_rollouts:
+            success_embed.add_field(
+                name="⏳ Channel Permissions",
+                value="A permission rollout is already running for this server.",
+                inline=False
+            )
+        elif rollout is not None and rollout.failed:
+            failed_channels = ", ".join(channel.mention for channel, _ in rollout.failed[:20])
+            success_embed.add_field(
+                name=f"⚠️ Failed to update {len(rollout.failed)} channel(s)",
+                value=failed_channels + (" ..." if len(rollout.failed) > 20 else ""),
+                inline=False
+            )
+            success_embed.color = config.EMBED_COLOR_WARNING
 
         await interaction.followup.send(embed=success_embed, ephemeral=True)
 
@@ -155,7 +318,7 @@ class Verification(commands.Cog):
     @app_commands.checks.has_permissions(administrator=True)
     async def manverify(self, interaction: discord.Interaction, user: discord.Member):
         # Get guild verification settings
-        guild_data = await self.bot.db.guilds.find_one({"guild_id": str(interaction.guild.id)})
+        guild_data = await get_guild_config(self.bot.db, interaction.guild.id)
 
         if not guild_data or "verification" not in guild_data or not guild_data["verification"].get("enabled"):
             await interaction.response.send_message(
@@ -184,9 +347,7 @@ class Verification(commands.Cog):
         await user.add_roles(verified_role)
 
         # Log manual verification
-        await self.bot.db.verifications.insert_one({
-            "user_id": str(user.id),
-            "guild_id": str(interaction.guild.id),
+        await save_verification(self.bot.db, interaction.guild.id, user.id, {
             "verified_by": str(interaction.user.id),
             "manual": True,
             "timestamp": discord.utils.utcnow().isoformat()
@@ -200,32 +361,201 @@ class Verification(commands.Cog):
         embed.add_field(name="User", value=f"{user.name} ({user.id})", inline=True)
         embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
 
+        # Acknowledge the interaction before logging so a slow mod-log
+        # channel cannot push the response past Discord's 3 second window
         await interaction.response.send_message(embed=embed)
+        await mod_log.post(self.bot.db, interaction.guild.id, embed)
 
-        # Try to DM the user
-        try:
-            dm_embed = discord.Embed(
-                title="✅ You've Been Verified!",
-                description=f"You have been manually verified in **{interaction.guild.name}** and now have access to all channels!",
-                color=config.EMBED_COLOR_SUCCESS
+        dm_embed = discord.Embed(
+            title="✅ You've Been Verified!",
+            description=f"You have been manually verified in **{interaction.guild.name}** and now have access to all channels!",
+            color=config.EMBED_COLOR_SUCCESS
+        )
+        await dm_outbox.enqueue(self.bot.db, interaction.guild.id, user.id, "manverify", embed=dm_embed)
+
+    @app_commands.command(name="massverify", description="Manually verify many users at once")
+    @app_commands.describe(
+        user_ids="User IDs or mentions separated by spaces",
+        joined_within="Only members who joined in the last N minutes",
+        account_age="Only accounts older than N days"
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def massverify(
+        self,
+        interaction: discord.Interaction,
+        user_ids: str = None,
+        joined_within: app_commands.Range[int, 1, 10080] = None,
+        account_age: app_commands.Range[int, 1, 3650] = None
+    ):
+        guild_data = await get_guild_config(self.bot.db, interaction.guild.id)
+
+        if not guild_data or "verification" not in guild_data or not guild_data["verification"].get("enabled"):
+            await interaction.response.send_message(
+                "❌ Verification system is not set up! Use `/verifypanel` first.",
+                ephemeral=True
+            )
+            return
+
+        verified_role = interaction.guild.get_role(int(guild_data["verification"].get("verified_role_id")))
+        unverified_role = interaction.guild.get_role(int(guild_data["verification"].get("unverified_role_id")))
+
+        if not verified_role:
+            await interaction.response.send_message(
+                "❌ Verified role not found! Please recreate the verification panel.",
+                ephemeral=True
+            )
+            return
+
+        ids = parse_user_ids(user_ids)
+        if not ids and not joined_within:
+            await interaction.response.send_message(
+                "❌ Provide user IDs or a join window.",
+                ephemeral=True
+            )
+            return
+
+        await interaction.response.defer()
+
+        # Verifying only makes sense for established accounts, so the age filter is inverted here
+        selection = await collect_targets(interaction.guild, user_ids=ids, joined_within=joined_within)
+        members = selection.members
+        if account_age:
+            cutoff = discord.utils.utcnow() - timedelta(days=account_age)
+            members = [member for member in members if member.created_at <= cutoff]
+        targets = [member for member in members if verified_role not in member.roles]
+
+        async def apply(member):
+            roles = [role for role in member.roles if role != unverified_role and not role.is_default()]
+            roles.append(verified_role)
+            await member.edit(roles=roles, reason=f"Mass verification by {interaction.user}")
+
+        async def report_progress(result):
+            try:
+                await interaction.edit_original_response(embed=progress_embed("✅ Mass Verification", result))
+            except discord.HTTPException:
+                pass
+
+        result = await run_bulk(targets, apply, progress=report_progress)
+
+        timestamp = discord.utils.utcnow().isoformat()
+        await save_verifications(self.bot.db, [
+            {
+                "user_id": str(member.id),
+                "guild_id": str(interaction.guild.id),
+                "verified_by": str(interaction.user.id),
+                "manual": True,
+                "bulk": True,
+                "timestamp": timestamp
+            }
+            for member in result.succeeded
+        ])
+
+        embed = progress_embed("✅ Mass Verification", result, color=config.EMBED_COLOR_SUCCESS)
+        add_truncation_field(embed, selection)
+        if result.failed:
+            embed.add_field(
+                name="Failed",
+                value=", ".join(member.mention for member, _ in result.failed[:30]),
+                inline=False
             )
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        await interaction.edit_original_response(embed=embed)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
         """Automatically assign unverified role to new members"""
-        guild_data = await self.bot.db.guilds.find_one({"guild_id": str(member.guild.id)})
+        guild_counters.incr(member.guild.id, "joins")
+        guild_data = await get_guild_config(self.bot.db, member.guild.id)
 
         if not guild_data or "verification" not in guild_data or not guild_data["verification"].get("enabled"):
             return
 
-        unverified_role_id = guild_data["verification"].get("unverified_role_id")
-        if unverified_role_id:
-            unverified_role = member.guild.get_role(int(unverified_role_id))
-            if unverified_role:
-                await member.add_roles(unverified_role)
+        # Members who verified before and rejoined go straight back to Verified
+        verified = verified_set.contains(member.guild.id, member.id)
+        if verified is None:
+            verified = await get_verification_status(self.bot.db, member.guild.id, member.id)
+
+        role_id = guild_data["verification"].get("verified_role_id" if verified else "unverified_role_id")
+        if role_id:
+            role = member.guild.get_role(int(role_id))
+            if role:
+                # Assigned in the background so join bursts are paced per guild
+                self.join_pipeline.submit(member, role)
+
+        kick_hours = guild_data["verification"].get("kick_unverified_hours", config.UNVERIFIED_KICK_HOURS)
+        if kick_hours and not verified:
+            await scheduler.schedule(
+                self.bot.db, member.guild.id, member.id, "kick_unverified",
+                discord.utils.utcnow() + timedelta(hours=kick_hours)
+            )
+
+        cluster = self.raid_detector.observe_member(member)
+        if cluster:
+            asyncio.create_task(self.handle_raid_cluster(member.guild, cluster))
+
+    async def run_unverified_kick(self, action):
+        """Kick a member who is still unverified when their grace period ends"""
+        guild = self.bot.get_guild(int(action["guild_id"]))
+        if guild is None:
+            # Not cached yet or unavailable; the scheduler retries with backoff
+            raise LookupError(f"Guild {action['guild_id']} is not available")
+        settings = (await get_guild_config(self.bot.db, guild.id)).get("verification", {})
+        if not settings.get("enabled"):
+            return
+
+        members = await resolve_members(guild, [action["user_id"]])
+        member = members.get(int(action["user_id"]))
+        if member is None:
+            # A failed gateway lookup also leaves the member out; NotFound here
+            # means they left, which the scheduler treats as done
+            member = await guild.fetch_member(int(action["user_id"]))
+        role_ids = {role.id for role in member.roles}
+        if int(settings["verified_role_id"]) in role_ids or int(settings["unverified_role_id"]) not in role_ids:
+            return
+        await member.kick(reason="Did not verify in time")
+        await save_mod_actions(self.bot.db, [{
+            "guild_id": action["guild_id"],
+            "user_id": action["user_id"],
+            "moderator_id": str(self.bot.user.id) if self.bot.user else None,
+            "action": "kick",
+            "reason": "Did not verify in time",
+            "timestamp": discord.utils.utcnow().isoformat()
+        }])
+
+    async def handle_raid_cluster(self, guild, cluster):
+        """Record a flagged join cluster and quarantine it if configured to"""
+        if cluster.new:
+            print(
+                f"[raid] Flagged {len(cluster.member_ids)} joins in guild {guild.id}: {cluster.reason}"
+            )
+
+        action = "raid_flag"
+        if config.RAID_ACTION == "quarantine":
+            action = "raid_quarantine"
+            members = await resolve_members(guild, cluster.member_ids)
+            until = timedelta(minutes=config.RAID_QUARANTINE_MINUTES)
+
+            async def quarantine(member):
+                await member.timeout(until, reason=f"Raid detector: {cluster.reason}")
+
+            await run_bulk(list(members.values()), quarantine)
+
+        timestamp = discord.utils.utcnow().isoformat()
+        await save_mod_actions(self.bot.db, [
+            {
+                "guild_id": str(guild.id),
+                "user_id": str(user_id),
+                "moderator_id": str(self.bot.user.id) if self.bot.user else None,
+                "action": action,
+                "reason": cluster.reason,
+                "timestamp": timestamp
+            }
+            for user_id in cluster.member_ids
+        ])
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        # on_member_remove only fires for cached members, and members are not cached
+        self.join_pipeline.forget(payload.guild_id, payload.user.id)
 
 async def setup(bot):
     await bot.add_cog(Verification(bot))
@@ -1,4 +1,5 @@
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,16 +8,166 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 MONGODB_URL = os.getenv('MONGODB_URL')
 
+# Command Sync
+# The tree is only synced when its hash changes; FORCE_SYNC overrides that and
+# DEV_GUILD_ID syncs to a single guild for instant updates during development
+FORCE_SYNC = os.getenv('FORCE_SYNC', 'false').lower() == 'true' or '--force-sync' in sys.argv
+DEV_GUILD_ID = int(os.getenv('DEV_GUILD_ID')) if os.getenv('DEV_GUILD_ID') else None
+
+def _parse_shard_ids(value):
+    """Parse a shard list such as "0-3,8" into sorted shard IDs"""
+    if not value:
+        return None
+    shard_ids = set()
+    for part in value.split(','):
+        start, _, end = part.strip().partition('-')
+        shard_ids.update(range(int(start), int(end or start) + 1))
+    return sorted(shard_ids)
+
+# Sharding Configuration
+# Leave SHARD_COUNT unset to let Discord pick the shard count; set SHARD_IDS
+# to run only a range of shards in this process (e.g. "0-7")
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+SHARD_IDS = _parse_shard_ids(os.getenv('SHARD_IDS'))
+SHARD_PROCESSES = int(os.getenv('SHARD_PROCESSES', 1))
+SHARD_METRICS_INTERVAL = float(os.getenv('SHARD_METRICS_INTERVAL', 60))   # seconds
+
+# Runtime Mode
+# RUNTIME_MODE=http serves slash commands and buttons from a signed HTTP
+# endpoint instead of the gateway, so stateless replicas can run behind a load
+# balancer; point the portal's Interactions Endpoint URL at /interactions on
+# them and keep one gateway process for member joins and background work
+RUNTIME_MODE = os.getenv('RUNTIME_MODE', 'gateway')                          # gateway or http
+INTERACTIONS_PUBLIC_KEY = os.getenv('INTERACTIONS_PUBLIC_KEY')               # from the developer portal
+INTERACTIONS_HOST = os.getenv('INTERACTIONS_HOST', '0.0.0.0')
+INTERACTIONS_PORT = int(os.getenv('INTERACTIONS_PORT', 8080))
+INTERACTIONS_ACK_TIMEOUT = float(os.getenv('INTERACTIONS_ACK_TIMEOUT', 2.5))   # seconds before a slow command is deferred
+INTERACTIONS_MAX_SKEW = float(os.getenv('INTERACTIONS_MAX_SKEW', 300))         # seconds a signed timestamp stays valid
+INTERACTIONS_GUILD_TTL = float(os.getenv('INTERACTIONS_GUILD_TTL', 60))        # seconds a REST-built guild is reused
+INTERACTIONS_GUILD_CACHE_SIZE = int(os.getenv('INTERACTIONS_GUILD_CACHE_SIZE', 1000))
+
 # Website Configuration
 WEBSITE_URL = os.getenv('WEBSITE_URL', 'https://bot.icyfrvst.com')
 VERIFICATION_CALLBACK_URL = f"{WEBSITE_URL}/verify"
 
 # Verification Settings
 MAX_WARNS_BEFORE_BAN = 3
+WARNINGS_PAGE_SIZE = 10   # warnings per /warnings page, at most 25 embed fields
 VERIFIED_ROLE_NAME = "Verified"
 UNVERIFIED_ROLE_NAME = "Unverified"
 VERIFY_CHANNEL_NAME = "verify"
 
+# Metrics Settings
+# Metrics are only recorded and served when METRICS_PORT is set
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT')) if os.getenv('METRICS_PORT') else None
+
+# Diagnostics Settings
+# Stalls of the event loop longer than LOOP_STALL_THRESHOLD are logged with
+# the blocking stack; the owner-only profile command samples all threads
+LOOP_WATCHDOG_INTERVAL = float(os.getenv('LOOP_WATCHDOG_INTERVAL', 0.1))   # seconds between loop heartbeats
+LOOP_STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD', 0.25))      # seconds, 0 disables the watchdog
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))           # seconds between stack samples
+PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+
+# Database Settings
+DB_EXPLAIN_AUDIT = os.getenv('DB_EXPLAIN_AUDIT', 'false').lower() == 'true'
+
+# Cache Settings
+GUILD_CACHE_MAX_SIZE = int(os.getenv('GUILD_CACHE_MAX_SIZE', 5000))
+GUILD_CACHE_TTL = float(os.getenv('GUILD_CACHE_TTL', 300))
+
+# Verified Set Settings
+VERIFIED_SET_MERGE_THRESHOLD = int(os.getenv('VERIFIED_SET_MERGE_THRESHOLD', 4096))   # new IDs per guild before re-sorting
+
+# Write Buffer Settings
+# Verification and audit inserts are batched; WRITE_BUFFER_SPILL_PATH keeps
+# them on disk while Mongo is unreachable and replays them on the next start
+WRITE_BUFFER_MAX_BATCH = int(os.getenv('WRITE_BUFFER_MAX_BATCH', 500))
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv('WRITE_BUFFER_FLUSH_INTERVAL', 1))   # seconds
+WRITE_BUFFER_MAX_PENDING = int(os.getenv('WRITE_BUFFER_MAX_PENDING', 50000))
+WRITE_BUFFER_SPILL_PATH = os.getenv('WRITE_BUFFER_SPILL_PATH')
+
+# Join Pipeline Settings
+JOIN_QUEUE_WORKERS = int(os.getenv('JOIN_QUEUE_WORKERS', 4))
+JOIN_ROLE_RATE = float(os.getenv('JOIN_ROLE_RATE', 5))            # role assignments per second per guild
+JOIN_ROLE_BURST = int(os.getenv('JOIN_ROLE_BURST', 10))
+RAID_JOIN_THRESHOLD = int(os.getenv('RAID_JOIN_THRESHOLD', 10))   # joins per second
+RAID_ROLE_RATE = float(os.getenv('RAID_ROLE_RATE', 2))
+RAID_COOLDOWN = float(os.getenv('RAID_COOLDOWN', 60))             # seconds
+
+# Raid Detector Settings
+# Clusters of near-identical usernames or same-hour account creations within
+# the window are flagged; RAID_ACTION=quarantine also times the members out
+RAID_WINDOW = float(os.getenv('RAID_WINDOW', 300))                          # seconds
+RAID_WINDOW_MAX_JOINS = int(os.getenv('RAID_WINDOW_MAX_JOINS', 20000))      # per guild
+RAID_CLUSTER_SIZE = int(os.getenv('RAID_CLUSTER_SIZE', 10))
+RAID_SUSPICIOUS_RATIO = float(os.getenv('RAID_SUSPICIOUS_RATIO', 0.6))      # young or default-avatar share
+RAID_YOUNG_ACCOUNT_DAYS = float(os.getenv('RAID_YOUNG_ACCOUNT_DAYS', 7))
+RAID_LSH_BANDS = int(os.getenv('RAID_LSH_BANDS', 8))
+RAID_LSH_ROWS = int(os.getenv('RAID_LSH_ROWS', 4))
+RAID_ACTION = os.getenv('RAID_ACTION', 'flag')                              # flag or quarantine
+RAID_QUARANTINE_MINUTES = int(os.getenv('RAID_QUARANTINE_MINUTES', 60))
+
+# Permission Rollout Settings
+# Channel edits are paced by discord.py's per-route rate limiter
+PERMISSION_ROLLOUT_CONCURRENCY = int(os.getenv('PERMISSION_ROLLOUT_CONCURRENCY', 8))
+PERMISSION_ROLLOUT_PROGRESS_INTERVAL = float(os.getenv('PERMISSION_ROLLOUT_PROGRESS_INTERVAL', 3))
+
+# Bulk Action Settings
+BULK_ACTION_MAX_TARGETS = int(os.getenv('BULK_ACTION_MAX_TARGETS', 1000))
+BULK_ACTION_CONCURRENCY = int(os.getenv('BULK_ACTION_CONCURRENCY', 5))
+BULK_ACTION_RATE = float(os.getenv('BULK_ACTION_RATE', 5))                  # actions per second
+BULK_ACTION_RETRIES = int(os.getenv('BULK_ACTION_RETRIES', 3))
+BULK_ACTION_PROGRESS_INTERVAL = float(os.getenv('BULK_ACTION_PROGRESS_INTERVAL', 2))
+
+# Alt Graph Settings
+# Accounts sharing an IP or fingerprint are clustered in memory for /alts
+ALT_GRAPH_POLL_INTERVAL = float(os.getenv('ALT_GRAPH_POLL_INTERVAL', 30))   # seconds between checks for new verifications
+ALT_GRAPH_POLL_OVERLAP = float(os.getenv('ALT_GRAPH_POLL_OVERLAP', 120))    # seconds each check reaches back
+ALT_GRAPH_MERGE_THRESHOLD = int(os.getenv('ALT_GRAPH_MERGE_THRESHOLD', 4096))  # new identifiers per guild before re-sorting
+
+# Scheduled Action Settings
+# Guild settings warn_expiry_days and verification.kick_unverified_hours
+# override the defaults below; 0 disables either
+SCHEDULER_WINDOW = float(os.getenv('SCHEDULER_WINDOW', 3600))        # seconds of due actions held in memory
+SCHEDULER_BATCH_SIZE = int(os.getenv('SCHEDULER_BATCH_SIZE', 5000))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv('SCHEDULER_MAX_ATTEMPTS', 5))
+WARN_EXPIRY_DAYS = float(os.getenv('WARN_EXPIRY_DAYS', 0))
+UNVERIFIED_KICK_HOURS = float(os.getenv('UNVERIFIED_KICK_HOURS', 0))
+
+# DM Outbox Settings
+# Member notifications are queued in dm_outbox and sent in the background
+DM_OUTBOX_RATE = float(os.getenv('DM_OUTBOX_RATE', 2))                    # DMs per second across the process
+DM_OUTBOX_BURST = int(os.getenv('DM_OUTBOX_BURST', 5))
+DM_OUTBOX_MAX_ATTEMPTS = int(os.getenv('DM_OUTBOX_MAX_ATTEMPTS', 5))
+DM_OUTBOX_DEDUPE_TTL = float(os.getenv('DM_OUTBOX_DEDUPE_TTL', 600))      # seconds a repeat notification is dropped
+DM_OUTBOX_CLOSED_TTL = float(os.getenv('DM_OUTBOX_CLOSED_TTL', 86400))    # seconds a closed-DMs user is skipped
+DM_OUTBOX_POLL_INTERVAL = float(os.getenv('DM_OUTBOX_POLL_INTERVAL', 5))  # seconds between checks for other processes' DMs
+
+# Mod Log Settings
+# Action embeds for a guild's mod-log channel are posted up to ten per message
+MOD_LOG_FLUSH_INTERVAL = float(os.getenv('MOD_LOG_FLUSH_INTERVAL', 2))   # seconds an embed waits for company
+MOD_LOG_MAX_PENDING = int(os.getenv('MOD_LOG_MAX_PENDING', 10000))       # buffered embeds across all guilds
+
+# Guild Stats Settings
+# Per-guild counters for /serverstats are kept in guild_stats, with hourly
+# buckets in guild_stats_hourly that expire after the retention period
+GUILD_STATS_FLUSH_INTERVAL = float(os.getenv('GUILD_STATS_FLUSH_INTERVAL', 5))             # seconds
+GUILD_STATS_HOURLY_RETENTION_DAYS = int(os.getenv('GUILD_STATS_HOURLY_RETENTION_DAYS', 90))
+
+# Role Reconciliation Settings
+RECONCILE_INTERVAL = float(os.getenv('RECONCILE_INTERVAL', 24))       # hours between periodic sweeps, 0 disables
+RECONCILE_CONCURRENCY = int(os.getenv('RECONCILE_CONCURRENCY', 4))
+RECONCILE_RATE = float(os.getenv('RECONCILE_RATE', 5))                # role edits per second
+
+# Auto-Promotion Settings
+PROMOTION_BATCH_SIZE = int(os.getenv('PROMOTION_BATCH_SIZE', 100))
+PROMOTION_FLUSH_INTERVAL = float(os.getenv('PROMOTION_FLUSH_INTERVAL', 1))   # seconds
+PROMOTION_POLL_INTERVAL = float(os.getenv('PROMOTION_POLL_INTERVAL', 5))     # seconds, polling fallback only
+PROMOTION_ROLE_RATE = float(os.getenv('PROMOTION_ROLE_RATE', 5))             # role edits per second
+PROMOTION_STATE_SAVE_INTERVAL = float(os.getenv('PROMOTION_STATE_SAVE_INTERVAL', 30))  # seconds between idle resume-token saves
+
 # Colors
 EMBED_COLOR_SUCCESS = 0x00ff00  # Green
 EMBED_COLOR_ERROR = 0xff0000    # Red
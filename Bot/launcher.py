@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+import config
+
+# Runs the bot as SHARD_PROCESSES processes, each owning a contiguous shard range.
+# To spread shards over several hosts, run main.py on each host with its own
+# SHARD_IDS and the same SHARD_COUNT instead.
+
+def shard_ranges(shard_count, processes):
+    """Split shard IDs 0..shard_count-1 into `processes` contiguous ranges"""
+    size, extra = divmod(shard_count, processes)
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        if end > start:
+            yield start, end - 1
+        start = end
+
+def main():
+    if config.SHARD_COUNT is None:
+        sys.exit("SHARD_COUNT must be set to run multiple shard processes")
+
+    processes = []
+    for start, end in shard_ranges(config.SHARD_COUNT, config.SHARD_PROCESSES):
+        env = dict(os.environ, SHARD_IDS=f"{start}-{end}")
+        print(f"Starting shards {start}-{end} of {config.SHARD_COUNT}")
+        processes.append(subprocess.Popen([sys.executable, "main.py"], env=env, cwd=os.path.dirname(__file__) or "."))
+
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,272 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import os
 from dotenv import load_dotenv
 import asyncio
+import hashlib
+import json
+import logging
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
+import config
+from utils import (
+    guild_cache, ensure_indexes, audit_query_shapes, ShardMetrics, metrics, gateway_events,
+    MongoCommandTimer, RateLimitLogHandler, InstrumentedTree, record_command, instrument_http, start_metrics_server,
+    get_bot_state, save_bot_state, write_buffer, verified_set, scheduler, InteractionServer,
+    dm_outbox, alt_graph, loop_watchdog, mod_log, guild_counters, ensure_guild_stats_backfilled
+)
 
 load_dotenv()
 
-class VerificationBot(commands.Bot):
+EXTENSIONS = (
+    'cogs.moderation',
+    'cogs.verification',
+    'cogs.promotion',
+    'cogs.reconcile',
+    'cogs.alts',
+    'cogs.diagnostics',
+    'cogs.stats'
+)
+
+class VerificationBot(commands.AutoShardedBot):
     def __init__(self):
-        intents = discord.Intents.all()
-        super().__init__(command_prefix="!", intents=intents)
+        # Only what the cogs use: guild/role/channel state, member joins and
+        # leaves, bans, and mention-prefixed owner commands. No presences,
+        # message content or voice.
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.members = True
+        intents.moderation = True
+        intents.guild_messages = True
+
+        super().__init__(
+            command_prefix=commands.when_mentioned,
+            intents=intents,
+            tree_cls=InstrumentedTree,
+            # Members are resolved on demand instead of chunked and cached for every guild
+            member_cache_flags=discord.MemberCacheFlags.none(),
+            chunk_guilds_at_startup=False,
+            max_messages=None,
+            shard_count=config.SHARD_COUNT,
+            shard_ids=config.SHARD_IDS
+        )
         self.db = None
+        self.guild_cache = guild_cache
+        self.write_buffer = write_buffer
+        self.verified_set = verified_set
+        self.shard_metrics = ShardMetrics(window=config.SHARD_METRICS_INTERVAL)
+        self.interactions = None
+
+    @property
+    def http_mode(self):
+        """Whether this process serves interactions over HTTP instead of the gateway"""
+        return config.RUNTIME_MODE == 'http'
+
+    @property
+    def shard_label(self):
+        """Identifies this process's shard range, e.g. for per-process state keys"""
+        if self.shard_ids is None:
+            return "all"
+        return ",".join(str(shard_id) for shard_id in self.shard_ids)
+
+    def owns_guild(self, guild_id):
+        """Whether a guild is served by one of this process's shards"""
+        if self.shard_ids is None:
+            return True
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
 
     async def setup_hook(self):
-        # Connect to MongoDB
+        # Started first so slow startup phases that block the loop are reported too
+        if config.LOOP_STALL_THRESHOLD > 0:
+            loop_watchdog.start()
+
+        metrics.enabled = config.METRICS_PORT is not None
+        if metrics.enabled:
+            instrument_http(self.http)
+            logging.getLogger('discord.http').addHandler(RateLimitLogHandler())
+            self.metrics_runner = await start_metrics_server()
+            # Registered only here: every gateway event dispatches to this
+            # listener, so with metrics off it would be a task per event for nothing
+            self.add_listener(self.record_gateway_event, 'on_socket_event_type')
+            print(f"Metrics available on http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+
+        started = time.perf_counter()
+
+        # The database and the cogs do not depend on each other, so bring both up at once
+        await asyncio.gather(
+            self.timed_phase("database", self.connect_database()),
+            self.timed_phase("extensions", self.load_extensions())
+        )
+
+        # These back commands, which every process handles, including HTTP replicas
+        alt_graph.start(self.db, self.owns_guild)
+        self.guild_cache.start(self.db)
+        mod_log.start(self)
+        guild_counters.start(self.db)
+
+        if self.http_mode:
+            # Replicas never receive READY, so the cogs' background loops stay
+            # parked on wait_until_ready and only the gateway process runs them
+            self.interactions = InteractionServer(self)
+            await self.interactions.start()
+            metrics.register_collector("bot_interactions", self.interactions.stats)
+            print(f"Serving interactions on http://{config.INTERACTIONS_HOST}:{config.INTERACTIONS_PORT}/interactions")
+        else:
+            # Commands are global, so only the process owning shard 0 syncs them
+            if self.shard_ids is None or 0 in self.shard_ids:
+                await self.timed_phase("command sync", self.sync_commands())
+                # Runs once per deployment; the aggregations can take a while on large collections
+                self.stats_backfill_task = asyncio.create_task(ensure_guild_stats_backfilled(self.db))
+
+            # Joins fall back to a Mongo lookup until this finishes, so it doesn't hold up startup
+            self.verified_set_task = asyncio.create_task(self.verified_set.load(self.db, self.owns_guild))
+            self.scheduler_task = asyncio.create_task(self.start_background_queues())
+
+            self.report_shard_health.start()
+
+        print(f"[startup] setup finished in {time.perf_counter() - started:.2f}s")
+
+        metrics.register_collector("bot_guild_cache", self.guild_cache.stats)
+        metrics.register_collector("bot_join_queue", self.join_pipeline.stats)
+        metrics.register_collector("bot_raid_detector", self.raid_detector.stats)
+        metrics.register_collector("bot_promotion", self.get_cog('Promotion').stats)
+        metrics.register_collector("bot_shard", self.shard_metrics.stats)
+        metrics.register_collector("bot_write_buffer", self.write_buffer.stats)
+        metrics.register_collector("bot_verified_set", self.verified_set.stats)
+        metrics.register_collector("bot_scheduler", scheduler.stats)
+        metrics.register_collector("bot_dm_outbox", dm_outbox.stats)
+        metrics.register_collector("bot_alt_graph", alt_graph.stats)
+        metrics.register_collector("bot_loop", loop_watchdog.stats)
+        metrics.register_collector("bot_mod_log", mod_log.stats)
+        metrics.register_collector("bot_guild_stats", guild_counters.stats)
+
+    async def timed_phase(self, name, coroutine):
+        started = time.perf_counter()
+        result = await coroutine
+        print(f"[startup] {name} took {time.perf_counter() - started:.2f}s")
+        return result
+
+    async def connect_database(self):
         mongodb_url = os.getenv('MONGODB_URL')
-        self.mongo_client = AsyncIOMotorClient(mongodb_url)
+        event_listeners = [MongoCommandTimer()] if metrics.enabled else []
+        self.mongo_client = AsyncIOMotorClient(mongodb_url, event_listeners=event_listeners)
         self.db = self.mongo_client['verification_bot']
+        await ensure_indexes(self.db)
+        if config.DB_EXPLAIN_AUDIT:
+            await audit_query_shapes(self.db)
+        await self.write_buffer.start(self.db)
+
+    async def start_background_queues(self):
+        # Handlers look guilds up in the cache, so due actions and DMs wait until it is populated
+        await self.wait_until_ready()
+        scheduler.start(self.db, self.shard_ids, self.shard_count)
+        dm_outbox.start(self, self.db, self.shard_ids, self.shard_count)
 
-        # Load cogs
-        await self.load_extension('cogs.moderation')
-        await self.load_extension('cogs.verification')
+    async def close(self):
+        if self.interactions:
+            await self.interactions.close()
+        await scheduler.close()
+        await dm_outbox.close()
+        await alt_graph.close()
+        await self.guild_cache.close()
+        await loop_watchdog.close()
+        await mod_log.close()
+        await guild_counters.close()
+        # Flush buffered verification and audit writes before the loop goes away
+        await self.write_buffer.close()
+        await super().close()
 
-        # Sync commands
-        await self.tree.sync()
+    async def load_extensions(self):
+        await asyncio.gather(*(self.load_extension(extension) for extension in EXTENSIONS))
+
+    def command_tree_hash(self, guild=None):
+        """Stable hash of the app commands that would be synced"""
+        commands_payload = sorted(
+            (command.to_dict() for command in self.tree.get_commands(guild=guild)),
+            key=lambda command: command["name"]
+        )
+        return hashlib.sha256(json.dumps(commands_payload, sort_keys=True).encode()).hexdigest()
+
+    async def sync_commands(self):
+        """Sync the command tree only when it differs from the last synced version"""
+        guild = discord.Object(id=config.DEV_GUILD_ID) if config.DEV_GUILD_ID else None
+        if guild:
+            # Guild commands update instantly, so development syncs go to one guild only
+            self.tree.copy_global_to(guild=guild)
+
+        state_key = f"command_tree:{config.DEV_GUILD_ID or 'global'}"
+        tree_hash = self.command_tree_hash(guild=guild)
+        state = await get_bot_state(self.db, state_key)
+
+        if not config.FORCE_SYNC and state.get("hash") == tree_hash:
+            print("Command tree unchanged, skipping sync")
+            return
+
+        await self.tree.sync(guild=guild)
+        await save_bot_state(self.db, state_key, {"hash": tree_hash, "synced_at": discord.utils.utcnow().isoformat()})
         print("Commands synced!")
 
     async def on_ready(self):
         print(f'{self.user} has connected to Discord!')
-        print(f'Bot is in {len(self.guilds)} guilds')
+        print(f'Bot is in {len(self.guilds)} guilds across shards {self.shard_label} (of {self.shard_count})')
+
+    async def on_app_command_completion(self, interaction, command):
+        record_command(command.qualified_name)
+
+    async def record_gateway_event(self, event_type):
+        gateway_events.inc(event_type)
+
+    async def on_shard_connect(self, shard_id):
+        self.shard_metrics.on_connect(shard_id)
+
+    async def on_shard_disconnect(self, shard_id):
+        self.shard_metrics.on_disconnect(shard_id)
+
+    async def on_shard_resumed(self, shard_id):
+        self.shard_metrics.on_resume(shard_id)
+
+    async def on_shard_ready(self, shard_id):
+        self.shard_metrics.on_ready(shard_id)
+        print(f'Shard {shard_id} is ready')
+
+    async def on_member_join(self, member):
+        self.shard_metrics.record_event(member.guild.shard_id)
+
+    async def on_raw_member_remove(self, payload):
+        # Without a member cache discord.py only dispatches the raw event
+        guild = self.get_guild(payload.guild_id)
+        if guild is not None:
+            self.shard_metrics.record_event(guild.shard_id)
+
+    async def on_interaction(self, interaction):
+        if interaction.guild is not None:
+            self.shard_metrics.record_event(interaction.guild.shard_id)
+
+    @tasks.loop(seconds=config.SHARD_METRICS_INTERVAL)
+    async def report_shard_health(self):
+        self.shard_metrics.update_latencies(self.latencies)
+        for shard_id, shard in sorted(self.shard_metrics.stats().items()):
+            latency = f"{shard['latency'] * 1000:.0f}ms" if shard['latency'] is not None else "n/a"
+            print(
+                f"[shards] shard {shard_id}: latency {latency}, "
+                f"{shard['events_per_second']:.2f} events/s, "
+                f"{shard['disconnects']} disconnects, {shard['resumes']} resumes"
+            )
+
+    @report_shard_health.before_loop
+    async def before_report_shard_health(self):
+        await self.wait_until_ready()
 
 async def main():
     bot = VerificationBot()
     async with bot:
-        await bot.start(os.getenv('DISCORD_TOKEN'))
+        if bot.http_mode:
+            # Logging in runs setup_hook, which starts the interactions server;
+            # no gateway connection is opened
+            await bot.login(os.getenv('DISCORD_TOKEN'))
+            await asyncio.Event().wait()
+        else:
+            await bot.start(os.getenv('DISCORD_TOKEN'))
 
 if __name__ == "__main__":
     asyncio.run(main())
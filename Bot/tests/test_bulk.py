@@ -0,0 +1,28 @@
+import asyncio
+from datetime import timedelta
+
+import discord
+
+from benchmarks.fakes import FakeGuild, FakeRest
+from utils.bulk import collect_targets
+
+
+def test_filter_selection_reports_matches_past_the_limit():
+    guild = FakeGuild(FakeRest())
+    now = discord.utils.utcnow()
+    recent = [guild.add_member(joined_at=now - timedelta(minutes=5)) for _ in range(30)]
+    for _ in range(20):
+        guild.add_member(joined_at=now - timedelta(days=3))
+
+    selection = asyncio.run(collect_targets(guild, joined_within=60, limit=10))
+    assert len(selection.members) == 10
+    assert selection.matched == 30 and selection.truncated
+    assert {member.id for member in selection.members} <= {member.id for member in recent}
+
+
+def test_selection_within_the_limit_is_not_truncated():
+    guild = FakeGuild(FakeRest())
+    members = [guild.add_member() for _ in range(5)]
+
+    selection = asyncio.run(collect_targets(guild, user_ids=[member.id for member in members], limit=10))
+    assert selection.matched == 5 and not selection.truncated
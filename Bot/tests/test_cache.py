@@ -0,0 +1,12 @@
+from utils.cache import GuildConfigCache
+
+
+def test_callers_cannot_change_cached_documents():
+    cache = GuildConfigCache(max_size=10, ttl=60)
+    document = {"guild_id": "42", "settings": {"max_warns": 3}}
+    cache.set(42, document)
+    document["settings"]["max_warns"] = 1
+
+    first = cache.get(42)
+    first["settings"]["max_warns"] = 5
+    assert cache.get(42)["settings"]["max_warns"] == 3
@@ -0,0 +1,43 @@
+import asyncio
+
+from benchmarks.memory_db import MemoryDatabase
+from utils import guild_cache
+from utils.database import get_guild_config, migrate_embedded_warns
+
+
+def test_concurrent_misses_create_one_default_config():
+    db = MemoryDatabase()
+    guild_cache.clear()
+
+    async def burst():
+        return await asyncio.gather(*(get_guild_config(db, 42) for _ in range(20)))
+
+    configs = asyncio.run(burst())
+    assert all(config["settings"]["max_warns"] == configs[0]["settings"]["max_warns"] for config in configs)
+    assert len(db.guilds.documents) == 1
+
+
+def test_warn_migration_rerun_after_a_crash_does_not_double_count():
+    db = MemoryDatabase()
+    legacy = [{"reason": "spam", "moderator_id": "1", "timestamp": "2024-01-01T00:00:00"}] * 2
+
+    async def run():
+        await db.guilds.insert_one({"guild_id": "42", "warns": {"7": legacy}})
+        unset = db.guilds.update_one
+
+        async def crash(*args, **kwargs):
+            raise RuntimeError("process killed")
+
+        # Die after the warns were copied but before the guild was unset
+        db.guilds.update_one = crash
+        try:
+            await migrate_embedded_warns(db)
+        except RuntimeError:
+            pass
+        db.guilds.update_one = unset
+        await migrate_embedded_warns(db)
+        return await db.warns.find_one({"guild_id": "42", "user_id": "7"}), await db.guilds.find_one({"guild_id": "42"})
+
+    user_warns, guild = asyncio.run(run())
+    assert user_warns["count"] == 2 and len(user_warns["warns"]) == 2
+    assert "warns" not in guild
@@ -0,0 +1,40 @@
+import asyncio
+
+from pymongo.errors import PyMongoError
+
+from benchmarks.memory_db import MemoryDatabase
+from utils import guild_stats
+from utils.guild_stats import BACKFILL_STATE_KEY, ensure_guild_stats_backfilled
+
+
+def test_backfill_runs_once_across_processes(monkeypatch):
+    db = MemoryDatabase()
+    runs = []
+
+    async def backfill(db):
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return 3
+
+    monkeypatch.setattr(guild_stats, "backfill_guild_stats", backfill)
+
+    async def start():
+        await asyncio.gather(*(ensure_guild_stats_backfilled(db) for _ in range(3)))
+        await ensure_guild_stats_backfilled(db)
+
+    asyncio.run(start())
+    assert len(runs) == 1
+    state = db.bot_state.documents[0]
+    assert state["_id"] == BACKFILL_STATE_KEY
+    assert state["guilds"] == 3 and "completed_at" in state
+
+
+def test_failed_backfill_releases_the_claim(monkeypatch):
+    db = MemoryDatabase()
+
+    async def backfill(db):
+        raise PyMongoError("aggregate failed")
+
+    monkeypatch.setattr(guild_stats, "backfill_guild_stats", backfill)
+    asyncio.run(ensure_guild_stats_backfilled(db))
+    assert db.bot_state.documents == []
@@ -0,0 +1,106 @@
+import asyncio
+import os
+
+import pytest
+from pymongo import ASCENDING, IndexModel
+
+from benchmarks.memory_db import MemoryDatabase
+from utils import indexes
+from utils.indexes import INDEXES, QUERY_SHAPES, audit_query_shapes, ensure_indexes, find_collscans
+
+# The memory store's explain() only reports whether an index leads with a
+# filtered field; the real planner check needs a mongod to talk to
+MONGODB_TEST_URL = os.getenv("MONGODB_TEST_URL")
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_find_collscans_walks_nested_plans():
+    plan = {
+        "stage": "SORT",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [
+                {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+                {"stage": "COLLSCAN"}
+            ]
+        }
+    }
+    assert find_collscans(plan) == ["COLLSCAN"]
+    assert find_collscans({"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}) == []
+
+
+def test_every_query_shape_has_a_leading_index_field_fake_planner():
+    """Fake-only: catches shapes with no index at all, not real planner choices"""
+    db = MemoryDatabase()
+    run(ensure_indexes(db))
+    report = run(audit_query_shapes(db))
+    assert len(report) == len(QUERY_SHAPES)
+    assert [entry for entry in report if entry["collscan"]] == []
+
+
+def test_audit_reports_unindexed_shapes():
+    db = MemoryDatabase()
+    report = run(audit_query_shapes(db, [("warns", {"guild_id": "0", "user_id": "0"}, None)]))
+    assert report[0]["collscan"]
+
+
+def test_ensure_indexes_is_idempotent():
+    db = MemoryDatabase()
+    run(ensure_indexes(db))
+    first = {name: run(db[name].index_information()) for name in INDEXES}
+    run(ensure_indexes(db))
+    assert {name: run(db[name].index_information()) for name in INDEXES} == first
+
+
+@pytest.mark.skipif(not MONGODB_TEST_URL, reason="set MONGODB_TEST_URL to audit against a real mongod")
+def test_every_query_shape_is_indexed_on_mongod():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def audit():
+        client = AsyncIOMotorClient(MONGODB_TEST_URL)
+        db = client[f"index_audit_{os.getpid()}"]
+        try:
+            await ensure_indexes(db)
+            return await audit_query_shapes(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    report = run(audit())
+    assert [entry for entry in report if entry["collscan"]] == []
+
+
+def test_ttl_change_is_applied_with_collmod(monkeypatch):
+    db = MemoryDatabase()
+    old = IndexModel([("hour", ASCENDING)], name="hour_ttl", expireAfterSeconds=60)
+    new = IndexModel([("hour", ASCENDING)], name="hour_ttl", expireAfterSeconds=120)
+    run(db.guild_stats_hourly.create_indexes([old]))
+    monkeypatch.setattr(indexes, "INDEXES", {"guild_stats_hourly": [new]})
+
+    dropped = []
+    original_drop = db.guild_stats_hourly.drop_index
+
+    async def drop_index(name):
+        dropped.append(name)
+        await original_drop(name)
+
+    db.guild_stats_hourly.drop_index = drop_index
+    run(indexes.ensure_indexes(db))
+    assert dropped == []
+    assert run(db.guild_stats_hourly.index_information())["hour_ttl"]["expireAfterSeconds"] == 120
+
+
+def test_partial_filter_change_rebuilds_the_index(monkeypatch):
+    db = MemoryDatabase()
+    old = IndexModel([("due_at", ASCENDING)], name="due_at")
+    new = IndexModel([("due_at", ASCENDING)], name="due_at_pending", partialFilterExpression={"done": False})
+    run(db.scheduled_actions.create_indexes([old]))
+    monkeypatch.setattr(indexes, "INDEXES", {"scheduled_actions": [new]})
+
+    run(indexes.ensure_indexes(db))
+    information = run(db.scheduled_actions.index_information())
+    assert "due_at" not in information
+    assert information["due_at_pending"]["partialFilterExpression"] == {"done": False}
@@ -0,0 +1,80 @@
+import asyncio
+
+from benchmarks.fakes import FakeGuild, FakeRest
+from utils.join_queue import JoinPipeline
+
+
+async def drain(pipeline, timeout=10):
+    async def wait():
+        while pipeline.queue_depth() or any(queue.workers for queue in pipeline.guilds.values()):
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(wait(), timeout)
+
+
+def test_join_after_a_worker_finishes_still_gets_a_worker():
+    async def run():
+        guild = FakeGuild(FakeRest())
+        role = guild.create_role_now("Unverified")
+        # Raid mode keeps the guild's queue around after its workers exit
+        pipeline = JoinPipeline(workers=1, rate=1000, burst=1000, raid_threshold=1, raid_rate=1000)
+
+        first = guild.add_member()
+        pipeline.submit(first, role)
+        guild_queue = pipeline.guilds[guild.id]
+        worker = next(iter(guild_queue.workers))
+        # Stop in the window where the worker has returned but its done
+        # callback has not yet removed it from the guild's workers
+        while not worker.done():
+            await asyncio.sleep(0)
+        assert worker in guild_queue.workers
+
+        second = guild.add_member()
+        pipeline.submit(second, role)
+        await drain(pipeline)
+        return first, second, role
+
+    first, second, role = asyncio.run(run())
+    assert role in first.roles and role in second.roles
+
+
+def test_burst_of_joins_across_guilds_all_get_the_role():
+    async def run():
+        rest = FakeRest()
+        guilds = [FakeGuild(rest) for _ in range(10)]
+        roles = {guild.id: guild.create_role_now("Unverified") for guild in guilds}
+        pipeline = JoinPipeline(workers=4, rate=100000, burst=100000, raid_threshold=100000)
+
+        members = []
+        for index in range(10000):
+            guild = guilds[index % len(guilds)]
+            member = guild.add_member()
+            members.append(member)
+            pipeline.submit(member, roles[guild.id])
+            # Gateway events arrive between loop iterations, not all at once
+            if index % 7 == 0:
+                await asyncio.sleep(0)
+        await drain(pipeline)
+        return members, roles, pipeline
+
+    members, roles, pipeline = asyncio.run(run())
+    assert all(roles[member.guild.id] in member.roles for member in members)
+    assert pipeline.assigned == 10000 and pipeline.failed == 0
+
+
+def test_members_who_left_do_not_use_up_tokens():
+    async def run():
+        guild = FakeGuild(FakeRest())
+        role = guild.create_role_now("Unverified")
+        # One token and a slow refill: a wasted token would stall the next join
+        pipeline = JoinPipeline(workers=1, rate=0.1, burst=1, raid_threshold=100)
+
+        left, stayed = guild.add_member(), guild.add_member()
+        pipeline.submit(left, role)
+        pipeline.submit(stayed, role)
+        pipeline.forget(guild.id, left.id)
+        await drain(pipeline, timeout=1)
+        return left, stayed, role, pipeline
+
+    left, stayed, role, pipeline = asyncio.run(run())
+    assert role not in left.roles and role in stayed.roles
+    assert pipeline.skipped == 1 and pipeline.assigned == 1
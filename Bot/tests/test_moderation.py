@@ -0,0 +1,29 @@
+import asyncio
+from datetime import timedelta
+
+import discord
+
+from benchmarks.fakes import FakeBot, FakeGuild, FakeInteraction, FakeRest
+from benchmarks.memory_db import MemoryDatabase
+from cogs.moderation import Moderation
+from utils import scheduler
+
+
+def test_massban_cancels_pending_tempban_unbans():
+    async def run():
+        db = MemoryDatabase()
+        guild = FakeGuild(FakeRest())
+        bot = FakeBot(db, [guild])
+        moderator = guild.add_member("moderator", roles=[guild.create_role_now("Moderator", 50)])
+        member, other = guild.add_member(), guild.add_member()
+        due_at = discord.utils.utcnow() + timedelta(hours=1)
+        for user in (member, other):
+            await scheduler.schedule(db, guild.id, user.id, "unban", due_at)
+
+        cog = Moderation(bot)
+        interaction = FakeInteraction(guild, moderator, bot)
+        await cog.bulk_moderate(interaction, "ban", str(member.id), None, None, "raid", False)
+        return db, member, other
+
+    db, member, other = asyncio.run(run())
+    assert [document["user_id"] for document in db.scheduled_actions.documents] == [str(other.id)]
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from benchmarks.fakes import FakeBot, FakeGuild, FakeRest
+from benchmarks.memory_db import MemoryDatabase
+from cogs.promotion import Promotion
+from utils import CHANGE_STREAMS_UNSUPPORTED, verified_set
+
+
+def make_promotion(guilds):
+    bot = FakeBot(MemoryDatabase(), guilds)
+    bot.shard_label = "0"
+    return Promotion(bot)
+
+
+def test_manual_verifications_from_other_processes_reach_the_verified_set():
+    guild = FakeGuild(FakeRest())
+    member = guild.add_member()
+    promotion = make_promotion([guild])
+    promoted = []
+
+    async def promote_guild(guild_id, verifications):
+        promoted.extend(verifications)
+
+    promotion.promote_guild = promote_guild
+    verified_set.clear()
+    asyncio.run(promotion.promote([{
+        "_id": 1,
+        "guild_id": str(guild.id),
+        "user_id": str(member.id),
+        "manual": True,
+        "verified_at": "2026-01-01T00:00:00.000Z"
+    }]))
+
+    assert verified_set.contains(guild.id, member.id)
+    # The command that recorded it already granted the role
+    assert promoted == []
+    assert promotion.last_verified_at == "2026-01-01T00:00:00.000Z"
+
+
+class Stop(BaseException):
+    pass
+
+
+@pytest.mark.parametrize("code, polls", [(286, False), (CHANGE_STREAMS_UNSUPPORTED, True)])
+def test_only_unsupported_topologies_fall_back_to_polling(monkeypatch, code, polls):
+    monkeypatch.setattr("config.PROMOTION_POLL_INTERVAL", 0)
+    promotion = make_promotion([])
+    attempts = []
+
+    async def watch():
+        attempts.append(promotion.resume_token)
+        if len(attempts) > 1:
+            raise Stop()
+        raise OperationFailure("change stream failed", code=code)
+
+    async def poll():
+        raise Stop()
+
+    async def load_state(*args):
+        return {"resume_token": {"_data": "lost"}}
+
+    monkeypatch.setattr("cogs.promotion.get_bot_state", load_state)
+    promotion.watch = watch
+    promotion.poll = poll
+    with pytest.raises(Stop):
+        asyncio.run(promotion.run())
+    # A lost token goes back to the change stream, without the token
+    assert attempts == ([{"_data": "lost"}] if polls else [{"_data": "lost"}, None])
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import timedelta
+
+import discord
+from bson import ObjectId
+
+from benchmarks.fakes import FakeGuild, FakeRest
+from benchmarks.memory_db import MemoryDatabase
+from utils import guild_cache
+from utils.database import get_guild_config, get_verification_enabled_at
+from utils.reconcile import role_diff
+
+
+def test_legacy_config_without_enabled_at_still_marks_new_joins():
+    db = MemoryDatabase()
+    guild_cache.clear()
+    guild = FakeGuild(FakeRest())
+    verified_role = guild.create_role_now("Verified")
+    unverified_role = guild.create_role_now("Unverified")
+    now = discord.utils.utcnow()
+    first_verified = now - timedelta(days=10)
+    before = guild.add_member(joined_at=now - timedelta(days=20))
+    # Joined while the bot was offline, so never got Unverified
+    offline_join = guild.add_member(joined_at=now - timedelta(days=1))
+
+    async def run():
+        await db.guilds.insert_one({"guild_id": str(guild.id), "verification": {
+            "enabled": True,
+            "verified_role_id": str(verified_role.id),
+            "unverified_role_id": str(unverified_role.id)
+        }})
+        await db.verifications.insert_one({
+            "_id": ObjectId.from_datetime(first_verified),
+            "guild_id": str(guild.id),
+            "user_id": "1"
+        })
+        settings = (await get_guild_config(db, guild.id))["verification"]
+        enabled_at = await get_verification_enabled_at(db, guild.id, settings)
+        stored = (await get_guild_config(db, guild.id))["verification"]["enabled_at"]
+        return enabled_at, stored
+
+    enabled_at, stored = asyncio.run(run())
+    assert abs(enabled_at - first_verified) < timedelta(seconds=1)
+    assert stored == enabled_at.isoformat()
+    assert role_diff(before, False, verified_role, unverified_role, enabled_at) is None
+    assert unverified_role in role_diff(offline_join, False, verified_role, unverified_role, enabled_at)
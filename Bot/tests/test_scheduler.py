@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime, timezone
+
+from benchmarks.memory_db import MemoryDatabase
+from utils.mod_log import mod_log
+from utils.scheduler import ActionScheduler
+
+
+def test_abandoned_action_is_reported_to_the_mod_log(monkeypatch):
+    posted = []
+
+    async def post(db, guild_id, embed, urgent=False):
+        posted.append((guild_id, embed, urgent))
+        return True
+
+    monkeypatch.setattr(mod_log, "post", post)
+
+    async def unban(action):
+        raise RuntimeError("Missing Permissions")
+
+    async def run():
+        db = MemoryDatabase()
+        scheduler = ActionScheduler(max_attempts=1)
+        scheduler.db = db
+        scheduler.register("unban", unban)
+        action = {
+            "guild_id": "1", "user_id": "2", "action": "unban",
+            "due_at": datetime.now(timezone.utc), "attempts": 0
+        }
+        await db.scheduled_actions.insert_one(action)
+        await scheduler._execute(action)
+        return db, scheduler
+
+    db, scheduler = asyncio.run(run())
+    assert db.scheduled_actions.documents == [] and scheduler.failed == 1
+    [(guild_id, embed, urgent)] = posted
+    assert guild_id == 1 and urgent
+    assert "unban" in embed.description and "Missing Permissions" in embed.fields[1].value
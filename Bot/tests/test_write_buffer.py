@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from benchmarks.memory_db import MemoryDatabase
+from utils.write_buffer import WriteBehindBuffer
+
+
+def spill_writes(path, count):
+    buffer = WriteBehindBuffer(spill_path=str(path))
+    buffer._spill("mod_actions", [{"_id": index, "action": "warn"} for index in range(count)])
+
+
+async def replay(db, path):
+    buffer = WriteBehindBuffer(spill_path=str(path))
+    buffer.db = db
+    await buffer.replay_spill()
+
+
+class Crash(Exception):
+    pass
+
+
+def test_spill_survives_a_crash_during_replay(tmp_path):
+    path = tmp_path / "spill.jsonl"
+    spill_writes(path, 3)
+    db = MemoryDatabase()
+
+    async def crash(*args, **kwargs):
+        raise Crash()
+
+    db.mod_actions.insert_many = crash
+    with pytest.raises(Crash):
+        asyncio.run(replay(db, path))
+
+    # Nothing was written, so the next start must still find every write
+    db = MemoryDatabase()
+    asyncio.run(replay(db, path))
+    assert sorted(document["_id"] for document in db.mod_actions.documents) == [0, 1, 2]
+    assert not os.path.exists(path) and not os.path.exists(f"{path}.replaying")
+
+
+def test_failed_replay_is_spilled_again(tmp_path):
+    path = tmp_path / "spill.jsonl"
+    spill_writes(path, 3)
+    db = MemoryDatabase()
+
+    async def unavailable(*args, **kwargs):
+        raise PyMongoError("not primary")
+
+    db.mod_actions.insert_many = unavailable
+    asyncio.run(replay(db, path))
+
+    db = MemoryDatabase()
+    asyncio.run(replay(db, path))
+    assert sorted(document["_id"] for document in db.mod_actions.documents) == [0, 1, 2]
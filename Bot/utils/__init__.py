@@ -1,19 +1,118 @@
 from .database import (
     get_guild_config,
     save_guild_config,
-    get_user_warns,
+    get_warns_page,
     add_warn,
     clear_warns,
+    migrate_embedded_warns,
+    get_verification_enabled_at,
+    get_bot_state,
+    save_bot_state,
     get_verification_status,
-    save_verification
+    get_verified_user_ids,
+    expire_warn,
+    save_verification,
+    save_verifications,
+    save_mod_actions
 )
+from .cache import CHANGE_STREAMS_UNSUPPORTED, GuildConfigCache, guild_cache
+from .indexes import INDEXES, QUERY_SHAPES, ensure_indexes, audit_query_shapes
+from .metrics import (
+    metrics, percentile, gateway_events, MongoCommandTimer, RateLimitLogHandler, InstrumentedTree,
+    record_command, instrument_http, start_metrics_server, label_task
+)
+from .ratelimit import TokenBucket
+from .join_queue import JoinPipeline
+from .raid_detector import RaidCluster, RaidDetector
+from .permissions import RolloutResult, apply_role_overwrite, channels_needing_overwrite
+from .shards import ShardMetrics
+from .members import resolve_members
+from .bulk import (
+    BulkResult, TargetSelection, parse_user_ids, collect_targets, add_truncation_field, run_bulk, progress_embed
+)
+from .write_buffer import WriteBehindBuffer, write_buffer
+from .verified_set import VerifiedSet, verified_set
+from .reconcile import ReconcileResult, reconcile_roles, reconcile_embed
+from .scheduler import ActionScheduler, scheduler
+from .interactions import InteractionServer, verify_signature
+from .dm_outbox import DMOutbox, dm_outbox
+from .alt_graph import AltGraph, alt_graph
+from .profiling import LoopWatchdog, SamplingProfiler, loop_watchdog, profiler
+from .mod_log import ModLogSink, mod_log
+from .guild_stats import GuildCounters, guild_counters, backfill_guild_stats, ensure_guild_stats_backfilled
 
 __all__ = [
     'get_guild_config',
     'save_guild_config',
-    'get_user_warns',
+    'get_warns_page',
     'add_warn',
     'clear_warns',
+    'migrate_embedded_warns',
+    'get_verification_enabled_at',
+    'get_bot_state',
+    'save_bot_state',
     'get_verification_status',
-    'save_verification'
+    'get_verified_user_ids',
+    'expire_warn',
+    'save_verification',
+    'save_verifications',
+    'save_mod_actions',
+    'CHANGE_STREAMS_UNSUPPORTED',
+    'GuildConfigCache',
+    'guild_cache',
+    'INDEXES',
+    'QUERY_SHAPES',
+    'ensure_indexes',
+    'audit_query_shapes',
+    'metrics',
+    'percentile',
+    'gateway_events',
+    'MongoCommandTimer',
+    'RateLimitLogHandler',
+    'InstrumentedTree',
+    'record_command',
+    'instrument_http',
+    'start_metrics_server',
+    'label_task',
+    'TokenBucket',
+    'JoinPipeline',
+    'RaidCluster',
+    'RaidDetector',
+    'RolloutResult',
+    'apply_role_overwrite',
+    'channels_needing_overwrite',
+    'ShardMetrics',
+    'resolve_members',
+    'BulkResult',
+    'TargetSelection',
+    'parse_user_ids',
+    'collect_targets',
+    'add_truncation_field',
+    'run_bulk',
+    'progress_embed',
+    'WriteBehindBuffer',
+    'write_buffer',
+    'VerifiedSet',
+    'verified_set',
+    'ReconcileResult',
+    'reconcile_roles',
+    'reconcile_embed',
+    'ActionScheduler',
+    'scheduler',
+    'InteractionServer',
+    'verify_signature',
+    'DMOutbox',
+    'dm_outbox',
+    'AltGraph',
+    'alt_graph',
+    'LoopWatchdog',
+    'SamplingProfiler',
+    'loop_watchdog',
+    'profiler',
+    'ModLogSink',
+    'mod_log',
+    'GuildCounters',
+    'guild_counters',
+    'backfill_guild_stats',
+    'ensure_guild_stats_backfilled'
 ]
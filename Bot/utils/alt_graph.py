@@ -0,0 +1,300 @@
+# In-memory alt-account graph
+#
+# The site flags an alt when a new verification shares an IP with an earlier
+# one in the same guild, which only ever links pairs. Here every IP (and
+# browser fingerprint, where the site records one) maps to the first account
+# seen with it, and accounts sharing an identifier are merged with union-find,
+# so chains like A-B via one IP and B-C via another end up in one cluster.
+
+import asyncio
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+import config
+
+VERIFICATION_PROJECTION = {"_id": 1, "guild_id": 1, "user_id": 1, "client_info.ip": 1, "client_info.fingerprint": 1}
+ALT_PROJECTION = {"_id": 1, "guild_id": 1, "main_account": 1, "alt_account": 1, "ip": 1}
+
+
+def identifier(kind, value):
+    # Only compared within this process, so the salted str hash is fine and
+    # much smaller than keeping every IP string
+    return hash(f"{kind}:{value}")
+
+
+class GuildAltGraph:
+    """Union-find over one guild's accounts, plus the identifier index
+
+    Identifiers loaded at startup sit in two parallel int64 arrays sorted by
+    identifier, 16 bytes each; ones seen since go to `recent` and are merged
+    into the arrays once it passes `merge_threshold`. Roots and accounts
+    never linked to anything have no `parent` entry, and only clusters of
+    two or more keep a member list.
+    """
+
+    __slots__ = ("keys", "owners", "recent", "parent", "members", "merge_threshold")
+
+    def __init__(self, merge_threshold=config.ALT_GRAPH_MERGE_THRESHOLD):
+        self.keys = array("q")
+        self.owners = array("q")
+        self.recent = {}
+        self.parent = {}
+        self.members = {}
+        self.merge_threshold = merge_threshold
+
+    def find(self, user_id):
+        parent = self.parent
+        root = user_id
+        while root in parent:
+            root = parent[root]
+        while user_id != root:
+            parent[user_id], user_id = root, parent[user_id]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        members_a = self.members.get(root_a) or [root_a]
+        members_b = self.members.pop(root_b, None) or [root_b]
+        if len(members_a) < len(members_b):
+            root_a, root_b, members_a, members_b = root_b, root_a, members_b, members_a
+            self.members.pop(root_b, None)
+        # Union by size: the smaller cluster's members are moved, at most log n times each
+        self.parent[root_b] = root_a
+        members_a.extend(members_b)
+        self.members[root_a] = members_a
+        return True
+
+    def owner(self, key):
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return self.owners[index]
+        return self.recent.get(key)
+
+    def link(self, user_id, key):
+        owner = self.owner(key)
+        if owner is None:
+            self.recent[key] = user_id
+            if len(self.recent) >= self.merge_threshold:
+                self.merge()
+            return False
+        return owner != user_id and self.union(owner, user_id)
+
+    def merge(self):
+        """Fold `recent` into the sorted arrays in one linear pass"""
+        keys, owners = array("q"), array("q")
+        start = 0
+        for key, owner in sorted(self.recent.items()):
+            end = bisect_left(self.keys, key, start)
+            keys.extend(self.keys[start:end])
+            owners.extend(self.owners[start:end])
+            keys.append(key)
+            owners.append(owner)
+            start = end
+        keys.extend(self.keys[start:])
+        owners.extend(self.owners[start:])
+        self.keys, self.owners, self.recent = keys, owners, {}
+
+    def install(self, keys, owners):
+        """Build the index from unsorted (identifier, account) columns, linking repeats
+
+        Returns the number of clusters merged.
+        """
+        unions = 0
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys, self.owners = array("q"), array("q")
+        for index in order:
+            key, user_id = keys[index], owners[index]
+            if self.keys and self.keys[-1] == key:
+                unions += self.union(self.owners[-1], user_id)
+            else:
+                self.keys.append(key)
+                self.owners.append(user_id)
+        return unions
+
+    def cluster(self, user_id):
+        return self.members.get(self.find(user_id), [user_id])
+
+    def memory_bytes(self):
+        """Approximate bytes held by the index arrays, delta and union-find dicts"""
+        return (
+            (self.keys.buffer_info()[1] + self.owners.buffer_info()[1]) * 8
+            + (len(self.recent) + len(self.parent)) * 100
+            + sum(len(members) * 8 + 56 for members in self.members.values())
+        )
+
+
+class AltGraph:
+    """Alt clusters per guild, bootstrapped from Mongo and kept current by polling
+
+    Until the initial load finishes `loaded` is False and clusters may be
+    incomplete. After that, new verifications and alt_accounts rows are picked
+    up every `poll_interval` seconds; each poll overlaps the previous one by
+    `poll_overlap` seconds so documents whose ObjectId was generated before
+    they were inserted are not missed, which is harmless since linking is
+    idempotent.
+    """
+
+    def __init__(self, poll_interval=config.ALT_GRAPH_POLL_INTERVAL, poll_overlap=config.ALT_GRAPH_POLL_OVERLAP):
+        self.poll_interval = poll_interval
+        self.poll_overlap = poll_overlap
+        self.guilds = {}
+        self.loaded = False
+        self.owns_guild = None
+        self.polled_at = None
+        self.task = None
+
+        self.verifications = 0
+        self.alt_records = 0
+        self.unions = 0
+
+    def _graph(self, guild_id):
+        graph = self.guilds.get(guild_id)
+        if graph is None:
+            graph = self.guilds[guild_id] = GuildAltGraph()
+        return graph
+
+    def _owned(self, guild_id):
+        return self.owns_guild is None or self.owns_guild(guild_id)
+
+    def _identifiers(self, verification):
+        """(guild ID, user ID, identifier keys) of a verification, or None to skip it"""
+        client_info = verification.get("client_info") or {}
+        keys = [identifier(kind, client_info[kind]) for kind in ("ip", "fingerprint") if client_info.get(kind)]
+        guild_id = int(verification["guild_id"])
+        if not keys or not self._owned(guild_id):
+            return None
+        return guild_id, int(verification["user_id"]), keys
+
+    def add_verification(self, verification):
+        entry = self._identifiers(verification)
+        if entry is None:
+            return
+        guild_id, user_id, keys = entry
+        graph = self._graph(guild_id)
+        self.verifications += 1
+        for key in keys:
+            self.unions += graph.link(user_id, key)
+
+    def _stage(self, staged, verification):
+        entry = self._identifiers(verification)
+        if entry is None:
+            return
+        guild_id, user_id, keys = entry
+        columns = staged.get(guild_id)
+        if columns is None:
+            columns = staged[guild_id] = (array("q"), array("q"))
+        self.verifications += 1
+        for key in keys:
+            columns[0].append(key)
+            columns[1].append(user_id)
+
+    def _install(self, staged):
+        # One guild at a time, so the transient sort order is never bigger than a guild
+        self.guilds = {}
+        for guild_id in list(staged):
+            keys, owners = staged.pop(guild_id)
+            self.unions += self._graph(guild_id).install(keys, owners)
+
+    def build(self, verifications):
+        """Replace the graph with verifications from any iterable"""
+        staged = {}
+        for verification in verifications:
+            self._stage(staged, verification)
+        self._install(staged)
+
+    def add_alt_record(self, record):
+        guild_id = int(record["guild_id"])
+        if not self._owned(guild_id):
+            return
+        graph = self._graph(guild_id)
+        main_account, alt_account = int(record["main_account"]), int(record["alt_account"])
+        self.alt_records += 1
+        if record.get("ip"):
+            graph.link(main_account, identifier("ip", record["ip"]))
+        self.unions += graph.union(main_account, alt_account)
+
+    def cluster(self, guild_id, user_id):
+        """Every account linked to the user, including the user; O(cluster size)"""
+        graph = self.guilds.get(int(guild_id))
+        return graph.cluster(int(user_id)) if graph else [int(user_id)]
+
+    def start(self, db, owns_guild=None):
+        """Load the graph in the background, then keep polling for new links"""
+        self.owns_guild = owns_guild
+        self.task = asyncio.create_task(self._run(db))
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def load(self, db):
+        """Stream every verification and alt_accounts row into the graph"""
+        started = time.perf_counter()
+        self.polled_at = datetime.now(timezone.utc)
+        staged = {}
+        async for verification in db.verifications.find({}, VERIFICATION_PROJECTION).batch_size(10000):
+            self._stage(staged, verification)
+        self._install(staged)
+        async for record in db.alt_accounts.find({}, ALT_PROJECTION).batch_size(10000):
+            self.add_alt_record(record)
+        self.loaded = True
+        print(
+            f"[alt-graph] Linked {self.verifications} verifications and {self.alt_records} alt records "
+            f"into {self.cluster_count()} clusters in {time.perf_counter() - started:.2f}s"
+        )
+
+    async def poll(self, db):
+        """Apply documents inserted since the last poll"""
+        now = datetime.now(timezone.utc)
+        query = {"_id": {"$gte": ObjectId.from_datetime(self.polled_at - timedelta(seconds=self.poll_overlap))}}
+        async for verification in db.verifications.find(query, VERIFICATION_PROJECTION):
+            self.add_verification(verification)
+        async for record in db.alt_accounts.find(query, ALT_PROJECTION):
+            self.add_alt_record(record)
+        self.polled_at = now
+
+    async def _run(self, db):
+        while not self.loaded:
+            try:
+                await self.load(db)
+            except PyMongoError as e:
+                print(f"[alt-graph] Load failed, retrying: {e}")
+                self.guilds.clear()
+                self.verifications = self.alt_records = self.unions = 0
+                await asyncio.sleep(self.poll_interval)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll(db)
+            except PyMongoError as e:
+                print(f"[alt-graph] Poll failed, retrying: {e}")
+
+    def cluster_count(self):
+        return sum(len(graph.members) for graph in self.guilds.values())
+
+    def stats(self):
+        return {
+            "loaded": int(self.loaded),
+            "guilds": len(self.guilds),
+            "identifiers": sum(len(graph.keys) + len(graph.recent) for graph in self.guilds.values()),
+            "linked_accounts": sum(len(graph.parent) + len(graph.members) for graph in self.guilds.values()),
+            "clusters": self.cluster_count(),
+            "largest_cluster": max(
+                (len(members) for graph in self.guilds.values() for members in graph.members.values()),
+                default=0
+            ),
+            "memory_bytes": sum(graph.memory_bytes() for graph in self.guilds.values()),
+            "unions": self.unions
+        }
+
+
+alt_graph = AltGraph()
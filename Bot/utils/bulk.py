@@ -0,0 +1,183 @@
+# Target selection and paced execution for bulk moderation commands
+
+import asyncio
+import re
+import time
+from datetime import timedelta
+
+import discord
+
+import config
+from .members import FETCH_CONCURRENCY, resolve_members
+from .ratelimit import TokenBucket
+
+
+class BulkResult:
+    """Progress and outcome of a bulk action"""
+
+    def __init__(self, total):
+        self.total = total
+        self.succeeded = []
+        self.failed = []
+
+    @property
+    def done(self):
+        return len(self.succeeded) + len(self.failed)
+
+
+def parse_user_ids(value):
+    """Extract user IDs from a list of raw IDs or mentions"""
+    if not value:
+        return []
+    return list(dict.fromkeys(int(match) for match in re.findall(r"\d{15,20}", value)))
+
+
+class TargetSelection:
+    """Members selected for a bulk action, capped at the per-command limit
+
+    `matched` counts every member that passed the filters, so `truncated`
+    tells callers when some were left out. Absent IDs are confirmed not to
+    be in the guild, and unchecked IDs could not be looked up at all, so
+    callers must not act on either as members.
+    """
+
+    def __init__(self, members, matched, absent, unchecked):
+        self.members = members
+        self.matched = matched
+        self.absent = absent
+        self.unchecked = unchecked
+
+    @property
+    def truncated(self):
+        return self.matched > len(self.members)
+
+
+async def _candidate_members(guild, created_after):
+    """Every member the filters could match, from the cache when the guild is chunked"""
+    if guild.chunked:
+        for member in list(guild.members):
+            yield member
+        return
+    # Member pages come in user ID order and IDs encode account creation
+    # time, so an account-age filter skips the pages of older accounts
+    async for member in guild.fetch_members(limit=None, after=created_after):
+        yield member
+
+
+async def collect_targets(guild, user_ids=None, joined_within=None, account_age=None, limit=config.BULK_ACTION_MAX_TARGETS):
+    """Select members by explicit IDs, join window (minutes) and/or account age (days)
+
+    Explicit IDs are resolved in bulk; the filters alone read the member
+    cache if the guild is chunked and page through the member list over REST
+    otherwise. Returns a TargetSelection of at most `limit` members.
+    """
+    now = discord.utils.utcnow()
+    joined_after = now - timedelta(minutes=joined_within) if joined_within else None
+    created_after = now - timedelta(days=account_age) if account_age else None
+
+    def matches(member):
+        if member.bot:
+            return False
+        if joined_after and (member.joined_at is None or member.joined_at < joined_after):
+            return False
+        if created_after and member.created_at < created_after:
+            return False
+        return True
+
+    absent, unchecked = [], []
+    if user_ids:
+        resolved = await resolve_members(guild, user_ids)
+        # A timed-out member query returns a partial result, so a missing ID
+        # is only treated as absent once the member lookup says so
+        missing = [user_id for user_id in user_ids if user_id not in resolved]
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+        async def confirm(user_id):
+            async with semaphore:
+                try:
+                    resolved[user_id] = await guild.fetch_member(user_id)
+                except discord.NotFound:
+                    absent.append(user_id)
+                except discord.HTTPException:
+                    unchecked.append(user_id)
+
+        await asyncio.gather(*(confirm(user_id) for user_id in missing))
+        members = [member for member in resolved.values() if matches(member)]
+        return TargetSelection(members[:limit], len(members), absent, unchecked)
+
+    # Only the first `limit` matches are kept, but every page is still read
+    # so the caller can report how many were left out
+    members, matched = [], 0
+    async for member in _candidate_members(guild, created_after):
+        if matches(member):
+            matched += 1
+            if len(members) < limit:
+                members.append(member)
+    return TargetSelection(members, matched, absent, unchecked)
+
+
+def add_truncation_field(embed, selection):
+    """Warn in an embed when a selection hit the per-command target limit"""
+    if selection.truncated:
+        embed.add_field(
+            name="⚠️ Target Limit Reached",
+            value=(
+                f"**{selection.matched}** member(s) matched, but only the first "
+                f"**{len(selection.members)}** were included."
+            ),
+            inline=False
+        )
+
+
+async def run_bulk(
+    targets,
+    action,
+    concurrency=config.BULK_ACTION_CONCURRENCY,
+    rate=config.BULK_ACTION_RATE,
+    retries=config.BULK_ACTION_RETRIES,
+    progress=None,
+    progress_interval=config.BULK_ACTION_PROGRESS_INTERVAL
+):
+    """Await `action(target)` for every target with bounded concurrency and pacing
+
+    Server errors are retried with exponential backoff; discord.py already
+    waits out 429s, so those only surface here once its own retries run out.
+    """
+    result = BulkResult(len(targets))
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate)
+    last_report = time.monotonic()
+
+    async def run(target):
+        nonlocal last_report
+        async with semaphore:
+            for attempt in range(retries + 1):
+                await bucket.acquire()
+                try:
+                    await action(target)
+                    result.succeeded.append(target)
+                    break
+                except discord.HTTPException as e:
+                    if (e.status == 429 or e.status >= 500) and attempt < retries:
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    result.failed.append((target, e))
+                    break
+
+        if progress and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            await progress(result)
+
+    await asyncio.gather(*(run(target) for target in targets))
+    if progress:
+        await progress(result)
+    return result
+
+
+def progress_embed(title, result, color=config.EMBED_COLOR_INFO):
+    """Build the embed used to stream bulk progress into one message"""
+    embed = discord.Embed(title=title, color=color)
+    embed.add_field(name="Progress", value=f"{result.done}/{result.total}", inline=True)
+    embed.add_field(name="Succeeded", value=str(len(result.succeeded)), inline=True)
+    embed.add_field(name="Failed", value=str(len(result.failed)), inline=True)
+    return embed
@@ -0,0 +1,122 @@
+# In-process caches shared by the cogs
+
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+import config
+
+# OperationFailure code for change streams on a standalone server
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+class GuildConfigCache:
+    """Bounded LRU cache with a per-entry TTL for guild config documents
+
+    Documents are copied on the way in and out, so a caller that edits the
+    dict it was handed cannot change what other callers read. Once started,
+    entries are also dropped when any process or the site changes a guild's
+    config, by following the guilds collection's change stream; without
+    change streams, other processes' edits show up when the TTL runs out.
+    """
+
+    def __init__(self, max_size=config.GUILD_CACHE_MAX_SIZE, ttl=config.GUILD_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.task = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.remote_invalidations = 0
+
+    def get(self, guild_id):
+        """Return a copy of the cached document, or None if missing or expired"""
+        key = str(guild_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, guild_id, value):
+        """Store a document, evicting the least recently used entry if full"""
+        key = str(guild_id)
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, guild_id):
+        """Drop a guild from the cache"""
+        self._entries.pop(str(guild_id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def start(self, db):
+        self.task = asyncio.create_task(self._watch(db))
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _watch(self, db):
+        while True:
+            try:
+                async with db.guilds.watch(
+                    [{"$project": {"operationType": 1, "fullDocument.guild_id": 1}}],
+                    full_document="updateLookup"
+                ) as stream:
+                    async for change in stream:
+                        guild_id = (change.get("fullDocument") or {}).get("guild_id")
+                        if guild_id is None:
+                            # Deletes only carry the _id, so drop everything
+                            self.clear()
+                        else:
+                            self.invalidate(guild_id)
+                        self.remote_invalidations += 1
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    print("[guild-cache] Change streams unavailable; other processes' edits apply after the TTL")
+                    return
+                self.clear()
+                print(f"[guild-cache] Change stream failed ({e.code}), retrying: {e}")
+                await asyncio.sleep(5)
+            except PyMongoError as e:
+                # Anything changed while disconnected may be stale
+                self.clear()
+                print(f"[guild-cache] Change stream interrupted, retrying: {e}")
+                await asyncio.sleep(5)
+
+    def stats(self):
+        """Return counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "remote_invalidations": self.remote_invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+guild_cache = GuildConfigCache()
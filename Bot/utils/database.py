@@ -1,18 +1,33 @@
 # Database utility functions for the bot
 
+from datetime import datetime, timezone
+
+from pymongo import ReturnDocument, UpdateOne
+
+import config as bot_config
+from .cache import guild_cache
+from .write_buffer import write_buffer
+from .verified_set import verified_set
+from .guild_stats import guild_counters, ACTION_COUNTERS
+
 async def get_guild_config(db, guild_id):
-    """Get guild configuration from database"""
+    """Get guild configuration, reading through the in-process cache"""
+    guild_data = guild_cache.get(guild_id)
+    if guild_data is not None:
+        return guild_data
+
     guild_data = await db.guilds.find_one({"guild_id": str(guild_id)})
     if not guild_data:
-        # Create default config
-        guild_data = {
-            "guild_id": str(guild_id),
-            "warns": {},
-            "settings": {
-                "max_warns": 3
-            }
-        }
-        await db.guilds.insert_one(guild_data)
+        # Create default config; an upsert, since concurrent cache misses
+        # (a join burst on a new guild) would trip the unique guild_id index
+        guild_data = await db.guilds.find_one_and_update(
+            {"guild_id": str(guild_id)},
+            {"$setOnInsert": {"settings": {"max_warns": bot_config.MAX_WARNS_BEFORE_BAN}}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    guild_cache.set(guild_id, guild_data)
     return guild_data
 
 async def save_guild_config(db, guild_id, config):
@@ -22,38 +37,123 @@ async def save_guild_config(db, guild_id, config):
         {"$set": config},
         upsert=True
     )
+    guild_cache.invalidate(guild_id)
 
-async def get_user_warns(db, guild_id, user_id):
-    """Get user warns for a specific guild"""
-    guild_data = await get_guild_config(db, guild_id)
-    return guild_data.get("warns", {}).get(str(user_id), [])
+async def get_warns_page(db, guild_id, user_id, page, per_page):
+    """Get one page of a user's warns and their total count, sliced server-side"""
+    user_warns = await db.warns.find_one(
+        {"guild_id": str(guild_id), "user_id": str(user_id)},
+        {"_id": 0, "count": 1, "warns": {"$slice": [page * per_page, per_page]}}
+    )
+    if not user_warns:
+        return [], 0
+    return user_warns.get("warns", []), user_warns.get("count", 0)
 
 async def add_warn(db, guild_id, user_id, warn_data):
-    """Add a warn to a user"""
-    guild_data = await get_guild_config(db, guild_id)
+    """Add a warn to a user and return their new warn count"""
+    user_warns = await db.warns.find_one_and_update(
+        {"guild_id": str(guild_id), "user_id": str(user_id)},
+        {"$push": {"warns": warn_data}, "$inc": {"count": 1}},
+        projection={"_id": 0, "count": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return user_warns["count"]
 
-    if "warns" not in guild_data:
-        guild_data["warns"] = {}
+async def clear_warns(db, guild_id, user_id):
+    """Clear all warns for a user and return how many were removed"""
+    user_warns = await db.warns.find_one_and_update(
+        {"guild_id": str(guild_id), "user_id": str(user_id), "count": {"$gt": 0}},
+        {"$set": {"warns": [], "count": 0}},
+        projection={"_id": 0, "count": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    return user_warns["count"] if user_warns else 0
 
-    if str(user_id) not in guild_data["warns"]:
-        guild_data["warns"][str(user_id)] = []
+async def expire_warn(db, guild_id, user_id, warn_id):
+    """Remove a single warn by its ID once it has expired"""
+    await db.warns.update_one(
+        {"guild_id": str(guild_id), "user_id": str(user_id), "warns.id": warn_id},
+        {"$pull": {"warns": {"id": warn_id}}, "$inc": {"count": -1}}
+    )
 
-    guild_data["warns"][str(user_id)].append(warn_data)
+async def migrate_embedded_warns(db, batch_size=500):
+    """Move legacy guild-embedded warns maps into the warns collection
 
-    await save_guild_config(db, guild_id, guild_data)
-    return len(guild_data["warns"][str(user_id)])
+    Safe to re-run after a crash: the push that copies a user's legacy warns
+    also sets legacy_migrated and only matches documents without it, so a
+    guild whose warns were copied but not yet unset is not counted twice.
+    """
+    migrated_guilds = 0
+    migrated_warns = 0
+    operations = []
 
-async def clear_warns(db, guild_id, user_id):
-    """Clear all warns for a user"""
+    cursor = db.guilds.find(
+        {"warns": {"$exists": True}},
+        {"_id": 0, "guild_id": 1, "warns": 1},
+        batch_size=batch_size
+    )
+    async for guild_data in cursor:
+        for user_id, warns in (guild_data.get("warns") or {}).items():
+            if not warns:
+                continue
+            query = {"guild_id": guild_data["guild_id"], "user_id": user_id}
+            operations.append(UpdateOne(query, {"$setOnInsert": {"warns": [], "count": 0}}, upsert=True))
+            operations.append(UpdateOne(
+                {**query, "legacy_migrated": {"$ne": True}},
+                {"$push": {"warns": {"$each": warns}}, "$inc": {"count": len(warns)}, "$set": {"legacy_migrated": True}}
+            ))
+            migrated_warns += len(warns)
+
+            # Ordered, so each user's document exists before the guarded push
+            if len(operations) >= batch_size:
+                await db.warns.bulk_write(operations)
+                operations = []
+
+        # Flush before unsetting so a crash never drops a guild's warns
+        if operations:
+            await db.warns.bulk_write(operations)
+            operations = []
+        await db.guilds.update_one(
+            {"guild_id": guild_data["guild_id"]},
+            {"$unset": {"warns": ""}}
+        )
+        guild_cache.invalidate(guild_data["guild_id"])
+        migrated_guilds += 1
+
+    return migrated_guilds, migrated_warns
+
+async def get_verification_enabled_at(db, guild_id, verification):
+    """When verification was enabled in a guild, recording it for older configs
+
+    Configs saved before enabled_at was tracked have none. The guild's first
+    verification is the earliest point verification is known to have been
+    on, or now if there are none yet; the guess is stored so every process
+    and later sweep agrees on it.
+    """
+    if verification.get("enabled_at"):
+        return datetime.fromisoformat(verification["enabled_at"])
+
+    first = await db.verifications.find(
+        {"guild_id": str(guild_id)}, {"_id": 1}
+    ).sort("_id", 1).limit(1).to_list(1)
+    enabled_at = first[0]["_id"].generation_time if first else datetime.now(timezone.utc)
+    await db.guilds.update_one(
+        {"guild_id": str(guild_id), "verification.enabled_at": {"$exists": False}},
+        {"$set": {"verification.enabled_at": enabled_at.isoformat()}}
+    )
+    guild_cache.invalidate(guild_id)
+    # Another process may have recorded it first
     guild_data = await get_guild_config(db, guild_id)
+    return datetime.fromisoformat(guild_data.get("verification", {}).get("enabled_at", enabled_at.isoformat()))
 
-    if "warns" in guild_data and str(user_id) in guild_data["warns"]:
-        warn_count = len(guild_data["warns"][str(user_id)])
-        guild_data["warns"][str(user_id)] = []
-        await save_guild_config(db, guild_id, guild_data)
-        return warn_count
+async def get_bot_state(db, key):
+    """Get a persisted bot state document"""
+    return await db.bot_state.find_one({"_id": key}) or {}
 
-    return 0
+async def save_bot_state(db, key, values):
+    """Persist bot state that must survive restarts"""
+    await db.bot_state.update_one({"_id": key}, {"$set": values}, upsert=True)
 
 async def get_verification_status(db, guild_id, user_id):
     """Check if user is verified in a guild"""
@@ -63,10 +163,53 @@ async def get_verification_status(db, guild_id, user_id):
     })
     return verification is not None
 
+async def get_verified_user_ids(db, guild_id, user_ids):
+    """Return which of the given users have a verification record, in one query"""
+    if not user_ids:
+        return set()
+    cursor = db.verifications.find(
+        {"guild_id": str(guild_id), "user_id": {"$in": [str(user_id) for user_id in user_ids]}},
+        {"_id": 0, "user_id": 1}
+    )
+    return {int(verification["user_id"]) async for verification in cursor}
+
+async def _buffered_insert(db, collection_name, documents):
+    """Queue inserts on the write buffer, or write them directly if it isn't running"""
+    if write_buffer.db is None:
+        await db[collection_name].insert_many(documents, ordered=False)
+        return
+    for document in documents:
+        write_buffer.insert(collection_name, document)
+
 async def save_verification(db, guild_id, user_id, data):
     """Save verification data"""
-    await db.verifications.insert_one({
+    await save_verifications(db, [{
         "guild_id": str(guild_id),
         "user_id": str(user_id),
         **data
-    })
+    }])
+
+async def save_verifications(db, verifications):
+    """Save many verification records, batched through the write buffer
+
+    Records get a verified_at in the site's toISOString format, so the
+    promotion poll's (verified_at, _id) cursor sees manual verifications too.
+    """
+    verified_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    for verification in verifications:
+        verification.setdefault("verified_at", verified_at)
+        verified_set.add(verification["guild_id"], verification["user_id"])
+        guild_counters.incr(verification["guild_id"], "verifications")
+        if verification.get("manual"):
+            guild_counters.incr(verification["guild_id"], "manual_verifications")
+    if verifications:
+        await _buffered_insert(db, "verifications", verifications)
+
+async def save_mod_actions(db, actions):
+    """Record moderation actions in the audit log, batched through the write buffer"""
+    for action in actions:
+        counter = ACTION_COUNTERS.get(action["action"])
+        if counter:
+            guild_counters.incr(action["guild_id"], counter)
+    if actions:
+        await _buffered_insert(db, "mod_actions", actions)
@@ -0,0 +1,278 @@
+# Background outbox for direct messages to members
+#
+# Commands enqueue a notification and move on; one loop per process sends the
+# queue under a global token bucket. Messages are persisted in dm_outbox until
+# sent, so a restart picks up where it stopped, and processes that only
+# enqueue (HTTP interaction replicas) are served by the gateway process's
+# periodic poll.
+
+import asyncio
+import heapq
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+import aiohttp
+import discord
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+import config
+from .metrics import percentile
+from .ratelimit import TokenBucket
+
+# Discord's "Cannot send messages to this user": DMs closed or the bot blocked
+CANNOT_MESSAGE_USER = 50007
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class ExpiringSet:
+    """Keys remembered for `ttl` seconds, oldest dropped past `max_size`"""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expires = OrderedDict()
+
+    def __contains__(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._expires[key]
+            return False
+        return True
+
+    def __len__(self):
+        return len(self._expires)
+
+    def add(self, key):
+        now = time.monotonic()
+        self._expires.pop(key, None)
+        self._expires[key] = now + self.ttl
+        # Entries share one TTL, so insertion order is expiry order
+        while self._expires and (len(self._expires) > self.max_size or next(iter(self._expires.values())) < now):
+            self._expires.popitem(last=False)
+
+
+class DMOutbox:
+    """Paced, deduplicated and persisted delivery of DMs
+
+    A repeat of the same notification to the same user within `dedupe_ttl`
+    seconds is dropped, and users whose DMs turned out to be closed are
+    skipped for `closed_ttl` seconds. Rate limits, server errors and timeouts
+    are retried with exponential backoff up to `max_attempts` times.
+    """
+
+    def __init__(
+        self,
+        rate=config.DM_OUTBOX_RATE,
+        burst=config.DM_OUTBOX_BURST,
+        max_attempts=config.DM_OUTBOX_MAX_ATTEMPTS,
+        dedupe_ttl=config.DM_OUTBOX_DEDUPE_TTL,
+        closed_ttl=config.DM_OUTBOX_CLOSED_TTL,
+        poll_interval=config.DM_OUTBOX_POLL_INTERVAL,
+        batch_size=500
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.recent = ExpiringSet(dedupe_ttl, 100_000)
+        self.closed = ExpiringSet(closed_ttl, 100_000)
+        # DM channel IDs, so repeat recipients skip the channel-open call
+        self.channels = OrderedDict()
+        self.bot = None
+        self.db = None
+        self.shard_filter = None
+        self.heap = []
+        self.queued = set()
+        self.task = None
+        self._wakeup = asyncio.Event()
+
+        self.sent = 0
+        self.deduped = 0
+        self.skipped_closed = 0
+        self.retried = 0
+        self.failed = 0
+        self.sent_at = deque()
+        self.queue_latencies = deque(maxlen=1000)
+
+    def start(self, bot, db, shard_ids=None, shard_count=None):
+        """Attach to the bot and database and start sending this process's share"""
+        self.bot = bot
+        self.db = db
+        if shard_ids is not None:
+            self.shard_filter = {"$or": [{"guild_key": {"$mod": [shard_count, shard_id]}} for shard_id in shard_ids]}
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def enqueue(self, db, guild_id, user_id, kind, content=None, embed=None):
+        """Queue a DM; returns False if it was deduplicated or the user's DMs are closed
+
+        `kind` names the notification, e.g. "manverify"; it is what repeats
+        are matched on.
+        """
+        user_id = int(user_id)
+        if user_id in self.closed:
+            self.skipped_closed += 1
+            return False
+        dedupe_key = f"{user_id}:{guild_id}:{kind}"
+        if dedupe_key in self.recent:
+            self.deduped += 1
+            return False
+
+        document = {
+            "user_id": str(user_id),
+            "guild_id": str(guild_id),
+            "guild_key": int(guild_id) >> 22,
+            "kind": kind,
+            "dedupe_key": dedupe_key,
+            "content": content,
+            "embed": embed.to_dict() if embed else None,
+            "attempts": 0,
+            "created_at": _now(),
+            "due_at": _now()
+        }
+        try:
+            await db.dm_outbox.insert_one(document)
+        except DuplicateKeyError:
+            # Still pending from an earlier enqueue, possibly in another process
+            self.deduped += 1
+            return False
+        self.recent.add(dedupe_key)
+        if self.task:
+            self._push(document)
+            self._wakeup.set()
+        return True
+
+    def _push(self, document):
+        key = str(document["_id"])
+        if key not in self.queued:
+            self.queued.add(key)
+            heapq.heappush(self.heap, (_timestamp(document["due_at"]), key, document))
+
+    async def _refill(self):
+        """Load due messages persisted by a previous run or by other processes"""
+        query = {"due_at": {"$lte": _now()}}
+        if self.shard_filter:
+            query.update(self.shard_filter)
+        documents = await self.db.dm_outbox.find(query).sort("due_at", 1).limit(self.batch_size).to_list(None)
+        for document in documents:
+            self._push(document)
+            self.recent.add(document["dedupe_key"])
+
+    async def _run(self):
+        last_refill = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_refill >= self.poll_interval:
+                    await self._refill()
+                    last_refill = time.monotonic()
+
+                while self.heap and self.heap[0][0] <= time.time():
+                    _, key, message = heapq.heappop(self.heap)
+                    self.queued.discard(key)
+                    await self.bucket.acquire()
+                    await self._deliver(message)
+            except PyMongoError as e:
+                print(f"[dm-outbox] Database error, retrying shortly: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            next_due = self.heap[0][0] if self.heap else time.time() + self.poll_interval
+            timeout = max(0.0, min(next_due - time.time(), last_refill + self.poll_interval - time.monotonic()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _channel(self, user_id):
+        channel_id = self.channels.get(user_id)
+        if channel_id is None:
+            data = await self.bot.http.start_private_message(user_id)
+            channel_id = self.channels[user_id] = int(data["id"])
+            if len(self.channels) > 10_000:
+                self.channels.popitem(last=False)
+        else:
+            self.channels.move_to_end(user_id)
+        return self.bot.get_partial_messageable(channel_id, type=discord.ChannelType.private)
+
+    async def _deliver(self, message):
+        user_id = int(message["user_id"])
+        if user_id in self.closed:
+            self.skipped_closed += 1
+            await self.db.dm_outbox.delete_one({"_id": message["_id"]})
+            return
+
+        embed = discord.Embed.from_dict(message["embed"]) if message.get("embed") else None
+        try:
+            channel = await self._channel(user_id)
+            await channel.send(content=message.get("content"), embed=embed)
+        except discord.Forbidden as e:
+            if e.code == CANNOT_MESSAGE_USER:
+                self.closed.add(user_id)
+                self.skipped_closed += 1
+            else:
+                self.failed += 1
+                print(f"[dm-outbox] Dropping {message['kind']} DM to {user_id}: {e}")
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = getattr(e, "status", None)
+            attempts = message.get("attempts", 0) + 1
+            if (status is not None and status != 429 and status < 500) or attempts >= self.max_attempts:
+                self.failed += 1
+                print(f"[dm-outbox] Giving up on {message['kind']} DM to {user_id}: {e}")
+            else:
+                self.retried += 1
+                due_at = datetime.fromtimestamp(time.time() + 5 * 2 ** attempts, tz=timezone.utc)
+                await self.db.dm_outbox.update_one(
+                    {"_id": message["_id"]},
+                    {"$set": {"due_at": due_at, "attempts": attempts}}
+                )
+                message.update(due_at=due_at, attempts=attempts)
+                self._push(message)
+                return
+        else:
+            self.sent += 1
+            self.sent_at.append(time.monotonic())
+            self._prune_sent_at()
+            self.queue_latencies.append(max(0.0, time.time() - _timestamp(message["created_at"])))
+        await self.db.dm_outbox.delete_one({"_id": message["_id"]})
+
+    def _prune_sent_at(self):
+        cutoff = time.monotonic() - 60
+        while self.sent_at and self.sent_at[0] < cutoff:
+            self.sent_at.popleft()
+
+    def stats(self):
+        self._prune_sent_at()
+        latencies = sorted(self.queue_latencies)
+        return {
+            "backlog": len(self.heap),
+            "sent": self.sent,
+            "sent_per_second": len(self.sent_at) / 60,
+            "deduped": self.deduped,
+            "skipped_closed": self.skipped_closed,
+            "closed_cached": len(self.closed),
+            "retried": self.retried,
+            "failed": self.failed,
+            "queue_latency_p50": percentile(latencies, 0.50),
+            "queue_latency_p99": percentile(latencies, 0.99)
+        }
+
+
+dm_outbox = DMOutbox()
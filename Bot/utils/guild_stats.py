@@ -0,0 +1,278 @@
+# Materialized per-guild counters
+#
+# Stats views used to recount verifications, alts and warns from scratch on
+# every request. Instead, each action adds to a per-guild document in
+# guild_stats and to an hourly bucket in guild_stats_hourly with $inc, so
+# reading a guild's totals is one document and a day of history is 24.
+
+import asyncio
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+import config
+from .metrics import percentile
+
+# bot_state document recording the one-time backfill after deploying counters
+BACKFILL_STATE_KEY = "guild_stats_backfill"
+
+COUNTERS = ("verifications", "manual_verifications", "warns", "kicks", "bans", "alts", "joins")
+
+# Audit-log actions that count towards a counter
+ACTION_COUNTERS = {"warn": "warns", "kick": "kicks", "ban": "bans", "tempban": "bans"}
+
+
+def hour_bucket(at=None):
+    at = at or datetime.now(timezone.utc)
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def _parse_hour(prefix):
+    """The hour of an ISO timestamp's first 13 characters, e.g. "2024-05-01T13\""""
+    return datetime.strptime(prefix, "%Y-%m-%dT%H").replace(tzinfo=timezone.utc)
+
+
+class GuildCounters:
+    """Coalesces counter increments and applies them with one bulk $inc per flush
+
+    A join storm would otherwise cost two Mongo writes per join; here every
+    increment to the same guild (and hour) within `flush_interval` seconds
+    becomes one update. Increments are still atomic $inc on the server, so
+    any number of processes can count into the same documents.
+    """
+
+    def __init__(self, flush_interval=config.GUILD_STATS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.db = None
+        self.totals = {}
+        self.hourly = {}
+        self.task = None
+        self._flush_lock = asyncio.Lock()
+
+        self.increments = 0
+        self.updates = 0
+        self.flush_failures = 0
+        self.flush_latencies = deque(maxlen=1000)
+
+    def incr(self, guild_id, counter, amount=1, at=None):
+        guild_id = str(guild_id)
+        totals = self.totals.get(guild_id)
+        if totals is None:
+            totals = self.totals[guild_id] = Counter()
+        totals[counter] += amount
+        key = (guild_id, hour_bucket(at))
+        hourly = self.hourly.get(key)
+        if hourly is None:
+            hourly = self.hourly[key] = Counter()
+        hourly[counter] += amount
+        self.increments += 1
+
+    def start(self, db):
+        self.db = db
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flush loop and apply everything still pending"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.db is not None:
+            await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            totals, self.totals = self.totals, {}
+            hourly, self.hourly = self.hourly, {}
+            if not totals and not hourly:
+                return
+            started = time.perf_counter()
+            try:
+                if totals:
+                    await self.db.guild_stats.bulk_write([
+                        UpdateOne({"guild_id": guild_id}, {"$inc": dict(counts)}, upsert=True)
+                        for guild_id, counts in totals.items()
+                    ], ordered=False)
+                if hourly:
+                    await self.db.guild_stats_hourly.bulk_write([
+                        UpdateOne({"guild_id": guild_id, "hour": hour}, {"$inc": dict(counts)}, upsert=True)
+                        for (guild_id, hour), counts in hourly.items()
+                    ], ordered=False)
+            except PyMongoError as e:
+                # Put the counts back so they are retried on the next tick; a
+                # partially applied batch can double-count, which beats losing it
+                self.flush_failures += 1
+                print(f"[guild-stats] Failed to flush counters, retrying: {e}")
+                for guild_id, counts in totals.items():
+                    self.totals.setdefault(guild_id, Counter()).update(counts)
+                for key, counts in hourly.items():
+                    self.hourly.setdefault(key, Counter()).update(counts)
+                return
+            self.updates += len(totals) + len(hourly)
+            self.flush_latencies.append(time.perf_counter() - started)
+
+    async def read(self, db, guild_id, hours=24):
+        """A guild's totals and its last `hours` hourly buckets, oldest first
+
+        Includes this process's increments that have not been flushed yet.
+        """
+        guild_id = str(guild_id)
+        since = hour_bucket() - timedelta(hours=hours - 1)
+        document = await db.guild_stats.find_one({"guild_id": guild_id}) or {}
+        totals = Counter({counter: document.get(counter, 0) for counter in COUNTERS})
+        totals.update(self.totals.get(guild_id, {}))
+
+        buckets = {}
+        async for bucket in db.guild_stats_hourly.find({"guild_id": guild_id, "hour": {"$gte": since}}):
+            hour = bucket["hour"]
+            if hour.tzinfo is None:
+                hour = hour.replace(tzinfo=timezone.utc)
+            buckets[hour] = Counter({counter: bucket.get(counter, 0) for counter in COUNTERS})
+        for (pending_guild_id, hour), counts in self.hourly.items():
+            if pending_guild_id == guild_id and hour >= since:
+                buckets.setdefault(hour, Counter()).update(counts)
+
+        series = []
+        for offset in range(hours):
+            hour = since + timedelta(hours=offset)
+            series.append((hour, buckets.get(hour, Counter())))
+        return {"totals": totals, "hourly": series, "backfilled_at": document.get("backfilled_at")}
+
+    def stats(self):
+        latencies = sorted(self.flush_latencies)
+        return {
+            "pending_guilds": len(self.totals),
+            "pending_buckets": len(self.hourly),
+            "increments": self.increments,
+            "updates": self.updates,
+            "flush_failures": self.flush_failures,
+            "flush_latency_p50": percentile(latencies, 0.50),
+            "flush_latency_p99": percentile(latencies, 0.99)
+        }
+
+
+guild_counters = GuildCounters()
+
+
+async def _count_by_guild(collection, match, hour_field, unwind=None):
+    """{guild ID: (total, {hour: count})} from ISO timestamp strings in `hour_field`
+
+    With `unwind`, each element of that array field counts once.
+    """
+    counts = {}
+    pipeline = [{"$match": match}]
+    if unwind:
+        pipeline.append({"$unwind": unwind})
+    pipeline += [
+        {"$group": {
+            "_id": {"guild_id": "$guild_id", "hour": {"$substrBytes": [{"$ifNull": [hour_field, ""]}, 0, 13]}},
+            "count": {"$sum": 1}
+        }}
+    ]
+    async for row in collection.aggregate(pipeline, allowDiskUse=True):
+        entry = counts.setdefault(row["_id"]["guild_id"], [0, Counter()])
+        entry[0] += row["count"]
+        try:
+            entry[1][_parse_hour(row["_id"]["hour"])] += row["count"]
+        except ValueError:
+            # Records without a usable timestamp count towards the total only
+            pass
+    return counts
+
+
+async def backfill_guild_stats(db):
+    """Recompute every guild's counters from the existing collections
+
+    Overwrites guild_stats and the backfilled hourly buckets, so increments
+    made while it runs may be lost; run it once after deploying, or when the
+    counters are known to have drifted. Joins are not recorded anywhere else
+    and keep their current values. Returns the number of guilds written.
+
+    Warns predate the mod_actions audit log, so they are counted from the
+    warns collection and any legacy guild-embedded maps instead: every warn
+    still on record, which is what the site showed before the counters.
+    Expired and cleared warns are gone and cannot be counted.
+    """
+    await guild_counters.flush()
+    sources = {
+        "verifications": await _count_by_guild(db.verifications, {}, {"$ifNull": ["$verified_at", "$timestamp"]}),
+        "manual_verifications": await _count_by_guild(db.verifications, {"manual": True}, "$timestamp"),
+        "alts": await _count_by_guild(db.alt_accounts, {}, "$detected_at"),
+        "warns": await _count_by_guild(db.warns, {"count": {"$gt": 0}}, "$warns.timestamp", unwind="$warns")
+    }
+    async for guild_data in db.guilds.find({"warns": {"$exists": True}}, {"_id": 0, "guild_id": 1, "warns": 1}):
+        legacy = sources["warns"].setdefault(guild_data["guild_id"], [0, Counter()])
+        for warns in (guild_data.get("warns") or {}).values():
+            legacy[0] += len(warns)
+            for warn in warns:
+                try:
+                    legacy[1][_parse_hour(warn.get("timestamp", "")[:13])] += 1
+                except ValueError:
+                    pass
+    for action, counter in ACTION_COUNTERS.items():
+        if counter == "warns":
+            continue
+        for guild_id, (total, hours) in (await _count_by_guild(db.mod_actions, {"action": action}, "$timestamp")).items():
+            merged = sources.setdefault(counter, {}).setdefault(guild_id, [0, Counter()])
+            merged[0] += total
+            merged[1].update(hours)
+
+    guild_ids = {guild_id for counts in sources.values() for guild_id in counts}
+    backfilled_at = datetime.now(timezone.utc)
+    totals, hourly = [], {}
+    for guild_id in guild_ids:
+        values = {counter: counts.get(guild_id, (0, None))[0] for counter, counts in sources.items()}
+        totals.append(UpdateOne(
+            {"guild_id": guild_id},
+            {"$set": {**values, "backfilled_at": backfilled_at}},
+            upsert=True
+        ))
+        for counter, counts in sources.items():
+            for hour, count in counts.get(guild_id, (0, {}))[1].items():
+                hourly.setdefault((guild_id, hour), {})[counter] = count
+
+    for start in range(0, len(totals), 1000):
+        await db.guild_stats.bulk_write(totals[start:start + 1000], ordered=False)
+    hourly_updates = [
+        UpdateOne({"guild_id": guild_id, "hour": hour}, {"$set": values}, upsert=True)
+        for (guild_id, hour), values in hourly.items()
+    ]
+    for start in range(0, len(hourly_updates), 1000):
+        await db.guild_stats_hourly.bulk_write(hourly_updates[start:start + 1000], ordered=False)
+    return len(guild_ids)
+
+
+async def ensure_guild_stats_backfilled(db):
+    """Run the backfill once per deployment, claimed through bot_state
+
+    Counters only start at zero when they are first deployed, so the first
+    process to get here recomputes them from the existing collections. The
+    claim is an insert on a fixed _id, so concurrent processes skip it; a
+    failed run releases the claim and is retried on the next start.
+    """
+    try:
+        await db.bot_state.insert_one({"_id": BACKFILL_STATE_KEY, "started_at": datetime.now(timezone.utc).isoformat()})
+    except DuplicateKeyError:
+        # Another process holds the claim, or the backfill already ran
+        return
+
+    print("[guild-stats] Backfilling counters from existing records")
+    try:
+        guilds = await backfill_guild_stats(db)
+    except PyMongoError as e:
+        print(f"[guild-stats] Backfill failed, will retry on the next start: {e}")
+        await db.bot_state.delete_one({"_id": BACKFILL_STATE_KEY})
+        return
+    await db.bot_state.update_one(
+        {"_id": BACKFILL_STATE_KEY},
+        {"$set": {"completed_at": datetime.now(timezone.utc).isoformat(), "guilds": guilds}}
+    )
+    print(f"[guild-stats] Backfilled counters for {guilds} guild(s)")
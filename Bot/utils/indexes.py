@@ -0,0 +1,159 @@
+# Index declarations and query-shape audit for the bot's collections
+
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+import config
+
+# Every index the bot and the website rely on, keyed by collection
+INDEXES = {
+    "guilds": [
+        IndexModel([("guild_id", ASCENDING)], name="guild_id_unique", unique=True),
+        IndexModel([("verification.rollout_pending", ASCENDING)], name="rollout_pending", sparse=True)
+    ],
+    "warns": [
+        IndexModel([("guild_id", ASCENDING), ("user_id", ASCENDING)], name="guild_user_unique", unique=True)
+    ],
+    "verifications": [
+        IndexModel([("guild_id", ASCENDING), ("user_id", ASCENDING)], name="guild_user"),
+        IndexModel([("guild_id", ASCENDING), ("client_info.ip", ASCENDING)], name="guild_ip"),
+        IndexModel([("verified_at", ASCENDING), ("_id", ASCENDING)], name="verified_at_id")
+    ],
+    "mod_actions": [
+        IndexModel([("guild_id", ASCENDING), ("timestamp", ASCENDING)], name="guild_timestamp")
+    ],
+    "alt_accounts": [
+        IndexModel([("guild_id", ASCENDING), ("main_account", ASCENDING)], name="guild_main_account")
+    ],
+    "scheduled_actions": [
+        IndexModel([("due_at", ASCENDING)], name="due_at"),
+        IndexModel([("guild_id", ASCENDING), ("user_id", ASCENDING), ("action", ASCENDING)], name="guild_user_action")
+    ],
+    "dm_outbox": [
+        IndexModel([("due_at", ASCENDING)], name="due_at"),
+        IndexModel([("dedupe_key", ASCENDING)], name="dedupe_key_unique", unique=True)
+    ],
+    "guild_stats": [
+        IndexModel([("guild_id", ASCENDING)], name="guild_id_unique", unique=True)
+    ],
+    "guild_stats_hourly": [
+        IndexModel([("guild_id", ASCENDING), ("hour", ASCENDING)], name="guild_hour_unique", unique=True),
+        IndexModel(
+            [("hour", ASCENDING)],
+            name="hour_ttl",
+            expireAfterSeconds=config.GUILD_STATS_HOURLY_RETENTION_DAYS * 86400
+        )
+    ]
+}
+
+# Representative filters for every query the bot and site issue, used by the explain audit
+QUERY_SHAPES = [
+    ("guilds", {"guild_id": "0"}, None),
+    ("guilds", {"guild_id": {"$in": ["0"]}, "verification.rollout_pending": True}, None),
+    ("warns", {"guild_id": "0", "user_id": "0"}, None),
+    ("verifications", {"guild_id": "0", "user_id": "0"}, None),
+    ("verifications", {"guild_id": "0", "user_id": {"$in": ["0"]}}, None),
+    ("verifications", {"guild_id": "0", "client_info.ip": "0.0.0.0"}, None),
+    ("verifications", {"verified_at": {"$gt": ""}}, [("verified_at", 1), ("_id", 1)]),
+    ("alt_accounts", {"guild_id": "0"}, None),
+    ("bot_state", {"_id": "0"}, None),
+    ("scheduled_actions", {"due_at": {"$lt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("due_at", 1)]),
+    ("scheduled_actions", {"guild_id": "0", "user_id": "0", "action": "unban"}, None),
+    ("scheduled_actions", {"guild_id": "0", "user_id": {"$in": ["0"]}, "action": "unban"}, None),
+    ("dm_outbox", {"due_at": {"$lte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("due_at", 1)]),
+    ("guild_stats", {"guild_id": "0"}, None),
+    ("guild_stats_hourly", {"guild_id": "0", "hour": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, None)
+]
+
+# Index options that change what the index holds or how long documents live
+_INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression")
+
+def _same_keys_and_options(existing, model):
+    spec = model.document
+    return list(existing["key"]) == list(spec["key"].items()) and all(
+        existing.get(option, False) == spec.get(option, False) for option in _INDEX_OPTIONS
+    )
+
+def _index_matches(existing, model):
+    return (
+        _same_keys_and_options(existing, model)
+        and existing.get("expireAfterSeconds") == model.document.get("expireAfterSeconds")
+    )
+
+async def ensure_indexes(db):
+    """Create missing indexes and rebuild any whose definition changed
+
+    An existing index with the same keys and options counts as present even
+    under a different name, so indexes created by older versions are kept.
+    A TTL index whose only change is its expiry is updated in place with
+    collMod rather than rebuilt.
+    """
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        missing = []
+        for model in models:
+            name = model.document["name"]
+            if any(_index_matches(info, model) for info in existing.values()):
+                continue
+
+            ttl = model.document.get("expireAfterSeconds")
+            retimed = next((
+                existing_name for existing_name, info in existing.items()
+                if ttl is not None and "expireAfterSeconds" in info and _same_keys_and_options(info, model)
+            ), None)
+            if retimed is not None:
+                print(f"[indexes] Changing {collection_name}.{retimed} expiry to {ttl}s")
+                try:
+                    await db.command("collMod", collection_name, index={"name": retimed, "expireAfterSeconds": ttl})
+                    continue
+                except OperationFailure as e:
+                    print(f"[indexes] collMod on {collection_name}.{retimed} failed, rebuilding: {e}")
+
+            # Same keys with other options would conflict with the new index
+            stale = {name} if name in existing else set()
+            stale.update(
+                existing_name for existing_name, info in existing.items()
+                if existing_name != "_id_" and list(info["key"]) == list(model.document["key"].items())
+            )
+            for stale_name in stale:
+                print(f"[indexes] Rebuilding {collection_name}.{stale_name} with a new definition")
+                await collection.drop_index(stale_name)
+            missing.append(model)
+
+        for model in missing:
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                # Usually duplicate keys blocking a unique index; the bot still works without it
+                print(f"[indexes] Could not create {collection_name}.{model.document['name']}: {e}")
+
+def find_collscans(plan):
+    """Return the names of COLLSCAN stages in an explain() winning plan"""
+    stages = []
+    if plan.get("stage") == "COLLSCAN":
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(find_collscans(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(find_collscans(child))
+    return stages
+
+async def audit_query_shapes(db, shapes=QUERY_SHAPES):
+    """Run explain() on each known query shape and report collection scans"""
+    report = []
+    for collection_name, query, sort in shapes:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        collscan = bool(find_collscans(winning_plan))
+        report.append({"collection": collection_name, "query": query, "sort": sort, "collscan": collscan})
+        if collscan:
+            print(f"[indexes] COLLSCAN on {collection_name}: {query} sort={sort}")
+    return report
@@ -0,0 +1,291 @@
+# HTTP interactions endpoint
+#
+# With an Interactions Endpoint URL set in the developer portal, Discord POSTs
+# every interaction to that URL instead of sending it over the gateway. Each
+# request is verified against the application's Ed25519 public key and fed to
+# the same ConnectionState parser the gateway uses, so the cogs' commands and
+# views run unchanged. The first response a command makes is returned as the
+# HTTP response body; anything after that (edits, follow-ups) goes over REST
+# as usual. Nothing here depends on state from earlier requests, so any number
+# of replicas can sit behind a load balancer.
+
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+
+import discord
+from aiohttp import web
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+
+import config
+from .metrics import percentile
+
+PING = 1
+APPLICATION_COMMAND = 2
+MESSAGE_COMPONENT = 3
+
+PONG = 1
+CHANNEL_MESSAGE = 4
+DEFERRED_CHANNEL_MESSAGE = 5
+DEFERRED_UPDATE_MESSAGE = 6
+UPDATE_MESSAGE = 7
+
+EPHEMERAL = 64
+
+
+def verify_signature(verify_key, signature, timestamp, body):
+    """Check Discord's X-Signature-Ed25519 over the timestamp and raw body"""
+    try:
+        verify_key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+    except (BadSignatureError, ValueError):
+        return False
+    return True
+
+
+class InteractionResponseAdapter(AsyncWebhookAdapter):
+    """Webhook adapter for one HTTP interaction
+
+    The first interaction callback resolves `response` instead of calling the
+    callback endpoint. Later REST calls wait until the HTTP response has been
+    written, so an edit or follow-up never reaches Discord before the
+    acknowledgement it depends on.
+    """
+
+    def __init__(self, application_id, token, ack_timeout):
+        super().__init__()
+        self.application_id = application_id
+        self.token = token
+        self.ack_timeout = ack_timeout
+        self.response = asyncio.get_running_loop().create_future()
+        self.sent = asyncio.Event()
+        self.deferred = False
+
+    def defer(self, interaction_type):
+        """Acknowledge on the command's behalf when it misses the deadline
+
+        The deferral is ephemeral because it is not known yet whether the
+        eventual reply was meant to be, and leaking a private reply is worse
+        than hiding a public one.
+        """
+        self.deferred = True
+        if interaction_type == MESSAGE_COMPONENT:
+            payload = {"type": DEFERRED_UPDATE_MESSAGE}
+        else:
+            payload = {"type": DEFERRED_CHANNEL_MESSAGE, "data": {"flags": EPHEMERAL}}
+        self.response.set_result(payload)
+        return payload
+
+    async def wait_sent(self):
+        try:
+            await asyncio.wait_for(self.sent.wait(), timeout=self.ack_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def create_interaction_response(self, interaction_id, token, *, session, proxy=None, proxy_auth=None, params):
+        if not self.response.done():
+            if params.files:
+                # Attachments need a multipart body; send those over the
+                # callback endpoint and let the HTTP request end empty
+                await super().create_interaction_response(
+                    interaction_id, token, session=session, proxy=proxy, proxy_auth=proxy_auth, params=params
+                )
+                self.response.set_result(None)
+                return
+            self.response.set_result(params.payload)
+            await self.wait_sent()
+            return
+
+        if self.deferred and not params.files:
+            # The deadline passed and a deferral went out instead, so the
+            # reply becomes an edit of the deferred response
+            await self.wait_sent()
+            payload = params.payload
+            if payload["type"] in (CHANNEL_MESSAGE, UPDATE_MESSAGE):
+                await self.edit_original_interaction_response(
+                    self.application_id,
+                    self.token,
+                    session=session,
+                    proxy=proxy,
+                    proxy_auth=proxy_auth,
+                    payload=payload.get("data")
+                )
+            return
+
+        await self.wait_sent()
+        await super().create_interaction_response(
+            interaction_id, token, session=session, proxy=proxy, proxy_auth=proxy_auth, params=params
+        )
+
+
+class GuildSnapshots:
+    """Guilds rebuilt over REST for a process with no gateway connection
+
+    Commands read roles, channels and the bot's own member from the guild, so
+    each guild is fetched once per `ttl` and installed in the connection state
+    where `Interaction.guild` looks it up. The least recently used guilds are
+    dropped past `max_size`.
+    """
+
+    def __init__(self, bot, ttl=config.INTERACTIONS_GUILD_TTL, max_size=config.INTERACTIONS_GUILD_CACHE_SIZE):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expires = OrderedDict()
+        self._pending = {}
+
+        self.hits = 0
+        self.fetches = 0
+
+    async def get(self, guild_id):
+        state = self.bot._connection
+        expires_at = self._expires.get(guild_id)
+        if expires_at is not None and expires_at > time.monotonic():
+            self._expires.move_to_end(guild_id)
+            self.hits += 1
+            return state._get_guild(guild_id)
+
+        # Concurrent interactions from one guild share a single fetch
+        task = self._pending.get(guild_id)
+        if task is None:
+            task = self._pending[guild_id] = asyncio.create_task(self._fetch(guild_id))
+            task.add_done_callback(lambda _: self._pending.pop(guild_id, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, guild_id):
+        state = self.bot._connection
+        http = self.bot.http
+        data, channels, me = await asyncio.gather(
+            http.get_guild(guild_id, with_counts=False),
+            http.get_all_guild_channels(guild_id),
+            http.get_member(guild_id, state.self_id)
+        )
+        data["channels"] = channels
+        data["members"] = [me]
+        guild = discord.Guild(data=data, state=state)
+        state._add_guild(guild)
+        self.fetches += 1
+
+        self._expires[guild_id] = time.monotonic() + self.ttl
+        self._expires.move_to_end(guild_id)
+        while len(self._expires) > self.max_size:
+            evicted, _ = self._expires.popitem(last=False)
+            stale = state._get_guild(evicted)
+            if stale is not None:
+                state._remove_guild(stale)
+        return guild
+
+    def stats(self):
+        return {"guilds_cached": len(self._expires), "guild_hits": self.hits, "guild_fetches": self.fetches}
+
+
+class InteractionServer:
+    """Serves POST /interactions for a logged-in bot that has not connected to the gateway"""
+
+    def __init__(
+        self,
+        bot,
+        public_key=config.INTERACTIONS_PUBLIC_KEY,
+        ack_timeout=config.INTERACTIONS_ACK_TIMEOUT,
+        max_skew=config.INTERACTIONS_MAX_SKEW
+    ):
+        if not public_key:
+            raise RuntimeError("INTERACTIONS_PUBLIC_KEY must be set to serve interactions over HTTP")
+        self.bot = bot
+        self.verify_key = VerifyKey(bytes.fromhex(public_key))
+        self.ack_timeout = ack_timeout
+        self.max_skew = max_skew
+        self.guilds = GuildSnapshots(bot)
+        self.runner = None
+
+        self.received = 0
+        self.rejected = 0
+        self.deferred = 0
+        self.latencies = deque(maxlen=1000)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/interactions", self.handle)
+        return app
+
+    async def start(self, host=config.INTERACTIONS_HOST, port=config.INTERACTIONS_PORT):
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        return self.runner
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def authentic(self, request, body):
+        signature = request.headers.get("X-Signature-Ed25519")
+        timestamp = request.headers.get("X-Signature-Timestamp")
+        if not signature or not timestamp:
+            return False
+        # A captured request replayed later would run its command again
+        try:
+            if abs(time.time() - int(timestamp)) > self.max_skew:
+                return False
+        except ValueError:
+            return False
+        return verify_signature(self.verify_key, signature, timestamp, body)
+
+    async def handle(self, request):
+        started = time.perf_counter()
+        body = await request.read()
+        if not self.authentic(request, body):
+            self.rejected += 1
+            return web.Response(status=401, text="invalid request signature")
+
+        data = json.loads(body)
+        if data["type"] == PING:
+            return web.json_response({"type": PONG})
+        self.received += 1
+
+        if "guild_id" in data:
+            try:
+                await self.guilds.get(int(data["guild_id"]))
+            except discord.HTTPException as e:
+                # The interaction still carries the member and its permissions
+                print(f"[interactions] Could not load guild {data['guild_id']}: {e}")
+
+        adapter = InteractionResponseAdapter(int(data["application_id"]), data["token"], self.ack_timeout)
+        # The command task copies the context when it is created, so its
+        # interaction responses go through this request's adapter
+        context_token = async_context.set(adapter)
+        try:
+            self.bot._connection.parse_interaction_create(data)
+        finally:
+            async_context.reset(context_token)
+
+        remaining = max(0.0, self.ack_timeout - (time.perf_counter() - started))
+        try:
+            payload = await asyncio.wait_for(asyncio.shield(adapter.response), timeout=remaining)
+        except asyncio.TimeoutError:
+            payload = adapter.defer(data["type"])
+            self.deferred += 1
+
+        if payload is None:
+            response = web.Response(status=202)
+        else:
+            response = web.json_response(payload)
+        await response.prepare(request)
+        await response.write_eof()
+        adapter.sent.set()
+        self.latencies.append(time.perf_counter() - started)
+        return response
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "deferred": self.deferred,
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p99": percentile(latencies, 0.99),
+            **self.guilds.stats()
+        }
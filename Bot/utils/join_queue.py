@@ -0,0 +1,173 @@
+# Background pipeline that paces Unverified role assignment on member join
+
+import asyncio
+import time
+from collections import deque
+
+import discord
+
+import config
+from .metrics import percentile
+from .ratelimit import TokenBucket
+
+
+class GuildJoinQueue:
+    """Pending joins and pacing state for a single guild"""
+
+    def __init__(self, guild_id, rate, burst):
+        self.guild_id = guild_id
+        self.queue = asyncio.Queue()
+        self.pending = set()
+        self.workers = set()
+        self.bucket = TokenBucket(rate, burst)
+        self.join_times = deque()
+        self.raid_until = 0.0
+
+
+class JoinPipeline:
+    """Per-guild join queues drained by a bounded worker pool"""
+
+    def __init__(
+        self,
+        workers=config.JOIN_QUEUE_WORKERS,
+        rate=config.JOIN_ROLE_RATE,
+        burst=config.JOIN_ROLE_BURST,
+        raid_threshold=config.RAID_JOIN_THRESHOLD,
+        raid_rate=config.RAID_ROLE_RATE,
+        raid_cooldown=config.RAID_COOLDOWN
+    ):
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.raid_threshold = raid_threshold
+        self.raid_rate = raid_rate
+        self.raid_cooldown = raid_cooldown
+        self.guilds = {}
+
+        self.submitted = 0
+        self.duplicates = 0
+        self.assigned = 0
+        self.skipped = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=1000)
+
+    def _get_guild(self, guild_id):
+        guild_queue = self.guilds.get(guild_id)
+        if guild_queue is None:
+            guild_queue = GuildJoinQueue(guild_id, self.rate, self.burst)
+            self.guilds[guild_id] = guild_queue
+        return guild_queue
+
+    def _record_join(self, guild_queue):
+        """Track the join rate and flip the guild into raid mode if it spikes"""
+        now = time.monotonic()
+        join_times = guild_queue.join_times
+        join_times.append(now)
+        while join_times and join_times[0] < now - 1:
+            join_times.popleft()
+
+        if len(join_times) >= self.raid_threshold:
+            if guild_queue.raid_until < now:
+                print(f"[join-queue] Raid mode enabled for guild {guild_queue.guild_id}")
+            guild_queue.raid_until = now + self.raid_cooldown
+            guild_queue.bucket.set_rate(self.raid_rate)
+        else:
+            self._expire_raid_mode(guild_queue, now)
+
+    def _expire_raid_mode(self, guild_queue, now):
+        if guild_queue.raid_until and guild_queue.raid_until < now:
+            guild_queue.raid_until = 0.0
+            guild_queue.bucket.set_rate(self.rate)
+            print(f"[join-queue] Raid mode disabled for guild {guild_queue.guild_id}")
+
+    def is_raid_mode(self, guild_id):
+        guild_queue = self.guilds.get(guild_id)
+        return guild_queue is not None and guild_queue.raid_until >= time.monotonic()
+
+    def submit(self, member, role):
+        """Queue a role assignment; returns False for a duplicate join event"""
+        guild_queue = self._get_guild(member.guild.id)
+        self._record_join(guild_queue)
+
+        if member.id in guild_queue.pending:
+            self.duplicates += 1
+            return False
+
+        guild_queue.pending.add(member.id)
+        guild_queue.queue.put_nowait((member, role, time.monotonic()))
+        self.submitted += 1
+
+        # A worker that has returned stays in the set until its done callback
+        # runs, so only count the ones still running
+        live = sum(1 for task in guild_queue.workers if not task.done())
+        for _ in range(min(self.workers, guild_queue.queue.qsize()) - live):
+            task = asyncio.create_task(self._worker(guild_queue))
+            guild_queue.workers.add(task)
+            task.add_done_callback(guild_queue.workers.discard)
+        return True
+
+    async def _worker(self, guild_queue):
+        while not guild_queue.queue.empty():
+            member, role, queued_at = guild_queue.queue.get_nowait()
+            try:
+                # Members that left or already hold the role cost nothing,
+                # not even a token another join could have used
+                if member.id not in guild_queue.pending or role in member.roles:
+                    self.skipped += 1
+                    continue
+
+                self._expire_raid_mode(guild_queue, time.monotonic())
+                await guild_queue.bucket.acquire()
+
+                # The wait for a token can be long in raid mode
+                if member.id not in guild_queue.pending:
+                    self.skipped += 1
+                    continue
+
+                await member.add_roles(role, reason="Verification system - new member")
+                self.assigned += 1
+                self.latencies.append(time.monotonic() - queued_at)
+            except discord.HTTPException as e:
+                self.failed += 1
+                print(f"[join-queue] Failed to assign role in guild {guild_queue.guild_id}: {e}")
+            finally:
+                guild_queue.pending.discard(member.id)
+                guild_queue.queue.task_done()
+
+        current = asyncio.current_task()
+        if guild_queue.queue.empty() and all(task is current or task.done() for task in guild_queue.workers):
+            if guild_queue.raid_until < time.monotonic():
+                self.guilds.pop(guild_queue.guild_id, None)
+
+    def forget(self, guild_id, user_id):
+        """Drop a queued assignment for a member who left before it ran"""
+        guild_queue = self.guilds.get(guild_id)
+        if guild_queue is not None:
+            guild_queue.pending.discard(user_id)
+
+    def queue_depth(self):
+        return sum(guild_queue.queue.qsize() for guild_queue in self.guilds.values())
+
+    def stats(self):
+        """Return queue depth, throughput and assignment latency metrics"""
+        latencies = sorted(self.latencies)
+        return {
+            "queue_depth": self.queue_depth(),
+            "active_guilds": len(self.guilds),
+            "raid_guilds": sum(1 for guild_id in self.guilds if self.is_raid_mode(guild_id)),
+            "submitted": self.submitted,
+            "duplicates": self.duplicates,
+            "assigned": self.assigned,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p99": percentile(latencies, 0.99)
+        }
+
+    async def close(self):
+        """Cancel all workers"""
+        tasks = [task for guild_queue in self.guilds.values() for task in guild_queue.workers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.guilds.clear()
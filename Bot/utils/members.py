@@ -0,0 +1,56 @@
+# On-demand member resolution for bots that do not cache members
+
+import asyncio
+
+import discord
+
+import config
+
+# Discord accepts at most 100 user IDs per gateway member request
+QUERY_LIMIT = 100
+# Parallel REST lookups when there is no gateway to ask
+FETCH_CONCURRENCY = 10
+
+
+async def _fetch_members(guild, user_ids):
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def fetch(user_id):
+        async with semaphore:
+            try:
+                return await guild.fetch_member(user_id)
+            except discord.NotFound:
+                return None
+
+    return [member for member in await asyncio.gather(*(fetch(user_id) for user_id in user_ids)) if member]
+
+
+async def resolve_members(guild, user_ids):
+    """Resolve user IDs to members with one gateway request per 100 uncached IDs
+
+    Returns a dict of user ID to Member; users no longer in the guild are
+    left out. HTTP interaction replicas have no gateway and fetch each
+    member over REST instead.
+    """
+    members = {}
+    missing = []
+    for user_id in {int(user_id) for user_id in user_ids}:
+        member = guild.get_member(user_id)
+        if member is not None:
+            members[user_id] = member
+        else:
+            missing.append(user_id)
+
+    if config.RUNTIME_MODE == "http":
+        members.update((member.id, member) for member in await _fetch_members(guild, missing))
+        return members
+
+    for start in range(0, len(missing), QUERY_LIMIT):
+        try:
+            found = await guild.query_members(user_ids=missing[start:start + QUERY_LIMIT], cache=False)
+        except (discord.ClientException, asyncio.TimeoutError) as e:
+            print(f"[members] Failed to resolve members in guild {guild.id}: {e}")
+            break
+        members.update((member.id, member) for member in found)
+
+    return members
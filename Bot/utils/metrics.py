@@ -0,0 +1,262 @@
+# In-process metrics with a Prometheus text endpoint
+
+import asyncio
+import bisect
+import contextvars
+import logging
+import threading
+import time
+import weakref
+
+from aiohttp import web
+from discord import app_commands
+from pymongo import monitoring
+
+import config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Per-interaction breakdown of where time went; a mutable dict so callbacks
+# running in a copied context still add to the same interaction's totals
+stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+# What each task is working on, for the watchdog and profiler to report
+_task_labels = weakref.WeakKeyDictionary()
+
+
+def label_task(label, task=None):
+    """Attribute a task's time to `label`, e.g. "/warn (Moderation)\""""
+    task = task or asyncio.current_task()
+    if task is not None:
+        _task_labels[task] = label
+
+
+def task_label(task):
+    if task is None:
+        return None
+    return _task_labels.get(task) or task.get_name()
+
+
+def percentile(values, p):
+    """Return the p-quantile of a sorted sequence, or 0.0 if empty"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def _format_labels(labelnames, labels):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(labelnames, labels))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        if self.registry.enabled:
+            with self.registry.lock:
+                self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.registry.lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.values.items()]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else bound
+                bucket_labels = _format_labels(self.labelnames + ("le",), labels + (le,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    """Holds every metric; recording is a no-op until the endpoint is enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        # Mongo command events arrive on Motor's executor threads, so
+        # updates and scrapes of the same series are serialised
+        self.lock = threading.Lock()
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(self, name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self, name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, prefix, collect):
+        """Expose a component's stats() dict as gauges, read at scrape time"""
+        self.collectors.append((prefix, collect))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for prefix, collect in self.collectors:
+            for key, value in collect().items():
+                if isinstance(value, dict):
+                    for sub_key, sub_value in value.items():
+                        if isinstance(sub_value, (int, float)) and not isinstance(sub_value, bool):
+                            lines.append(f'{prefix}_{sub_key}{{key="{key}"}} {sub_value}')
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Registry()
+
+command_latency = metrics.histogram(
+    "bot_command_seconds", "App command latency by stage", ("command", "stage")
+)
+command_errors = metrics.counter("bot_command_errors_total", "App commands that raised", ("command",))
+mongo_latency = metrics.histogram(
+    "bot_mongo_seconds", "MongoDB command latency", ("collection", "operation")
+)
+mongo_failures = metrics.counter("bot_mongo_failures_total", "Failed MongoDB commands", ("collection", "operation"))
+rest_latency = metrics.histogram("bot_rest_seconds", "Discord REST request latency", ("method", "route"))
+rate_limits = metrics.counter("bot_rate_limits_total", "Discord rate limits hit", ("scope",))
+gateway_events = metrics.counter("bot_gateway_events_total", "Gateway events received", ("event",))
+
+
+def add_stage_time(stage, seconds):
+    timings = stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Times every Mongo command by collection and operation"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        seconds = event.duration_micros / 1_000_000
+        mongo_latency.observe(seconds, collection, event.command_name)
+        with metrics.lock:
+            add_stage_time("db", seconds)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        mongo_failures.inc(collection, event.command_name)
+
+
+class RateLimitLogHandler(logging.Handler):
+    """Counts discord.py's rate-limit log records without touching its internals"""
+
+    def emit(self, record):
+        message = record.getMessage().lower()
+        if "rate limit" in message:
+            rate_limits.inc("global" if "global" in message else "route")
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Command tree that stamps each interaction so its latency can be recorded"""
+
+    async def interaction_check(self, interaction):
+        stage_timings.set({"started": time.perf_counter()})
+        command = interaction.command
+        if command is not None:
+            cog = type(command.binding).__name__ if command.binding is not None else "tree"
+            label_task(f"/{command.qualified_name} ({cog})")
+        return True
+
+    async def on_error(self, interaction, error):
+        command = interaction.command
+        record_command(command.qualified_name if command else "unknown", failed=True)
+        await super().on_error(interaction, error)
+
+
+def record_command(command_name, failed=False):
+    """Record total, ack, DB and REST time for the interaction in progress"""
+    timings = stage_timings.get()
+    if timings is None:
+        return
+    command_latency.observe(time.perf_counter() - timings["started"], command_name, "total")
+    for stage in ("ack", "db", "rest"):
+        if stage in timings:
+            command_latency.observe(timings[stage], command_name, stage)
+    if failed:
+        command_errors.inc(command_name)
+
+
+def instrument_http(http):
+    """Wrap the client's HTTP request method to time REST calls"""
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            rest_latency.observe(seconds, route.method, route.path)
+            add_stage_time("rest", seconds)
+            timings = stage_timings.get()
+            if timings is not None and "ack" not in timings and route.path.endswith("/callback"):
+                timings["ack"] = time.perf_counter() - timings["started"]
+
+    http.request = timed_request
+
+
+async def start_metrics_server(host=config.METRICS_HOST, port=config.METRICS_PORT):
+    """Serve /metrics in Prometheus text format"""
+    async def handle(request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
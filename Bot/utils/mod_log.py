@@ -0,0 +1,183 @@
+# Coalescing sink for guild mod-log channels
+#
+# Each moderation action used to be one channel message. Here action embeds
+# are buffered per guild and posted up to ten per message, so a raid cleanup
+# or warn storm costs a tenth of the sends against the channel's rate limit.
+
+import asyncio
+import time
+from collections import deque
+
+import discord
+
+import config
+from .database import get_guild_config
+from .metrics import percentile
+
+# Discord's limits for one message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARACTERS = 6000
+
+
+def batches(embeds, max_embeds=MAX_EMBEDS):
+    """Split embeds into messages within Discord's count and total-size limits"""
+    batch, size = [], 0
+    for embed in embeds:
+        length = len(embed)
+        if batch and (len(batch) >= max_embeds or size + length > MAX_EMBED_CHARACTERS):
+            yield batch
+            batch, size = [], 0
+        batch.append(embed)
+        size += length
+    if batch:
+        yield batch
+
+
+class ModLogSink:
+    """Buffers mod-log embeds per guild and posts them as multi-embed messages
+
+    A guild's buffer is posted once it holds `max_embeds` embeds, at the next
+    tick of the `flush_interval` timer otherwise, or straight away when an
+    urgent action (an auto-ban) is queued; anything buffered before it goes
+    out first so the log stays in order. Past `max_pending` buffered embeds
+    across all guilds, new ones are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        flush_interval=config.MOD_LOG_FLUSH_INTERVAL,
+        max_pending=config.MOD_LOG_MAX_PENDING,
+        max_embeds=MAX_EMBEDS
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_embeds = max_embeds
+        self.bot = None
+        # Guild ID to (channel ID, [(queued at, embed)]), in the order they were queued
+        self.pending = {}
+        self.ready = set()
+        self.task = None
+        self._wakeup = asyncio.Event()
+        self._locks = {}
+
+        self.queued = 0
+        self.messages = 0
+        self.urgent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.queue_latencies = deque(maxlen=1000)
+
+    @property
+    def depth(self):
+        return sum(len(embeds) for _, embeds in self.pending.values())
+
+    def start(self, bot):
+        self.bot = bot
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the timer and post everything still buffered"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.bot is not None:
+            await self.flush()
+
+    async def post(self, db, guild_id, embed, urgent=False):
+        """Queue an embed for the guild's mod-log channel, if it has one
+
+        Returns False when the guild has no mod-log channel, the sink is not
+        running or the buffer is full.
+        """
+        if self.bot is None:
+            return False
+        guild_data = await get_guild_config(db, guild_id)
+        channel_id = guild_data.get("settings", {}).get("mod_log_channel_id")
+        if not channel_id:
+            return False
+        if self.depth >= self.max_pending:
+            self.dropped += 1
+            return False
+
+        channel_id = int(channel_id)
+        entry = self.pending.get(guild_id)
+        if entry is None or entry[0] != channel_id:
+            if entry is not None:
+                # The channel was changed; what is buffered still goes to the old one
+                self.ready.add(guild_id)
+                await self._flush_guild(guild_id)
+            entry = self.pending[guild_id] = (channel_id, [])
+        entry[1].append((time.monotonic(), embed))
+        self.queued += 1
+
+        if urgent:
+            self.urgent += 1
+            self.ready.add(guild_id)
+            await self._flush_guild(guild_id)
+        elif len(entry[1]) >= self.max_embeds:
+            self.ready.add(guild_id)
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        last_tick = time.monotonic()
+        while True:
+            timeout = max(0.0, last_tick + self.flush_interval - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if time.monotonic() - last_tick >= self.flush_interval:
+                last_tick = time.monotonic()
+                await self.flush()
+            else:
+                await self.flush(full_only=True)
+
+    async def flush(self, full_only=False):
+        """Post buffered embeds, or only the guilds with a full message's worth"""
+        guild_ids = list(self.ready if full_only else self.pending)
+        await asyncio.gather(*(self._flush_guild(guild_id) for guild_id in guild_ids))
+
+    async def _flush_guild(self, guild_id):
+        # One guild's messages are sent in order; different guilds go in parallel
+        lock = self._locks.get(guild_id)
+        if lock is None:
+            lock = self._locks[guild_id] = asyncio.Lock()
+        async with lock:
+            self.ready.discard(guild_id)
+            entry = self.pending.pop(guild_id, None)
+            if entry is None:
+                return
+            channel_id, queued = entry
+            channel = self.bot.get_partial_messageable(channel_id)
+            for batch in batches([embed for _, embed in queued], self.max_embeds):
+                try:
+                    await channel.send(embeds=batch)
+                except discord.HTTPException as e:
+                    # The channel is gone or the bot lost access; the actions
+                    # themselves are already in the audit log
+                    self.failed += len(batch)
+                    print(f"[mod-log] Failed to post {len(batch)} embed(s) to channel {channel_id} in guild {guild_id}: {e}")
+                    continue
+                self.messages += 1
+            now = time.monotonic()
+            self.queue_latencies.extend(now - queued_at for queued_at, _ in queued)
+
+    def stats(self):
+        latencies = sorted(self.queue_latencies)
+        return {
+            "buffered": self.depth,
+            "guilds_buffered": len(self.pending),
+            "queued": self.queued,
+            "messages": self.messages,
+            "urgent": self.urgent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queue_latency_p50": percentile(latencies, 0.50),
+            "queue_latency_p99": percentile(latencies, 0.99)
+        }
+
+
+mod_log = ModLogSink()
@@ -0,0 +1,103 @@
+# Bounded-concurrency channel permission rollout
+
+import asyncio
+import time
+
+import discord
+
+import config
+
+
+class RolloutResult:
+    """Outcome of a permission rollout"""
+
+    def __init__(self, total):
+        self.total = total
+        self.updated = 0
+        self.synced = 0
+        self.skipped = 0
+        self.failed = []
+
+    @property
+    def done(self):
+        return self.updated + self.synced + self.skipped + len(self.failed)
+
+
+def channels_needing_overwrite(guild, role, overwrite, exclude_ids=()):
+    """Return the channels whose overwrite for `role` differs from `overwrite`"""
+    return [
+        channel for channel in guild.channels
+        if channel.id not in exclude_ids and channel.overwrites_for(role) != overwrite
+    ]
+
+
+async def apply_role_overwrite(
+    guild,
+    role,
+    overwrite,
+    exclude_ids=(),
+    concurrency=config.PERMISSION_ROLLOUT_CONCURRENCY,
+    progress=None,
+    progress_interval=config.PERMISSION_ROLLOUT_PROGRESS_INTERVAL,
+    reason=None
+):
+    """Set `overwrite` for `role` on every channel of `guild`
+
+    Channels that already carry the overwrite are skipped, so an interrupted
+    rollout can simply be run again. Categories are updated first; children
+    that were synced to their category are re-synced rather than given their
+    own overwrite so they stay in sync; if their category's edit failed they
+    are reported as failed too, since syncing would copy the unrestricted
+    category. Only concurrency is bounded here: discord.py's per-route rate
+    limiter already paces the edits, and a local bucket below that limit
+    just made the rollout sequential again. `progress` is awaited with the
+    result at most every `progress_interval` seconds.
+    """
+    channels = [channel for channel in guild.channels if channel.id not in exclude_ids]
+    result = RolloutResult(len(channels))
+
+    categories = [channel for channel in channels if isinstance(channel, discord.CategoryChannel)]
+    children = [channel for channel in channels if not isinstance(channel, discord.CategoryChannel)]
+
+    # Capture sync state before categories change underneath the children
+    synced_ids = {
+        channel.id for channel in children
+        if channel.category is not None
+        and channel.category.id not in exclude_ids
+        and channel.permissions_synced
+    }
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failed_category_errors = {}
+    last_report = time.monotonic()
+
+    async def apply(channel):
+        nonlocal last_report
+        if channel.overwrites_for(role) == overwrite:
+            result.skipped += 1
+        elif channel.id in synced_ids and channel.category.id in failed_category_errors:
+            result.failed.append((channel, failed_category_errors[channel.category.id]))
+        else:
+            async with semaphore:
+                try:
+                    if channel.id in synced_ids:
+                        await channel.edit(sync_permissions=True, reason=reason)
+                        result.synced += 1
+                    else:
+                        await channel.set_permissions(role, overwrite=overwrite, reason=reason)
+                        result.updated += 1
+                except discord.HTTPException as e:
+                    result.failed.append((channel, e))
+                    if isinstance(channel, discord.CategoryChannel):
+                        failed_category_errors[channel.id] = e
+
+        if progress and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            await progress(result)
+
+    await asyncio.gather(*(apply(channel) for channel in categories))
+    await asyncio.gather(*(apply(channel) for channel in children))
+
+    if progress:
+        await progress(result)
+    return result
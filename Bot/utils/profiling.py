@@ -0,0 +1,188 @@
+# Event-loop lag watchdog and sampling profiler for the live process
+#
+# Everything the bot does shares one asyncio loop, so a callback that blocks
+# it (CPU-heavy work, a synchronous call) stalls every shard, command and
+# Mongo reply at once. The watchdog measures how late the loop wakes up and,
+# from a separate thread, captures the stack of whatever is holding it. The
+# profiler samples every thread's stack and returns collapsed stacks that
+# flamegraph.pl and speedscope read directly.
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+import config
+from .metrics import percentile, task_label
+
+_BOT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_COGS_ROOT = os.path.join(_BOT_ROOT, "cogs")
+
+
+def _short_path(filename):
+    if filename.startswith(_BOT_ROOT):
+        return os.path.relpath(filename, _BOT_ROOT)
+    return "/".join(filename.split(os.sep)[-2:])
+
+
+def cog_origin(frame):
+    """The innermost frame running cog code, e.g. "cogs/verification.py:on_member_join\""""
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(_COGS_ROOT):
+            return f"{_short_path(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class LoopWatchdog:
+    """Tracks event-loop lag and logs the stack of callbacks that block the loop
+
+    A heartbeat coroutine wakes every `interval` seconds and records how late
+    it was. A daemon thread checks the heartbeat; once it is more than
+    `threshold` seconds overdue it grabs the loop thread's stack, and when the
+    loop recovers it logs the stall with that stack, the running task and the
+    cog it was in.
+    """
+
+    def __init__(self, interval=config.LOOP_WATCHDOG_INTERVAL, threshold=config.LOOP_STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.loop = None
+        self.thread_id = None
+        self.heartbeat = time.monotonic()
+        self.task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.lags = deque(maxlen=1000)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.task = asyncio.create_task(self._beat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self):
+        self._stop.set()
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self.heartbeat = now
+
+    def _watch(self):
+        stall = None
+        while not self._stop.wait(self.threshold / 4):
+            overdue = time.monotonic() - self.heartbeat - self.interval
+            if overdue >= self.threshold:
+                if stall is None:
+                    # Taken while the blocking code is still on the loop thread's stack
+                    frame = sys._current_frames().get(self.thread_id)
+                    stall = {
+                        "task": task_label(asyncio.current_task(self.loop)),
+                        "origin": cog_origin(frame),
+                        "stack": "".join(traceback.format_stack(frame)) if frame else ""
+                    }
+                stall["seconds"] = overdue
+            elif stall is not None:
+                self._report(stall)
+                stall = None
+
+    def _report(self, stall):
+        self.stalls += 1
+        self.stalled_seconds += stall["seconds"]
+        print(
+            f"[watchdog] Event loop blocked for at least {stall['seconds'] * 1000:.0f}ms "
+            f"in {stall['task'] or 'a plain callback'} ({stall['origin'] or 'outside the cogs'}):\n"
+            f"{stall['stack']}",
+            file=sys.stderr
+        )
+
+    def stats(self):
+        lags = sorted(self.lags)
+        return {
+            "lag_p50": percentile(lags, 0.50),
+            "lag_p99": percentile(lags, 0.99),
+            "lag_max": self.max_lag,
+            "stalls": self.stalls,
+            "stalled_seconds": self.stalled_seconds
+        }
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval
+
+    Stacks on the loop thread are rooted at the running task's label, so
+    time lands under the command or listener that spent it; other threads
+    (Motor's executor, the watchdog) are rooted at their thread name.
+    """
+
+    def __init__(self, interval=config.PROFILER_INTERVAL):
+        self.interval = interval
+        self.running = False
+        self._labels = {}
+
+    def _frame_label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self, seconds, loop, loop_thread_id):
+        stacks = Counter()
+        own_thread_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(self._frame_label(frame.f_code))
+                    frame = frame.f_back
+                if thread_id == loop_thread_id:
+                    frames.append(task_label(asyncio.current_task(loop)) or "idle")
+                    frames.append("event-loop")
+                else:
+                    frames.append(names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(frames))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+    async def profile(self, seconds):
+        """Sample for `seconds` and return (collapsed stacks, sample count)"""
+        if self.running:
+            raise RuntimeError("A profile is already running")
+        self.running = True
+        try:
+            stacks = await asyncio.to_thread(
+                self._sample, seconds, asyncio.get_running_loop(), threading.get_ident()
+            )
+        finally:
+            self.running = False
+        # Frame labels never contain ';', which separates frames in this format
+        collapsed = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return collapsed, sum(stacks.values())
+
+
+loop_watchdog = LoopWatchdog()
+profiler = SamplingProfiler()
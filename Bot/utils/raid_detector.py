@@ -0,0 +1,221 @@
+# Streaming detection of coordinated join waves
+#
+# Each join is reduced to a MinHash signature over its username shingles. The
+# signature is split into LSH bands, and every band is a bucket key shared by
+# near-identical names, so similar accounts meet in a bucket without any
+# pairwise comparison. The account's creation hour is one more key, which
+# catches waves of freshly created accounts with unrelated names. Buckets only
+# cover a sliding window of recent joins, so memory is bounded per guild.
+
+import random
+import re
+import time
+import unicodedata
+import zlib
+from collections import deque
+
+import config
+
+DISCORD_EPOCH_MS = 1420070400000
+_MERSENNE_PRIME = (1 << 61) - 1
+_DIGITS = re.compile(r"\d+")
+
+
+def account_created_ms(user_id):
+    """Account creation time encoded in a snowflake, in Unix milliseconds"""
+    return (user_id >> 22) + DISCORD_EPOCH_MS
+
+
+def shingles(name, size=3):
+    """Character shingles of a normalised username
+
+    Digit runs collapse to one placeholder so "raider0193" and "raider7" share
+    shingles, and short names are padded so they still produce some.
+    """
+    name = unicodedata.normalize("NFKC", name).casefold()
+    name = f"^{_DIGITS.sub('#', name)}$"
+    if len(name) <= size:
+        return {name}
+    return {name[i:i + size] for i in range(len(name) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes of crc32'd shingles"""
+
+    def __init__(self, permutations, seed=0):
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(permutations)
+        ]
+
+    def signature(self, tokens):
+        hashes = [zlib.crc32(token.encode()) for token in tokens]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self.permutations
+        )
+
+
+class RaidCluster:
+    """A group of recent joins that crossed the cluster threshold"""
+
+    def __init__(self, guild_id, key, member_ids, new):
+        self.guild_id = guild_id
+        self.key = key
+        self.member_ids = member_ids
+        # False when the cluster was already reported and these are late joiners
+        self.new = new
+
+    @property
+    def reason(self):
+        return "accounts created in the same hour" if self.key[0] == "created" else "near-identical usernames"
+
+
+class JoinEntry:
+    __slots__ = ("joined_at", "member_id", "keys", "suspicious")
+
+    def __init__(self, joined_at, member_id, keys, suspicious):
+        self.joined_at = joined_at
+        self.member_id = member_id
+        self.keys = keys
+        self.suspicious = suspicious
+
+
+class Bucket:
+    __slots__ = ("members", "suspicious", "flagged")
+
+    def __init__(self):
+        self.members = deque()
+        self.suspicious = 0
+        self.flagged = False
+
+
+class GuildJoinWindow:
+    """Joins seen in one guild over the sliding window and their LSH buckets"""
+
+    def __init__(self):
+        self.entries = deque()
+        self.buckets = {}
+
+
+class RaidDetector:
+    """Flags clusters of similar joins within a sliding window per guild
+
+    A join is suspicious if the account is young or uses the default avatar. A
+    bucket becomes a raid cluster once it holds `cluster_size` suspicious joins
+    making up at least `suspicious_ratio` of the bucket; only the suspicious
+    members are reported. Later suspicious joins landing in a flagged bucket are
+    reported on their own so the caller can act on them too.
+    """
+
+    def __init__(
+        self,
+        window=config.RAID_WINDOW,
+        max_joins=config.RAID_WINDOW_MAX_JOINS,
+        cluster_size=config.RAID_CLUSTER_SIZE,
+        suspicious_ratio=config.RAID_SUSPICIOUS_RATIO,
+        young_account_days=config.RAID_YOUNG_ACCOUNT_DAYS,
+        bands=config.RAID_LSH_BANDS,
+        rows=config.RAID_LSH_ROWS
+    ):
+        self.window = window
+        self.max_joins = max_joins
+        self.cluster_size = cluster_size
+        self.suspicious_ratio = suspicious_ratio
+        self.young_account_ms = young_account_days * 86400 * 1000
+        self.bands = bands
+        self.rows = rows
+        self.hasher = MinHasher(bands * rows)
+        self.guilds = {}
+
+        self.observed = 0
+        self.clusters_flagged = 0
+        self.members_flagged = 0
+
+    def features(self, user_id, name, has_avatar, now):
+        """Bucket keys and the suspicious flag for one join"""
+        signature = self.hasher.signature(shingles(name))
+        keys = [
+            ("band", band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+        created_ms = account_created_ms(user_id)
+        keys.append(("created", created_ms // 3_600_000))
+        suspicious = not has_avatar or now * 1000 - created_ms < self.young_account_ms
+        return keys, suspicious
+
+    def observe(self, guild_id, user_id, name, has_avatar, now=None):
+        """Record a join; returns a RaidCluster if it completes or extends one"""
+        now = time.time() if now is None else now
+        self.observed += 1
+        window = self.guilds.get(guild_id)
+        if window is None:
+            window = self.guilds[guild_id] = GuildJoinWindow()
+        self._evict(window, now)
+
+        keys, suspicious = self.features(user_id, name, has_avatar, now)
+        window.entries.append(JoinEntry(now, user_id, keys, suspicious))
+
+        cluster = None
+        for key in keys:
+            bucket = window.buckets.get(key)
+            if bucket is None:
+                bucket = window.buckets[key] = Bucket()
+            bucket.members.append((user_id, suspicious))
+            bucket.suspicious += suspicious
+
+            # Established accounts with avatars are never pulled into a cluster
+            if cluster is not None or not suspicious:
+                continue
+            if bucket.flagged:
+                cluster = RaidCluster(guild_id, key, [user_id], new=False)
+            elif (
+                bucket.suspicious >= self.cluster_size
+                and bucket.suspicious >= self.suspicious_ratio * len(bucket.members)
+            ):
+                bucket.flagged = True
+                member_ids = [member_id for member_id, flagged in bucket.members if flagged]
+                cluster = RaidCluster(guild_id, key, member_ids, new=True)
+                self.clusters_flagged += 1
+
+        if cluster is not None:
+            self.members_flagged += len(cluster.member_ids)
+        if self.observed % 1000 == 0:
+            self.prune(now)
+        return cluster
+
+    def observe_member(self, member):
+        return self.observe(member.guild.id, member.id, member.name, member.avatar is not None)
+
+    def _evict(self, window, now):
+        cutoff = now - self.window
+        entries = window.entries
+        while entries and (entries[0].joined_at < cutoff or len(entries) >= self.max_joins):
+            entry = entries.popleft()
+            # Buckets fill in join order, so the oldest entry is at the front of each
+            for key in entry.keys:
+                bucket = window.buckets[key]
+                bucket.members.popleft()
+                bucket.suspicious -= entry.suspicious
+                if not bucket.members:
+                    del window.buckets[key]
+
+    def prune(self, now=None):
+        """Drop windows of guilds that have gone quiet"""
+        now = time.time() if now is None else now
+        for guild_id in list(self.guilds):
+            window = self.guilds[guild_id]
+            self._evict(window, now)
+            if not window.entries:
+                del self.guilds[guild_id]
+
+    def stats(self):
+        return {
+            "observed": self.observed,
+            "clusters_flagged": self.clusters_flagged,
+            "members_flagged": self.members_flagged,
+            "tracked_guilds": len(self.guilds),
+            "window_joins": sum(len(window.entries) for window in self.guilds.values()),
+            "buckets": sum(len(window.buckets) for window in self.guilds.values())
+        }
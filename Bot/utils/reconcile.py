@@ -0,0 +1,138 @@
+# Chunked sweep that brings Verified/Unverified roles back in line with Mongo
+
+import discord
+
+import config
+from .bulk import run_bulk
+from .database import get_verified_user_ids
+
+# fetch_members pages 1000 members at a time and yields each page newest-first,
+# so chunks follow page boundaries to keep the resume checkpoint exact
+CHUNK_SIZE = 1000
+
+
+class ReconcileResult:
+    """Counts for one reconciliation sweep of a guild"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.verified = 0
+        self.unverified = 0
+        self.failed = 0
+        self.last_member_id = None
+        self.complete = False
+
+    @property
+    def changed(self):
+        return self.verified + self.unverified
+
+
+def role_diff(member, verified, verified_role, unverified_role, unverified_since):
+    """Return the member's corrected role list, or None if nothing needs to change
+
+    Verified members get Verified and lose Unverified. Members without a
+    verification record only get Unverified when they have neither role and
+    joined after verification was enabled (`unverified_since`, required;
+    see get_verification_enabled_at for configs that predate it). Members
+    from before then never went through verification and must not be locked
+    out, and a Verified role granted by hand is left alone.
+    """
+    current = [role for role in member.roles if not role.is_default()]
+    if verified:
+        roles = [role for role in current if role != unverified_role]
+        if verified_role not in roles:
+            roles.append(verified_role)
+    elif verified_role in current or unverified_role is None or unverified_role in current:
+        return None
+    elif member.joined_at is None or member.joined_at < unverified_since:
+        return None
+    else:
+        roles = current + [unverified_role]
+    return roles if set(roles) != set(current) else None
+
+
+async def reconcile_roles(
+    db,
+    guild,
+    verified_role,
+    unverified_role,
+    unverified_since,
+    after=None,
+    dry_run=False,
+    progress=None,
+    checkpoint=None
+):
+    """Walk the guild's members in ID order and fix their verification roles
+
+    Each chunk costs one `$in` lookup against verifications. `after` resumes
+    from a member ID; `checkpoint(member_id)` is awaited after every chunk so
+    an interrupted sweep can pick up where it stopped. Only members who
+    joined after `unverified_since` are given Unverified.
+    """
+    result = ReconcileResult(dry_run)
+
+    async def process(chunk):
+        humans = [member for member in chunk if not member.bot]
+        verified_ids = await get_verified_user_ids(db, guild.id, [member.id for member in humans])
+
+        changes = {}
+        for member in humans:
+            roles = role_diff(member, member.id in verified_ids, verified_role, unverified_role, unverified_since)
+            if roles is not None:
+                changes[member] = roles
+                if member.id in verified_ids:
+                    result.verified += 1
+                else:
+                    result.unverified += 1
+
+        if changes and not dry_run:
+            async def apply(member):
+                await member.edit(roles=changes[member], reason="Verification role reconciliation")
+
+            outcome = await run_bulk(
+                list(changes),
+                apply,
+                concurrency=config.RECONCILE_CONCURRENCY,
+                rate=config.RECONCILE_RATE
+            )
+            result.failed += len(outcome.failed)
+
+        result.scanned += len(chunk)
+        result.last_member_id = max(member.id for member in chunk)
+        if checkpoint:
+            await checkpoint(result.last_member_id)
+        if progress:
+            await progress(result)
+
+    chunk = []
+    after = discord.Object(id=after) if after else None
+    async for member in guild.fetch_members(limit=None, after=after):
+        chunk.append(member)
+        if len(chunk) >= CHUNK_SIZE:
+            await process(chunk)
+            chunk = []
+    if chunk:
+        await process(chunk)
+
+    result.complete = True
+    return result
+
+
+def reconcile_embed(title, result, color=config.EMBED_COLOR_INFO):
+    """Build the embed used to stream reconciliation progress into one message"""
+    embed = discord.Embed(title=title, color=color)
+    embed.add_field(name="Scanned", value=str(result.scanned), inline=True)
+    embed.add_field(
+        name="Would verify" if result.dry_run else "Verified",
+        value=str(result.verified),
+        inline=True
+    )
+    embed.add_field(
+        name="Would mark unverified" if result.dry_run else "Marked unverified",
+        value=str(result.unverified),
+        inline=True
+    )
+    if result.failed:
+        embed.add_field(name="Failed", value=str(result.failed), inline=True)
+    return embed
@@ -0,0 +1,220 @@
+# Persistent scheduler for timed moderation actions
+#
+# Actions live in the scheduled_actions collection, indexed by due time. Only
+# the actions due within the next `window` seconds are held in memory, in a
+# min-heap, and the loop sleeps until the earliest of them instead of polling.
+# Overdue actions are part of the first window after a restart, so anything
+# missed while the bot was down runs as soon as it is back.
+
+import asyncio
+import heapq
+import math
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import discord
+from pymongo.errors import PyMongoError
+
+import config
+from .metrics import percentile
+from .mod_log import mod_log
+
+
+def _timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class ActionScheduler:
+    """Runs registered handlers for persisted actions when they fall due
+
+    Handlers are coroutines taking the action document. An action is deleted
+    once its handler returns or raises NotFound; other errors are retried with
+    exponential backoff up to `max_attempts` times, after which the guild's
+    mod log is told the action was abandoned.
+    """
+
+    def __init__(
+        self,
+        window=config.SCHEDULER_WINDOW,
+        batch_size=config.SCHEDULER_BATCH_SIZE,
+        max_attempts=config.SCHEDULER_MAX_ATTEMPTS
+    ):
+        self.window = window
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.handlers = {}
+        self.db = None
+        self.shard_filter = None
+        self.heap = []
+        self.queued = set()
+        self.horizon = 0.0
+        self.task = None
+        self._wakeup = asyncio.Event()
+
+        self.executed = 0
+        self.retried = 0
+        self.failed = 0
+        self.lateness = deque(maxlen=1000)
+
+    def register(self, action, handler):
+        self.handlers[action] = handler
+
+    def start(self, db, shard_ids=None, shard_count=None):
+        """Attach to the database and start the loop for this process's shards"""
+        self.db = db
+        if shard_ids is not None:
+            # guild_key is the guild ID's timestamp part, so this mirrors Discord's shard formula
+            self.shard_filter = {"$or": [{"guild_key": {"$mod": [shard_count, shard_id]}} for shard_id in shard_ids]}
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def schedule(self, db, guild_id, user_id, action, due_at, **data):
+        """Persist an action and queue it in memory if it falls in the current window
+
+        Processes that never start the loop, such as HTTP interaction
+        replicas, only persist it; the gateway process loads it on its next
+        refill.
+        """
+        document = {
+            "guild_id": str(guild_id),
+            "guild_key": int(guild_id) >> 22,
+            "user_id": str(user_id),
+            "action": action,
+            "due_at": due_at,
+            "attempts": 0,
+            **data
+        }
+        await db.scheduled_actions.insert_one(document)
+        if self.task and _timestamp(due_at) < self.horizon:
+            self._push(document)
+            self._wakeup.set()
+
+    async def cancel(self, db, guild_id, user_id, action):
+        """Drop pending actions of one kind for a member, e.g. a tempban lifted early"""
+        query = {"guild_id": str(guild_id), "user_id": str(user_id), "action": action}
+        await db.scheduled_actions.delete_many(query)
+        kept = [
+            entry for entry in self.heap
+            if not (entry[2]["guild_id"] == query["guild_id"] and entry[2]["user_id"] == query["user_id"]
+                    and entry[2]["action"] == action)
+        ]
+        if len(kept) != len(self.heap):
+            self.heap = kept
+            heapq.heapify(self.heap)
+            self.queued = {entry[1] for entry in self.heap}
+
+    def _push(self, document):
+        key = str(document["_id"])
+        if key not in self.queued:
+            self.queued.add(key)
+            heapq.heappush(self.heap, (_timestamp(document["due_at"]), key, document))
+
+    async def _refill(self, now):
+        """Load the next window of due actions from Mongo"""
+        horizon = now + self.window
+        query = {"due_at": {"$lt": _datetime(horizon)}}
+        if self.shard_filter:
+            query.update(self.shard_filter)
+        documents = await self.db.scheduled_actions.find(query).sort("due_at", 1).limit(self.batch_size).to_list(None)
+        for document in documents:
+            self._push(document)
+        # A full batch means the window holds more than fits; stop it at the last loaded action
+        self.horizon = _timestamp(documents[-1]["due_at"]) if len(documents) == self.batch_size else horizon
+
+    async def _run(self):
+        while True:
+            try:
+                now = time.time()
+                if now >= self.horizon:
+                    await self._refill(now)
+
+                while self.heap and self.heap[0][0] <= time.time():
+                    due, key, action = heapq.heappop(self.heap)
+                    self.queued.discard(key)
+                    self.lateness.append(max(0.0, time.time() - due))
+                    await self._execute(action)
+            except PyMongoError as e:
+                # Whatever was in flight is still in Mongo; reload the window once it is back
+                print(f"[scheduler] Database error, retrying shortly: {e}")
+                self.horizon = 0.0
+                await asyncio.sleep(5)
+                continue
+
+            next_due = self.heap[0][0] if self.heap else math.inf
+            timeout = max(0.0, min(next_due, self.horizon) - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _execute(self, action):
+        handler = self.handlers.get(action["action"])
+        failure = None
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for {action['action']}")
+            await handler(action)
+        except discord.NotFound:
+            pass
+        except Exception as e:
+            attempts = action.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                self.failed += 1
+                failure = e
+                print(f"[scheduler] Giving up on {action['action']} for {action['user_id']} in {action['guild_id']}: {e}")
+            else:
+                self.retried += 1
+                due_at = _datetime(time.time() + 60 * 2 ** attempts)
+                await self.db.scheduled_actions.update_one(
+                    {"_id": action["_id"]},
+                    {"$set": {"due_at": due_at, "attempts": attempts}}
+                )
+                action.update(due_at=due_at, attempts=attempts)
+                if _timestamp(due_at) < self.horizon:
+                    self._push(action)
+                return
+        else:
+            self.executed += 1
+        await self.db.scheduled_actions.delete_one({"_id": action["_id"]})
+        if failure is not None:
+            await self._report_failure(action, failure)
+
+    async def _report_failure(self, action, error):
+        """Tell the guild's moderators an action will not run, e.g. a tempban's unban"""
+        embed = discord.Embed(
+            title="⚠️ Scheduled Action Failed",
+            description=f"The scheduled **{action['action']}** for <@{action['user_id']}> was abandoned "
+                        f"after {self.max_attempts} attempts and must be done manually.",
+            color=config.EMBED_COLOR_WARNING
+        )
+        embed.add_field(name="User ID", value=f"`{action['user_id']}`", inline=True)
+        embed.add_field(name="Error", value=str(error)[:1024] or type(error).__name__, inline=False)
+        await mod_log.post(self.db, int(action["guild_id"]), embed, urgent=True)
+
+    def stats(self):
+        lateness = sorted(self.lateness)
+        return {
+            "queued": len(self.heap),
+            "horizon_seconds": max(0.0, self.horizon - time.time()),
+            "executed": self.executed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lateness_p50": percentile(lateness, 0.50),
+            "lateness_p99": percentile(lateness, 0.99)
+        }
+
+
+scheduler = ActionScheduler()
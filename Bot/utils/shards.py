@@ -0,0 +1,82 @@
+# Per-shard health tracking
+
+import time
+from collections import deque
+
+
+class ShardHealth:
+    """Connection history and event counts for a single shard"""
+
+    def __init__(self, shard_id):
+        self.shard_id = shard_id
+        self.latency = None
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+        self.resumes = 0
+        self.last_ready = None
+        self.events = 0
+        self.event_times = deque()
+
+
+class ShardMetrics:
+    """Latency, connection state and event rate for every shard in this process"""
+
+    def __init__(self, window=60):
+        self.window = window
+        self.shards = {}
+
+    def _get(self, shard_id):
+        shard = self.shards.get(shard_id)
+        if shard is None:
+            shard = ShardHealth(shard_id)
+            self.shards[shard_id] = shard
+        return shard
+
+    def on_connect(self, shard_id):
+        shard = self._get(shard_id)
+        shard.connected = True
+        shard.connects += 1
+
+    def on_disconnect(self, shard_id):
+        shard = self._get(shard_id)
+        shard.connected = False
+        shard.disconnects += 1
+
+    def on_resume(self, shard_id):
+        shard = self._get(shard_id)
+        shard.connected = True
+        shard.resumes += 1
+
+    def on_ready(self, shard_id):
+        self._get(shard_id).last_ready = time.time()
+
+    def record_event(self, shard_id):
+        """Count a gateway event delivered on `shard_id`"""
+        shard = self._get(shard_id)
+        now = time.monotonic()
+        shard.events += 1
+        shard.event_times.append(now)
+        while shard.event_times[0] < now - self.window:
+            shard.event_times.popleft()
+
+    def update_latencies(self, latencies):
+        """Store the (shard_id, latency) pairs reported by the client"""
+        for shard_id, latency in latencies:
+            self._get(shard_id).latency = latency
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            shard.shard_id: {
+                "latency": shard.latency,
+                "connected": shard.connected,
+                "connects": shard.connects,
+                "disconnects": shard.disconnects,
+                "resumes": shard.resumes,
+                "last_ready": shard.last_ready,
+                "events": shard.events,
+                "events_per_second": sum(1 for t in shard.event_times if t >= now - self.window) / self.window
+            }
+            for shard in self.shards.values()
+        }
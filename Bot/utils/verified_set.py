@@ -0,0 +1,120 @@
+# Compact in-memory record of which members have verified in each guild
+
+import heapq
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+import config
+
+
+def _in_sorted(ids, user_id):
+    index = bisect_left(ids, user_id)
+    return index < len(ids) and ids[index] == user_id
+
+
+class VerifiedSet:
+    """Verified user IDs per guild as sorted int64 arrays plus a small delta set
+
+    The arrays cost 8 bytes per verification and answer lookups with a binary
+    search. New verifications land in a per-guild set that is merged into the
+    array once it grows past `merge_threshold`. Until `load` has finished,
+    lookups that miss the delta return None so callers can fall back to Mongo.
+    """
+
+    def __init__(self, merge_threshold=config.VERIFIED_SET_MERGE_THRESHOLD):
+        self.merge_threshold = merge_threshold
+        self.sorted = {}
+        self.recent = defaultdict(set)
+        self.loaded = False
+
+        self.hits = 0
+        self.misses = 0
+        self.merges = 0
+
+    def contains(self, guild_id, user_id):
+        """True/False once loaded; None if unknown while the initial load runs"""
+        guild_id, user_id = int(guild_id), int(user_id)
+        recent = self.recent.get(guild_id)
+        if (recent and user_id in recent) or _in_sorted(self.sorted.get(guild_id, ()), user_id):
+            self.hits += 1
+            return True
+        if not self.loaded:
+            return None
+        self.misses += 1
+        return False
+
+    def add(self, guild_id, user_id):
+        guild_id, user_id = int(guild_id), int(user_id)
+        recent = self.recent[guild_id]
+        recent.add(user_id)
+        if len(recent) >= self.merge_threshold:
+            self._merge(guild_id)
+
+    def _merge(self, guild_id):
+        ids = self.sorted.get(guild_id, array("q"))
+        new_ids = sorted(user_id for user_id in self.recent.pop(guild_id, ()) if not _in_sorted(ids, user_id))
+        if new_ids:
+            self.sorted[guild_id] = array("q", heapq.merge(ids, new_ids))
+            self.merges += 1
+
+    def build(self, pairs):
+        """Replace the arrays with (guild_id, user_id) pairs from any iterable"""
+        staged = defaultdict(lambda: array("q"))
+        for guild_id, user_id in pairs:
+            staged[int(guild_id)].append(int(user_id))
+        self._install(staged)
+
+    def _install(self, staged):
+        # One guild at a time, so the transient sort list is never bigger than a guild
+        self.sorted = {}
+        for guild_id in list(staged):
+            self.sorted[guild_id] = array("q", sorted(set(staged.pop(guild_id))))
+        for guild_id in list(self.recent):
+            self._merge(guild_id)
+
+    async def load(self, db, owns_guild=None):
+        """Stream every verification from Mongo into the arrays"""
+        started = time.perf_counter()
+        staged = defaultdict(lambda: array("q"))
+        cursor = db.verifications.find({}, {"_id": 0, "guild_id": 1, "user_id": 1}).batch_size(10000)
+        async for verification in cursor:
+            guild_id = int(verification["guild_id"])
+            if owns_guild is None or owns_guild(guild_id):
+                staged[guild_id].append(int(verification["user_id"]))
+        self._install(staged)
+        self.loaded = True
+        print(
+            f"[verified-set] Loaded {self.size()} verifications for {len(self.sorted)} guilds "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def clear(self):
+        self.sorted.clear()
+        self.recent.clear()
+        self.loaded = False
+
+    def size(self):
+        return sum(len(ids) for ids in self.sorted.values()) + sum(len(ids) for ids in self.recent.values())
+
+    def memory_bytes(self):
+        """Approximate bytes held by the arrays and delta sets"""
+        return (
+            sum(ids.buffer_info()[1] * ids.itemsize for ids in self.sorted.values())
+            + sum(len(ids) * 64 for ids in self.recent.values())
+        )
+
+    def stats(self):
+        return {
+            "loaded": int(self.loaded),
+            "guilds": len(self.sorted),
+            "entries": self.size(),
+            "memory_bytes": self.memory_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "merges": self.merges
+        }
+
+
+verified_set = VerifiedSet()
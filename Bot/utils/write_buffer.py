@@ -0,0 +1,170 @@
+# Write-behind buffer for inserts nobody reads back on the hot path
+
+import asyncio
+import os
+import time
+from collections import defaultdict, deque
+
+from bson import json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+import config
+from .metrics import percentile
+
+
+class WriteBehindBuffer:
+    """Coalesces inserts per collection and flushes them with insert_many
+
+    Writes are flushed when a collection reaches `max_batch` documents or
+    every `flush_interval` seconds. If Mongo is unreachable, pending writes are
+    appended to `spill_path` (when set) and replayed on the next start;
+    without a spill file they stay queued up to `max_pending`, after which new
+    writes are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        max_batch=config.WRITE_BUFFER_MAX_BATCH,
+        flush_interval=config.WRITE_BUFFER_FLUSH_INTERVAL,
+        max_pending=config.WRITE_BUFFER_MAX_PENDING,
+        spill_path=config.WRITE_BUFFER_SPILL_PATH
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.db = None
+        self.pending = defaultdict(list)
+        self.task = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.flush_failures = 0
+        self.flush_latencies = deque(maxlen=1000)
+
+    @property
+    def depth(self):
+        return sum(len(documents) for documents in self.pending.values())
+
+    async def start(self, db):
+        """Attach to the database, replay spilled writes and start flushing"""
+        self.db = db
+        await self.replay_spill()
+        self.task = asyncio.create_task(self._run())
+
+    def insert(self, collection_name, document):
+        """Queue a document for insertion without waiting on Mongo"""
+        if self.depth >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending[collection_name].append(document)
+        if len(self.pending[collection_name]) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything pending, spilling to disk if Mongo is unavailable"""
+        async with self._flush_lock:
+            for collection_name in list(self.pending):
+                while self.pending[collection_name]:
+                    batch = self.pending[collection_name][:self.max_batch]
+                    started = time.perf_counter()
+                    try:
+                        await self.db[collection_name].insert_many(batch, ordered=False)
+                    except BulkWriteError as e:
+                        # Replayed documents keep their _id, so duplicates mean they already landed
+                        errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+                        if errors:
+                            print(f"[write-buffer] Dropped {len(errors)} {collection_name} write(s): {errors[0]}")
+                            self.dropped += len(errors)
+                    except PyMongoError as e:
+                        self.flush_failures += 1
+                        print(f"[write-buffer] Failed to flush {len(batch)} {collection_name} write(s): {e}")
+                        if self.spill_path:
+                            self._spill(collection_name, batch)
+                            del self.pending[collection_name][:len(batch)]
+                            continue
+                        # Keep the writes queued and retry on the next tick
+                        return
+                    self.flush_latencies.append(time.perf_counter() - started)
+                    self.written += len(batch)
+                    del self.pending[collection_name][:len(batch)]
+
+    def _spill(self, collection_name, documents):
+        with open(self.spill_path, "a", encoding="utf-8") as spill:
+            for document in documents:
+                spill.write(json_util.dumps({"collection": collection_name, "document": document}) + "\n")
+        self.spilled += len(documents)
+
+    async def replay_spill(self):
+        """Write out writes spilled by a previous run, then clear the spill file
+
+        The file is moved aside first, so batches that fail again are spilled
+        to a fresh file. It is only deleted once the replayed writes have been
+        flushed; a crash before then replays it on the next start, and the
+        documents keep their _id, so the ones that already landed are skipped.
+        """
+        if not self.spill_path:
+            return
+        replay_path = self.spill_path + ".replaying"
+        if os.path.exists(self.spill_path):
+            if os.path.exists(replay_path):
+                # An earlier replay was interrupted; carry on with both files
+                with open(replay_path, "a", encoding="utf-8") as replay, open(self.spill_path, encoding="utf-8") as spill:
+                    replay.writelines(spill)
+                os.remove(self.spill_path)
+            else:
+                os.replace(self.spill_path, replay_path)
+        if not os.path.exists(replay_path):
+            return
+
+        replayed = 0
+        with open(replay_path, encoding="utf-8") as spill:
+            for line in spill:
+                if line.strip():
+                    entry = json_util.loads(line)
+                    self.pending[entry["collection"]].append(entry["document"])
+                    replayed += 1
+        if replayed:
+            print(f"[write-buffer] Replaying {replayed} spilled write(s)")
+        await self.flush()
+        os.remove(replay_path)
+
+    async def close(self):
+        """Stop the flush loop and write out everything still pending"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.db is not None:
+            await self.flush()
+            if self.depth and self.spill_path:
+                for collection_name, documents in self.pending.items():
+                    self._spill(collection_name, documents)
+                self.pending.clear()
+
+    def stats(self):
+        latencies = sorted(self.flush_latencies)
+        return {
+            "queue_depth": self.depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "flush_failures": self.flush_failures,
+            "flush_latency_p50": percentile(latencies, 0.50),
+            "flush_latency_p99": percentile(latencies, 0.99)
+        }
+
+
+write_buffer = WriteBehindBuffer()
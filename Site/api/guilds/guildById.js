@@ -1,5 +1,5 @@
 const { getDatabase } = require('../../lib/mongodb');
-const { authenticateRequest } = require('../../lib/utils');
+const { authenticateRequest, getGuildStats } = require('../../lib/utils');
 
 module.exports = async (req, res) => {
   // Authenticate admin
@@ -22,22 +22,20 @@ module.exports = async (req, res) => {
         return res.status(404).json({ error: 'Guild not found' });
       }
 
-      // Get verification stats
-      const verifications = await db.collection('verifications').countDocuments({ guild_id: guildId });
-      const altAccounts = await db.collection('alt_accounts').countDocuments({ guild_id: guildId });
-
-      // Get recent warns
-      const warns = Object.values(guild.warns || {}).flat();
-      const totalWarns = warns.length;
+      const stats = await getGuildStats(db, guild);
 
       res.status(200).json({
         success: true,
         guild: {
           ...guild,
           stats: {
-            total_verifications: verifications,
-            alt_accounts_detected: altAccounts,
-            total_warns: totalWarns
+            total_verifications: stats.verifications || 0,
+            manual_verifications: stats.manual_verifications || 0,
+            alt_accounts_detected: stats.alts || 0,
+            total_warns: stats.warns || 0,
+            total_kicks: stats.kicks || 0,
+            total_bans: stats.bans || 0,
+            total_joins: stats.joins || 0
           }
         }
       });
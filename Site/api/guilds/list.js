@@ -1,5 +1,5 @@
 const { getDatabase } = require('../../lib/mongodb');
-const { authenticateRequest } = require('../../lib/utils');
+const { authenticateRequest, getGuildStats } = require('../../lib/utils');
 
 module.exports = async (req, res) => {
   if (req.method !== 'GET') {
@@ -18,18 +18,14 @@ module.exports = async (req, res) => {
 
     // Get stats for each guild
     const guildsWithStats = await Promise.all(guilds.map(async (guild) => {
-      const verifications = await db.collection('verifications').countDocuments({ guild_id: guild.guild_id });
-      const altAccounts = await db.collection('alt_accounts').countDocuments({ guild_id: guild.guild_id });
-
-      const warns = Object.values(guild.warns || {}).flat();
-      const totalWarns = warns.length;
+      const stats = await getGuildStats(db, guild);
 
       return {
         guild_id: guild.guild_id,
         verification_enabled: guild.verification?.enabled || false,
-        total_verifications: verifications,
-        alt_accounts_detected: altAccounts,
-        total_warns: totalWarns
+        total_verifications: stats.verifications || 0,
+        alt_accounts_detected: stats.alts || 0,
+        total_warns: stats.warns || 0
       };
     }));
 
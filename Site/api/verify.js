@@ -1,5 +1,5 @@
 const { getDatabase } = require('../lib/mongodb');
-const { getClientInfo } = require('../lib/utils');
+const { getClientInfo, incrementGuildStats } = require('../lib/utils');
 
 // VPN/Proxy detection function
 async function detectVPNProxy(ip) {
@@ -97,6 +97,7 @@ module.exports = async (req, res) => {
         ip: clientInfo.ip,
         detected_at: new Date().toISOString()
       });
+      await incrementGuildStats(db, guildId, { alts: 1 });
 
       return res.status(403).json({
         error: 'Alt account detected',
@@ -117,6 +118,7 @@ module.exports = async (req, res) => {
       verified_at: new Date().toISOString(),
       manual: false
     });
+    await incrementGuildStats(db, guildId, { verifications: 1 });
 
     // Update user's global data
     await db.collection('users').updateOne(
@@ -59,6 +59,61 @@ function authenticateRequest(req) {
   return verifyToken(token);
 }
 
+async function incrementGuildStats(db, guildId, counters) {
+  // The same per-guild and hourly counters the bot keeps for /serverstats
+  const hour = new Date();
+  hour.setUTCMinutes(0, 0, 0);
+
+  await Promise.all([
+    db.collection('guild_stats').updateOne(
+      { guild_id: guildId },
+      { $inc: counters },
+      { upsert: true }
+    ),
+    db.collection('guild_stats_hourly').updateOne(
+      { guild_id: guildId, hour },
+      { $inc: counters },
+      { upsert: true }
+    )
+  ]);
+}
+
+async function getGuildStats(db, guild) {
+  // Totals kept by the bot's counters; warns are every warn on record when
+  // counting began plus every warn issued since, so they never go down
+  const stats = await db.collection('guild_stats').findOne({ guild_id: guild.guild_id }) || {};
+  if (stats.backfilled_at) {
+    return stats;
+  }
+
+  // Until the bot's one-time backfill has run, the counters only cover
+  // activity since they were deployed, so count the records the same way it will
+  const guildId = guild.guild_id;
+  const modActions = db.collection('mod_actions');
+  const [verifications, manualVerifications, alts, warnTotals, kicks, bans] = await Promise.all([
+    db.collection('verifications').countDocuments({ guild_id: guildId }),
+    db.collection('verifications').countDocuments({ guild_id: guildId, manual: true }),
+    db.collection('alt_accounts').countDocuments({ guild_id: guildId }),
+    db.collection('warns').aggregate([
+      { $match: { guild_id: guildId } },
+      { $group: { _id: null, total: { $sum: '$count' } } }
+    ]).toArray(),
+    modActions.countDocuments({ guild_id: guildId, action: 'kick' }),
+    modActions.countDocuments({ guild_id: guildId, action: { $in: ['ban', 'tempban'] } })
+  ]);
+  const legacyWarns = Object.values(guild.warns || {}).reduce((total, warns) => total + warns.length, 0);
+
+  return {
+    ...stats,
+    verifications,
+    manual_verifications: manualVerifications,
+    alts,
+    warns: (warnTotals[0] ? warnTotals[0].total : 0) + legacyWarns,
+    kicks,
+    bans
+  };
+}
+
 module.exports = {
   getClientInfo,
   parseBrowser,
@@ -66,5 +121,7 @@ module.exports = {
   verifyToken,
   hashPassword,
   comparePassword,
-  authenticateRequest
+  authenticateRequest,
+  incrementGuildStats,
+  getGuildStats
 };